@@ -0,0 +1,325 @@
+"""
+Offline load test for the API.
+
+Runs main.app in-process (httpx ASGI transport) with deterministic local
+stand-ins for the LLM, the embeddings API, Qdrant (":memory:") and Neon
+Postgres, so no API keys or network are needed and runs are comparable.
+The JSONL file provides both the corpus and the question mix: each line's
+"question" (or "title") is asked, and its "body" is ingested as a chapter
+and used as the selection for /api/ask-selected.
+
+Prints one JSON report (also written to --output) with throughput and
+p50/p95/p99 latency per endpoint; streamed endpoints also report time to
+first byte.
+
+Usage:
+    python -m benchmarks.load_test --concurrency 16 --requests 500 --output load.json
+"""
+from typing import Any, Dict, List, Tuple
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import numpy as np
+
+ENDPOINTS = ("query", "stream", "selected", "batch", "health")
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    # "query=5,stream=2,selected=2,batch=1"
+    mix = {}
+    for item in spec.split(","):
+        name, weight = item.split("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}, expected one of {ENDPOINTS}")
+        mix[name] = float(weight)
+    return mix
+
+
+def load_questions(path: str) -> List[Dict[str, str]]:
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            questions.append({
+                "chapter_id": str(record.get("chapter_id") or record.get("request_id") or f"chapter-{i}"),
+                "question": record.get("question") or record.get("title") or "",
+                "body": record.get("selected_text") or record.get("body") or "",
+            })
+    return [q for q in questions if q["question"]]
+
+
+def configure_environment(args, workdir: str):
+    """Point every dependency at a local stand-in; must run before main is imported."""
+    for key in ("OPENROUTER_API_KEY", "OPENAI_API_KEY", "GEMINI_API_KEY", "COHERE_API_KEY", "QDRANT_URL", "QDRANT_API_KEY"):
+        os.environ[key] = ""
+    caches = "true" if args.caches else "false"
+    os.environ.update({
+        "RAG_SERVICE": args.service,
+        "VECTOR_BACKEND": "memory",
+        "NEON_DATABASE_URL": "stand-in",
+        "SPARSE_INDEX_PATH": os.path.join(workdir, "sparse_index.sqlite3"),
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "SEMANTIC_CACHE_ENABLED": caches,
+        "ANSWER_CACHE_ENABLED": caches,
+        "READINESS_PROBE_INTERVAL_SECONDS": "3600",
+    })
+
+
+def install_stand_ins(args):
+    from benchmarks.stand_ins import HashingEmbeddings, StandInDBService
+    import src.services.db_service as db_service
+    import src.services.rag_service as rag_service
+    import simple_rag_service
+
+    embeddings = HashingEmbeddings(size=args.embedding_size, latency_seconds=args.embedding_latency_ms / 1000)
+    create_embeddings = lambda: (embeddings, args.embedding_size)
+    rag_service.create_embeddings = create_embeddings
+    simple_rag_service.create_embeddings = create_embeddings
+    db_service.NeonDBService = lambda: StandInDBService(latency_seconds=args.db_latency_ms / 1000)
+
+
+def attach_llm(app, args):
+    """Swap the (unconfigured) LLM of the running service for the stand-in."""
+    from benchmarks.stand_ins import StandInChatModel
+    from src.services.llm_router import LLMRouter
+
+    service = app.state.rag_service
+    model = StandInChatModel(latency_seconds=args.llm_latency_ms / 1000, token_seconds=args.token_delay_ms / 1000)
+    service.llm_candidates = [("stand-in", model)]
+    service.llm = LLMRouter.from_env(service.llm_candidates)
+    service.qa_chain = service._build_qa_chain() if hasattr(service, "_build_qa_chain") else service._build_chain()
+    app.state.rag_service_available = True
+
+
+async def ingest(client, questions: List[Dict[str, str]]):
+    job_ids = []
+    for item in {q["chapter_id"]: q for q in questions if q["body"]}.values():
+        response = await client.post("/api/ingest-content", json={
+            "chapter_id": item["chapter_id"], "content_markdown": item["body"],
+        })
+        if response.status_code in (200, 202):
+            job_ids.append(response.json()["job_id"])
+    for job_id in job_ids:
+        while (await client.get(f"/api/ingest-jobs/{job_id}")).json()["status"] not in ("completed", "failed"):
+            await asyncio.sleep(0.02)
+    return len(job_ids)
+
+
+async def stream_request(app, path: str, payload: Dict[str, Any]) -> Tuple[int, float]:
+    """
+    POST to a streaming endpoint straight through the ASGI interface, since
+    httpx's ASGI transport buffers the whole body and would hide the time
+    to first byte.
+
+    Returns:
+        (status code, seconds until the first non-empty body chunk)
+    """
+    body = json.dumps(payload).encode("utf-8")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("ascii"),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"benchmark"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("ascii"))],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    started = time.perf_counter()
+    request_sent = False
+    status, first_byte = 500, None
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # The client never disconnects; the app cancels this wait when it is done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status, first_byte
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body") and first_byte is None:
+            first_byte = time.perf_counter() - started
+
+    await app(scope, receive, send)
+    return status, first_byte or 0.0
+
+
+async def send(client, app, endpoint: str, item: Dict[str, str], batch: List[Dict[str, str]]) -> Tuple[bool, float]:
+    """Issue one request; returns (ok, time to first byte in seconds)."""
+    started = time.perf_counter()
+    if endpoint == "health":
+        response = await client.get("/api/health")
+    elif endpoint == "query":
+        response = await client.post("/api/query", json={"question": item["question"]})
+    elif endpoint == "selected":
+        response = await client.post("/api/ask-selected", json={
+            "selected_text": item["body"][:600] or item["question"],
+            "question": item["question"],
+            "chapter_id": item["chapter_id"],
+        })
+    elif endpoint == "batch":
+        response = await client.post("/api/query/batch", json={
+            "questions": [{"question": q["question"]} for q in batch],
+        })
+    else:
+        status, first_byte = await stream_request(app, "/api/query/stream", {"question": item["question"]})
+        return status == 200, first_byte
+    ok = response.status_code == 200 and not (endpoint == "batch" and any(r["error"] for r in response.json()["results"]))
+    return ok, time.perf_counter() - started
+
+
+async def run_load(client, app, questions: List[Dict[str, str]], args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    mix = args.mix
+    names, weights = list(mix), list(mix.values())
+    schedule = [
+        (rng.choices(names, weights)[0], rng.choice(questions), rng.sample(questions, min(args.batch_size, len(questions))))
+        for _ in range(args.warmup + args.requests)
+    ]
+    samples: Dict[str, List[Tuple[bool, float, float]]] = {name: [] for name in names}
+    position = 0
+
+    async def worker():
+        nonlocal position
+        while position < len(schedule):
+            index, position = position, position + 1
+            endpoint, item, batch = schedule[index]
+            started = time.perf_counter()
+            try:
+                ok, first_byte = await send(client, app, endpoint, item, batch)
+            except Exception as e:
+                print(f"{endpoint} request failed: {e}", file=sys.stderr)
+                ok, first_byte = False, 0.0
+            if index >= args.warmup:
+                samples[endpoint].append((ok, time.perf_counter() - started, first_byte))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    def summarize(rows: List[Tuple[bool, float, float]]) -> Dict[str, Any]:
+        if not rows:
+            return {"requests": 0}
+        latencies = np.array([latency for _, latency, _ in rows]) * 1000
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        return {
+            "requests": len(rows),
+            "errors": sum(1 for ok, _, _ in rows if not ok),
+            "throughput_rps": len(rows) / elapsed,
+            "mean_ms": float(latencies.mean()),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+        }
+
+    endpoints = {}
+    for name, rows in samples.items():
+        endpoints[name] = summarize(rows)
+        if name == "stream" and rows:
+            first_bytes = np.array([first_byte for _, _, first_byte in rows]) * 1000
+            endpoints[name]["ttfb_p50_ms"], endpoints[name]["ttfb_p95_ms"] = map(float, np.percentile(first_bytes, [50, 95]))
+    return {
+        "elapsed_seconds": elapsed,
+        "overall": summarize([row for rows in samples.values() for row in rows]),
+        "endpoints": endpoints,
+    }
+
+
+async def benchmark(args) -> Dict[str, Any]:
+    questions = load_questions(args.questions)
+    if not questions:
+        raise SystemExit(f"No questions found in {args.questions}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(args, workdir)
+        install_stand_ins(args)
+        import httpx
+        import main
+
+        async with main.lifespan(main.app):
+            attach_llm(main.app, args)
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+                ingested = await ingest(client, questions)
+                report = await run_load(client, main.app, questions, args)
+                stats = (await client.get("/api/stats")).json()
+
+    return {
+        "config": {
+            "service": args.service,
+            "questions_file": os.path.relpath(args.questions, REPO_ROOT),
+            "questions": len(questions),
+            "chapters_ingested": ingested,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "mix": args.mix,
+            "batch_size": args.batch_size,
+            "caches": args.caches,
+            "llm_latency_ms": args.llm_latency_ms,
+            "token_delay_ms": args.token_delay_ms,
+            "embedding_latency_ms": args.embedding_latency_ms,
+            "db_latency_ms": args.db_latency_ms,
+            "seed": args.seed,
+        },
+        **report,
+        "service_stats": stats,
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="In-process load test of the API with local stand-ins.")
+    parser.add_argument("--questions", default=os.path.join(REPO_ROOT, "requests.jsonl"),
+                        help="JSONL file with question/title and body/selected_text per line")
+    parser.add_argument("--service", choices=("retrieval", "simple"), default="retrieval")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests (after warm-up)")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("query=5,stream=2,selected=2,batch=1"),
+                        help="Endpoint weights, e.g. query=5,stream=2,selected=2,batch=1,health=0")
+    parser.add_argument("--batch-size", type=int, default=5, help="Questions per /api/query/batch request")
+    parser.add_argument("--caches", action="store_true", help="Keep the answer and semantic caches enabled")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="Stand-in LLM time to first token")
+    parser.add_argument("--token-delay-ms", type=float, default=2.0, help="Stand-in LLM delay per token")
+    parser.add_argument("--embedding-latency-ms", type=float, default=5.0)
+    parser.add_argument("--embedding-size", type=int, default=1536)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    # The app logs with print(); keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(benchmark(args))
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,388 @@
+"""
+Retrieval quality-vs-latency benchmark for the collection settings.
+
+Builds a Qdrant collection per (chunk size, quantization) from a labeled
+set of markdown chapters, embedded with the deterministic hashing stand-in,
+and asks every labeled question through VectorStoreService.search_documents
+for each HNSW ef and k. A question is a hit at k when one of its top-k
+chunks belongs to the labeled chapter. Reports recall@k, MRR@k, per-query
+search latency and the estimated index RAM as a table (and JSON with
+--output) for picking production settings.
+
+The default dataset is benchmarks/retrieval_set: chapters as markdown files
+(chapter ID = path without extension, module ID = its directory, as in
+ingest_textbook.py) and questions.jsonl with {"question", "chapter_id"}
+per line. --distractors pads the collection with chapters of random corpus
+words, so latency and memory can be measured at a realistic size.
+
+Without --qdrant-url the collection lives in Qdrant's local mode
+(":memory:"), which always searches exactly: chunk size and k change the
+results, but HNSW ef and quantization only change the memory estimate, and
+latencies are those of a brute-force scan in Python rather than a server.
+Point --qdrant-url at a Qdrant server to measure them; the server only
+builds the HNSW graph once a segment exceeds its indexing threshold (about
+3,000 points of 1536 dimensions by default), so pad small sets with
+--distractors.
+
+Usage:
+    python -m benchmarks.retrieval_benchmark --chunk-sizes 200,400,800 --k 1,3,5,10 --output retrieval.json
+    python -m benchmarks.retrieval_benchmark --qdrant-url http://localhost:6333 --distractors 5000 \\
+        --quantization none,scalar,binary --hnsw-ef 16,64,128
+"""
+from dataclasses import replace
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import numpy as np
+
+DEFAULT_DATASET = os.path.join(REPO_ROOT, "benchmarks", "retrieval_set")
+
+# Qdrant's default HNSW m when the collection does not set one
+DEFAULT_HNSW_M = 16
+
+
+def parse_ints(spec: str) -> List[Optional[int]]:
+    # "16,64,none"; "none" leaves the setting at the server default
+    return [None if item.strip().lower() in ("none", "default") else int(item) for item in spec.split(",")]
+
+
+def parse_quantization(spec: str) -> List[str]:
+    from src.services.collection_settings import QUANTIZATION_MODES
+
+    modes = [item.strip().lower() for item in spec.split(",")]
+    for mode in modes:
+        if mode not in QUANTIZATION_MODES:
+            raise argparse.ArgumentTypeError(f"unknown quantization {mode!r}, expected one of {QUANTIZATION_MODES}")
+    return modes
+
+
+def load_dataset(root: str) -> Tuple[List[Tuple[str, str, str]], List[Dict[str, str]]]:
+    """
+    Read the labeled set.
+
+    Returns:
+        ([(chapter_id, module_id, markdown)], [{"question", "chapter_id"}])
+    """
+    from ingest_textbook import find_chapters
+
+    chapters = []
+    for chapter_id, path in find_chapters(root):
+        with open(path, encoding="utf-8") as f:
+            chapters.append((chapter_id, os.path.dirname(chapter_id), f.read()))
+
+    questions = []
+    with open(os.path.join(root, "questions.jsonl"), encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                questions.append({"question": record["question"], "chapter_id": record["chapter_id"]})
+
+    known = {chapter_id for chapter_id, _, _ in chapters}
+    unknown = sorted({q["chapter_id"] for q in questions} - known)
+    if unknown:
+        raise SystemExit(f"Questions reference chapters not in {root}: {', '.join(unknown)}")
+    return chapters, questions
+
+
+def distractor_chapters(chapters: List[Tuple[str, str, str]], count: int, words: int, seed: int) -> List[Tuple[str, str, str]]:
+    """
+    Chapters of random words drawn from the corpus vocabulary. They share
+    terms with the real chapters (so they compete for every query) but
+    never answer a question.
+    """
+    from src.services.sparse_index import tokenize
+
+    vocabulary = sorted({token for _, _, markdown in chapters for token in tokenize(markdown)})
+    rng = random.Random(seed)
+    distractors = []
+    for i in range(count):
+        paragraphs = []
+        for _ in range(max(1, words // 60)):
+            paragraphs.append(" ".join(rng.choices(vocabulary, k=60)).capitalize() + ".")
+        distractors.append((f"distractors/{i:05d}", "distractors", f"# Distractor {i}\n\n" + "\n\n".join(paragraphs)))
+    return distractors
+
+
+def make_client(args):
+    from qdrant_client import QdrantClient
+
+    if args.qdrant_url:
+        return QdrantClient(url=args.qdrant_url, api_key=args.qdrant_api_key or None, timeout=60)
+    return QdrantClient(location=":memory:")
+
+
+def make_store(client, collection_name: str, settings, chunk_size: int, chunk_overlap: int, embeddings, dimensions: int):
+    """
+    A VectorStoreService on the given client and settings. The constructor
+    is bypassed because it would open (and reconfigure) the production
+    collection named in the environment.
+    """
+    from src.services.chunking import MarkdownChunker
+    from src.services.vector_store_service import VectorStoreService
+
+    store = VectorStoreService.__new__(VectorStoreService)
+    store.qdrant_url = None
+    store.qdrant_api_key = None
+    store.client = client
+    store.collection_name = collection_name
+    store.collection_settings = settings
+    store.embeddings = None
+    store.embed_batch_size = 96
+    store.chunker = MarkdownChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    store.sparse_index = None
+    store.set_embeddings(embeddings, dimensions)
+    return store
+
+
+def build_collection(store, chapters: List[Tuple[str, str, str]], batch_size: int = 256) -> int:
+    """
+    Chunk, embed and bulk-upload every chapter. The collection starts empty,
+    so the per-chapter diff of ingest_chapter (a scroll per chapter) is
+    skipped; points and payloads are the ones ingestion would write.
+
+    Returns:
+        Number of chunks uploaded
+    """
+    from src.services.vector_store_service import point_id
+
+    batch: List[Tuple[str, str, Dict[str, Any]]] = []
+    uploaded = 0
+
+    def upload():
+        vectors = np.asarray(store.embeddings.embed_documents([text for _, text, _ in batch]), dtype=np.float32)
+        store.client.upload_collection(
+            collection_name=store.collection_name,
+            vectors=vectors,
+            payload=[store.chunk_payload(metadata["chapter_id"], text, metadata) for _, text, metadata in batch],
+            ids=[chunk_id for chunk_id, _, _ in batch],
+            batch_size=batch_size,
+            wait=True,
+        )
+
+    for chapter_id, module_id, markdown in chapters:
+        for chunk in store.chunker.split(markdown):
+            metadata = {
+                "module_id": module_id,
+                "chapter_id": chapter_id,
+                "heading_path": chunk.heading_path,
+                "section": " > ".join(chunk.heading_path),
+                "chunk_index": chunk.chunk_index,
+                "token_count": chunk.token_count,
+            }
+            batch.append((point_id(chapter_id, chunk.chunk_index), chunk.text, metadata))
+            if len(batch) == batch_size:
+                upload()
+                uploaded += len(batch)
+                batch = []
+    if batch:
+        upload()
+        uploaded += len(batch)
+    return uploaded
+
+
+def wait_until_indexed(store, timeout: float = 600.0):
+    """Block until the server's optimizers have finished (HNSW and quantized copies built)."""
+    from qdrant_client.http import models
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if store.client.get_collection(store.collection_name).status == models.CollectionStatus.GREEN:
+            return
+        time.sleep(0.5)
+    print(f"Warning: {store.collection_name} still optimizing after {timeout:.0f}s", file=sys.stderr)
+
+
+def index_memory(points: int, dimensions: int, settings) -> Dict[str, float]:
+    """
+    Estimated index size in MB, as a Qdrant server would hold it: float32
+    originals, the quantized copy (int8 or 1 bit per dimension) and the
+    level-0 HNSW links (2 * m ids of 4 bytes per point). Payloads and
+    upper graph levels are left out. Originals count towards RAM unless
+    stored on disk, quantized vectors unless not pinned to RAM.
+    """
+    megabyte = 1024 * 1024
+    vectors = points * dimensions * 4 / megabyte
+    quantized = {
+        "none": 0.0,
+        "scalar": points * dimensions / megabyte,
+        "binary": points * ((dimensions + 7) // 8) / megabyte,
+    }[settings.quantization]
+    graph = points * 2 * (settings.hnsw_m or DEFAULT_HNSW_M) * 4 / megabyte
+    ram = graph + (0.0 if settings.on_disk_vectors else vectors) + (quantized if settings.quantization_always_ram else 0.0)
+    return {"vectors_mb": vectors, "quantized_mb": quantized, "graph_mb": graph, "ram_mb": ram}
+
+
+def evaluate(store, query_vectors: List[List[float]], questions: List[Dict[str, str]], k: int, repeats: int) -> Dict[str, Any]:
+    """Recall@k, MRR@k and search latency of one configuration."""
+    store.search_documents(query_vectors[0], limit=k)  # warm-up
+    latencies = []
+    hits, reciprocal_ranks = 0, 0.0
+    for vector, question in zip(query_vectors, questions):
+        for _ in range(repeats):
+            started = time.perf_counter()
+            results = store.search_documents(vector, limit=k)
+            latencies.append(time.perf_counter() - started)
+        chapters = [result.get("metadata", {}).get("chapter_id") or result.get("doc_id") for result in results]
+        if question["chapter_id"] in chapters:
+            hits += 1
+            reciprocal_ranks += 1.0 / (chapters.index(question["chapter_id"]) + 1)
+
+    latencies_ms = np.array(latencies) * 1000
+    p50, p95 = np.percentile(latencies_ms, [50, 95])
+    return {
+        "recall": hits / len(questions),
+        "mrr": reciprocal_ranks / len(questions),
+        "mean_ms": float(latencies_ms.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+    }
+
+
+def run_sweep(args, chapters, questions) -> List[Dict[str, Any]]:
+    from benchmarks.stand_ins import HashingEmbeddings
+    from src.services.collection_settings import CollectionSettings
+
+    embeddings = HashingEmbeddings(size=args.embedding_size)
+    query_vectors = embeddings.embed_documents([q["question"] for q in questions])
+    client = make_client(args)
+    rows = []
+
+    for chunk_size in args.chunk_sizes:
+        chunk_overlap = min(args.chunk_overlap, chunk_size // 4)
+        for quantization in args.quantization:
+            settings = CollectionSettings(
+                quantization=quantization,
+                oversampling=args.oversampling,
+                rescore=not args.no_rescore,
+                on_disk_vectors=args.on_disk_vectors,
+                hnsw_m=args.hnsw_m,
+            )
+            collection_name = f"retrieval_benchmark_{chunk_size}_{quantization}"
+            if client.collection_exists(collection_name):
+                client.delete_collection(collection_name)
+            store = make_store(client, collection_name, settings, chunk_size, chunk_overlap, embeddings, args.embedding_size)
+
+            started = time.perf_counter()
+            build_collection(store, chapters)
+            if args.qdrant_url:
+                wait_until_indexed(store)
+            build_seconds = time.perf_counter() - started
+            points = client.count(collection_name, exact=True).count
+            memory = index_memory(points, args.embedding_size, settings)
+
+            for hnsw_ef in args.hnsw_ef:
+                store.collection_settings = replace(settings, hnsw_ef=hnsw_ef)
+                for k in args.k:
+                    result = evaluate(store, query_vectors, questions, k, args.repeats)
+                    rows.append({
+                        "chunk_size": chunk_size,
+                        "chunk_overlap": chunk_overlap,
+                        "quantization": quantization,
+                        "hnsw_ef": hnsw_ef,
+                        "k": k,
+                        **result,
+                        "points": points,
+                        "build_seconds": build_seconds,
+                        **memory,
+                    })
+                    print(f"chunk={chunk_size} quantization={quantization} ef={hnsw_ef} k={k}: "
+                          f"recall={result['recall']:.3f} p50={result['p50_ms']:.2f}ms", file=sys.stderr)
+            client.delete_collection(collection_name)
+    return rows
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    columns = [
+        ("chunk", "chunk_size", "{}"),
+        ("quant", "quantization", "{}"),
+        ("ef", "hnsw_ef", "{}"),
+        ("k", "k", "{}"),
+        ("recall@k", "recall", "{:.3f}"),
+        ("MRR@k", "mrr", "{:.3f}"),
+        ("p50 ms", "p50_ms", "{:.2f}"),
+        ("p95 ms", "p95_ms", "{:.2f}"),
+        ("points", "points", "{}"),
+        ("RAM MB", "ram_mb", "{:.2f}"),
+    ]
+    lines = [
+        "| " + " | ".join(title for title, _, _ in columns) + " |",
+        "|" + "|".join("---" for _ in columns) + "|",
+    ]
+    for row in rows:
+        cells = ["default" if row[key] is None else fmt.format(row[key]) for _, key, fmt in columns]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Recall@k, MRR and search latency across chunking and collection settings.")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET,
+                        help="Directory of markdown chapters plus questions.jsonl ({question, chapter_id} per line)")
+    parser.add_argument("--chunk-sizes", type=parse_ints, default=parse_ints("200,400,800"), help="Chunk sizes in tokens")
+    parser.add_argument("--chunk-overlap", type=int, default=60, help="Chunk overlap in tokens (capped at a quarter of the chunk size)")
+    parser.add_argument("--k", type=parse_ints, default=parse_ints("1,3,5,10"), help="Result limits to evaluate")
+    parser.add_argument("--hnsw-ef", type=parse_ints, default=parse_ints("none"), help="Search-time HNSW ef values, e.g. 16,64,128")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW m of the built collections (server default 16)")
+    parser.add_argument("--quantization", type=parse_quantization,
+                        help="Quantization modes to build, e.g. none,scalar,binary (default: all with --qdrant-url, else none)")
+    parser.add_argument("--oversampling", type=float, default=2.0, help="Quantized search oversampling")
+    parser.add_argument("--no-rescore", action="store_true", help="Skip re-ranking quantized candidates on the originals")
+    parser.add_argument("--on-disk-vectors", action="store_true", help="Store original vectors on disk")
+    parser.add_argument("--distractors", type=int, default=0, help="Random-word chapters added to the collection")
+    parser.add_argument("--distractor-words", type=int, default=600)
+    parser.add_argument("--embedding-size", type=int, default=1536)
+    parser.add_argument("--repeats", type=int, default=3, help="Timed searches per question and configuration")
+    parser.add_argument("--qdrant-url", help="Benchmark against this Qdrant server instead of local mode")
+    parser.add_argument("--qdrant-api-key")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args(argv)
+    if args.quantization is None:
+        args.quantization = ["none", "scalar", "binary"] if args.qdrant_url else ["none"]
+    if not args.qdrant_url and (args.quantization != ["none"] or args.hnsw_ef != [None]):
+        print("Note: local mode searches exactly, so quantization and hnsw_ef only change the memory estimate", file=sys.stderr)
+
+    chapters, questions = load_dataset(args.dataset)
+    if not questions:
+        raise SystemExit(f"No questions found in {args.dataset}")
+    corpus = chapters + distractor_chapters(chapters, args.distractors, args.distractor_words, args.seed)
+
+    # The services log with print(); keep stdout for the table
+    with contextlib.redirect_stdout(sys.stderr):
+        rows = run_sweep(args, corpus, questions)
+
+    report = {
+        "config": {
+            "dataset": os.path.relpath(args.dataset, REPO_ROOT),
+            "chapters": len(chapters),
+            "distractors": args.distractors,
+            "questions": len(questions),
+            "embedding": f"hashing-{args.embedding_size}",
+            "backend": args.qdrant_url or ":memory: (exact search; hnsw_ef and quantization do not affect results)",
+            "oversampling": args.oversampling,
+            "rescore": not args.no_rescore,
+            "on_disk_vectors": args.on_disk_vectors,
+            "repeats": args.repeats,
+            "seed": args.seed,
+        },
+        "results": rows,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(json.dumps(report, indent=2) + "\n")
+    print(format_table(rows))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Deterministic local stand-ins for the external services, used by the
+benchmarks so runs need no API keys or network and are comparable.
+"""
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+import asyncio
+import hashlib
+import itertools
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.services.db_service import NeonDBService
+from src.services.sparse_index import tokenize
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Feature-hashed bag of words and bigrams, L2-normalized.
+
+    Unlike random fake embeddings, texts sharing terms get similar vectors,
+    so retrieval quality measured with it is meaningful (lexically). Hashes
+    use blake2b, so vectors are identical across processes.
+    """
+
+    def __init__(self, size: int = 1536, latency_seconds: float = 0.0):
+        self.size = size
+        self.latency_seconds = latency_seconds
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        tokens = tokenize(text)
+        vector = np.zeros(self.size, dtype=np.float32)
+        for feature in itertools.chain(tokens, (f"{a} {b}" for a, b in zip(tokens, tokens[1:]))):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.size] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class StandInChatModel(BaseChatModel):
+    """
+    Chat model that answers after a fixed delay with a short deterministic
+    text derived from the prompt; streams it token by token.
+    """
+
+    latency_seconds: float = 0.05  # time to first token
+    token_seconds: float = 0.002  # delay between streamed tokens
+    answer_tokens: int = 40
+
+    @property
+    def _llm_type(self) -> str:
+        return "stand-in"
+
+    def _answer(self, messages: List[BaseMessage]) -> List[str]:
+        digest = hashlib.sha256("".join(str(m.content) for m in messages).encode("utf-8")).hexdigest()
+        return [f" {digest[i % 60:i % 60 + 4]}" for i in range(self.answer_tokens)]
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_seconds + self.token_seconds * self.answer_tokens)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self._answer(messages))))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_seconds + self.token_seconds * self.answer_tokens)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self._answer(messages))))])
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency_seconds)
+        for token in self._answer(messages):
+            time.sleep(self.token_seconds)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency_seconds)
+        for token in self._answer(messages):
+            await asyncio.sleep(self.token_seconds)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class StandInDBService(NeonDBService):
+    """In-memory NeonDBService: every query costs a fixed delay instead of a round trip."""
+
+    def __init__(self, latency_seconds: float = 0.002):
+        super().__init__()
+        self.database_url = "stand-in"
+        self.latency_seconds = latency_seconds
+        self.chat_history: List[Dict[str, Any]] = []
+        self._ingestion_logs: Dict[int, Dict[str, Any]] = {}
+
+    async def _round_trip(self):
+        await asyncio.sleep(self.latency_seconds)
+
+    async def connect(self):
+        await self._round_trip()
+        return True
+
+    async def ping(self) -> bool:
+        await self._round_trip()
+        return True
+
+    async def create_tables(self):
+        await self._round_trip()
+
+    def start_history_writer(self):
+        pass
+
+    async def stop_history_writer(self):
+        pass
+
+    async def get_or_create_user(self, username: str, email: str) -> Optional[int]:
+        if username not in self._user_ids_by_name:
+            await self._round_trip()
+            self._user_ids_by_name[username] = len(self._user_ids_by_name) + 1
+        return self._user_ids_by_name[username]
+
+    def enqueue_chat_history(self, user_id: int, question: str, answer: str, source_documents: List[str] = None) -> bool:
+        self.chat_history.append({"user_id": user_id, "question": question, "answer": answer})
+        return True
+
+    async def save_chat_history(self, user_id: int, question: str, answer: str, source_documents: List[str] = None) -> Optional[int]:
+        await self._round_trip()
+        self.enqueue_chat_history(user_id, question, answer, source_documents)
+        return len(self.chat_history)
+
+    async def get_chat_history_page(self, user_id: int, limit: int = 20, cursor: str = None) -> Dict[str, Any]:
+        await self._round_trip()
+        return {"items": [], "next_cursor": None}
+
+    async def log_content_ingestion(self, chapter_id: str, content_preview: str, status: str = "completed", job_id: str = None) -> Optional[int]:
+        await self._round_trip()
+        log_id = len(self._ingestion_logs) + 1
+        self._ingestion_logs[log_id] = {"chapter_id": chapter_id, "status": status, "job_id": job_id}
+        return log_id
+
+    async def update_content_ingestion(self, log_id: int, status: str = None, progress: float = None, error: str = None, result: Dict[str, Any] = None) -> bool:
+        await self._round_trip()
+        if status is not None:
+            self._ingestion_logs.get(log_id, {}).update(status=status)
+        return True
+
+    async def get_content_ingestion_by_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return None
+
+    async def close(self):
+        pass
@@ -0,0 +1,208 @@
+"""
+Bulk textbook ingestion.
+
+Walks a directory of markdown chapters, chunks each one, embeds the new or
+changed chunks in batches on a bounded thread pool, and writes them to Qdrant
+as contiguous float32 arrays through the bulk upload API. Completed chapters
+are recorded in a checkpoint file so an interrupted run resumes where it
+stopped.
+
+Usage:
+    python ingest_textbook.py docs/ --concurrency 4 --batch-size 96
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Tuple
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+if os.getenv("ENV") != "production":
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except Exception:
+        pass
+
+from src.services.embeddings import create_embeddings
+from src.services.vector_store_service import ChapterSyncPlan, VectorStoreService
+
+MARKDOWN_EXTENSIONS = (".md", ".mdx")
+
+
+def find_chapters(root: str) -> Iterator[Tuple[str, str]]:
+    """Yield (chapter_id, path) for every markdown file under root, in sorted order."""
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(MARKDOWN_EXTENSIONS):
+                path = os.path.join(directory, filename)
+                chapter_id = os.path.splitext(os.path.relpath(path, root))[0].replace(os.sep, "/")
+                yield chapter_id, path
+
+
+def load_checkpoint(path: str) -> Dict[str, str]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("chapters", {})
+
+
+def save_checkpoint(path: str, chapters: Dict[str, str]):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"chapters": chapters}, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+class BulkIngestor:
+    """
+    Streams chunk batches from many chapters through the embeddings client
+    with at most `concurrency` batches in flight, and uploads each embedded
+    batch as soon as it is ready.
+    """
+
+    def __init__(self, vector_store: VectorStoreService, batch_size: int, concurrency: int, checkpoint_path: str):
+        self.vector_store = vector_store
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint = load_checkpoint(checkpoint_path)
+
+        self.chunks_embedded = 0
+        self.chapters_done = 0
+        self.started_at = time.perf_counter()
+
+        # Per-chapter bookkeeping until all of its batches are uploaded
+        self._pending: Dict[str, int] = {}
+        self._plans: Dict[str, ChapterSyncPlan] = {}
+        self._file_hashes: Dict[str, str] = {}
+
+    def _embed_batch(self, batch: List[Tuple[str, str, str, Dict]]) -> Tuple[List[Tuple[str, str, str, Dict]], np.ndarray]:
+        vectors = self.vector_store.embeddings.embed_documents([text for _, _, text, _ in batch])
+        return batch, np.asarray(vectors, dtype=np.float32)
+
+    def _upload(self, batch: List[Tuple[str, str, str, Dict]], vectors: np.ndarray):
+        self.vector_store.client.upload_collection(
+            collection_name=self.vector_store.collection_name,
+            vectors=vectors,
+            payload=[self.vector_store.chunk_payload(chapter_id, text, metadata) for chapter_id, _, text, metadata in batch],
+            ids=[chunk_id for _, chunk_id, _, _ in batch],
+            batch_size=self.batch_size,
+            # Batches are already concurrent via the embedding pool; parallel > 1
+            # would spawn a fresh process pool for every batch
+            parallel=1,
+            wait=True,
+        )
+        self.chunks_embedded += len(batch)
+        for chapter_id, _, _, _ in batch:
+            self._pending[chapter_id] -= 1
+        for chapter_id in {chapter_id for chapter_id, _, _, _ in batch}:
+            if self._pending[chapter_id] == 0:
+                self._finish_chapter(chapter_id)
+
+    def _finish_chapter(self, chapter_id: str):
+        plan = self._plans.pop(chapter_id)
+        del self._pending[chapter_id]
+        self.vector_store.delete_points(plan.stale_ids)
+        if self.vector_store.sparse_index:
+            self.vector_store.sparse_index.replace_chapter(chapter_id, plan.chunks)
+
+        self.checkpoint[chapter_id] = self._file_hashes.pop(chapter_id)
+        save_checkpoint(self.checkpoint_path, self.checkpoint)
+
+        self.chapters_done += 1
+        elapsed = time.perf_counter() - self.started_at
+        print(
+            f"[{self.chapters_done}] {chapter_id}: {plan.total_chunks} chunks, "
+            f"{len(plan.changed)} embedded, {len(plan.stale_ids)} deleted | "
+            f"{self.chunks_embedded} chunks in {elapsed:.1f}s ({self.chunks_embedded / elapsed if elapsed else 0:.1f} chunks/s)"
+        )
+
+    def _batches(self, chapters: List[Tuple[str, str]]) -> Iterator[List[Tuple[str, str, str, Dict]]]:
+        batch: List[Tuple[str, str, str, Dict]] = []
+        for chapter_id, path in chapters:
+            with open(path, encoding="utf-8") as f:
+                content = f.read()
+            file_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+            if self.checkpoint.get(chapter_id) == file_hash:
+                continue
+
+            metadata = {"source": f"chapter_{chapter_id}", "type": "markdown", "path": path}
+            # Chapters live in one directory per module (docs/<module>/<chapter>.md)
+            module_id = os.path.dirname(chapter_id)
+            if module_id:
+                metadata["module_id"] = module_id
+            plan = self.vector_store.plan_chapter(chapter_id, content, metadata=metadata)
+            self._plans[chapter_id] = plan
+            self._file_hashes[chapter_id] = file_hash
+            self._pending[chapter_id] = len(plan.changed)
+            if not plan.changed:
+                self._finish_chapter(chapter_id)
+                continue
+
+            for chunk_id, text, metadata in plan.changed:
+                batch.append((chapter_id, chunk_id, text, metadata))
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def run(self, chapters: List[Tuple[str, str]]):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            in_flight = set()
+            for batch in self._batches(chapters):
+                if len(in_flight) >= self.concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._upload(*future.result())
+                in_flight.add(executor.submit(self._embed_batch, batch))
+            for future in wait(in_flight).done:
+                self._upload(*future.result())
+
+        elapsed = time.perf_counter() - self.started_at
+        print(
+            f"Done: {self.chapters_done} chapters, {self.chunks_embedded} chunks embedded in {elapsed:.1f}s "
+            f"({self.chunks_embedded / elapsed if elapsed else 0:.1f} chunks/s)"
+        )
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory of markdown chapters into Qdrant.")
+    parser.add_argument("directory", help="Directory containing markdown chapters (.md / .mdx)")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("EMBEDDING_BATCH_SIZE", "96")),
+                        help="Chunks per embedding request and upload batch")
+    parser.add_argument("--concurrency", type=int, default=4, help="Embedding batches in flight")
+    parser.add_argument("--checkpoint", default=".cache/ingest_checkpoint.json",
+                        help="Checkpoint file recording completed chapters")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and process every chapter")
+    args = parser.parse_args(argv)
+
+    embeddings, dimensions = create_embeddings()
+    if embeddings is None:
+        print("No embeddings API key configured; set COHERE_API_KEY or OPENAI_API_KEY.")
+        return 1
+
+    vector_store = VectorStoreService()
+    vector_store.set_embeddings(embeddings, dimensions)
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    chapters = list(find_chapters(args.directory))
+    print(f"Found {len(chapters)} chapters in {args.directory}")
+
+    BulkIngestor(vector_store, args.batch_size, args.concurrency, args.checkpoint).run(chapters)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
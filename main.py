@@ -1,8 +1,14 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Dict, Any, AsyncIterator, Optional
+from datetime import datetime
+import asyncio
+import json
 import os
+import time
 from contextlib import asynccontextmanager
 
 # -------------------------------------------------------------------
@@ -21,17 +27,28 @@ if os.getenv("ENV") != "production":
 # -------------------------------------------------------------------
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    startup_started = time.perf_counter()
+    app.state.readiness = None
     try:
         # Import services here (NOT at module level)
         from src.services.db_service import NeonDBService
-        from simple_rag_service import SimpleRAGService
+        from src.services.readiness import ReadinessProbe
+
+        readiness = ReadinessProbe.from_env()
 
         # ----------------------
         # Database initialization
         # ----------------------
         db_service = NeonDBService()
+        if not db_service.database_url:
+            readiness.add_disabled("neon", "NEON_DATABASE_URL not set")
+        else:
+            # Chat history is optional, so the database never blocks readiness
+            readiness.add_check("neon", db_service.ping, required=False)
+
         if await db_service.connect():
             await db_service.create_tables()
+            db_service.start_history_writer()
             print("✅ Database initialized")
         else:
             print("❌ Database connection failed")
@@ -42,7 +59,14 @@ async def lifespan(app: FastAPI):
         # ----------------------
         # RAG / LLM initialization
         # ----------------------
-        rag_service = SimpleRAGService()
+        # RAG_SERVICE=retrieval answers from the ingested textbook (Qdrant);
+        # the default "simple" service answers from general knowledge.
+        if os.getenv("RAG_SERVICE", "simple") == "retrieval":
+            from src.services.rag_service import RAGService
+            rag_service = RAGService()
+        else:
+            from simple_rag_service import SimpleRAGService
+            rag_service = SimpleRAGService()
 
         app.state.rag_service = rag_service
         app.state.rag_service_available = rag_service.llm is not None
@@ -52,18 +76,76 @@ async def lifespan(app: FastAPI):
             app.state.rag_service_available
         )
 
+        # Providers are only constructed above; the probe verifies them.
+        # Without a provider the service answers with mock responses, which
+        # must not keep the replica out of rotation.
+        if rag_service.llm:
+            readiness.add_check("llm", rag_service.aprobe_llm)
+        else:
+            readiness.add_disabled("llm", "no LLM API key configured (mock responses)")
+
+        # ----------------------
+        # Background ingestion workers
+        # ----------------------
+        app.state.ingestion_jobs = None
+        vector_store_service = getattr(rag_service, "vector_store_service", None)
+        if vector_store_service:
+            from src.services.ingestion_jobs import IngestionJobManager
+
+            readiness.add_check("qdrant", lambda: asyncio.to_thread(vector_store_service.ping))
+
+            def on_ingested(chapter_id, result):
+                # Cached answers grounded in the old chapter text are now stale
+                if result["upserted"] or result["deleted"]:
+                    rag_service.invalidate_chapter(chapter_id)
+
+            app.state.ingestion_jobs = IngestionJobManager(
+                vector_store_service,
+                db_service=db_service,
+                on_complete=on_ingested,
+                workers=int(os.getenv("INGEST_WORKERS", "2")),
+            )
+            await app.state.ingestion_jobs.start()
+
+            # A fresh replica has an empty keyword index, and one can drift
+            # from Qdrant: rebuild it from the chunk payloads without delaying
+            # startup
+            if vector_store_service.sparse_index_needs_backfill():
+                app.state.sparse_backfill = asyncio.create_task(
+                    asyncio.to_thread(vector_store_service.rebuild_sparse_index)
+                )
+        else:
+            readiness.add_disabled("qdrant", "not used by this RAG service")
+
+        # ----------------------
+        # Background readiness probe
+        # ----------------------
+        await readiness.start()
+        app.state.readiness = readiness
+
     except Exception as e:
         print("🔥 Startup error:", e)
         app.state.db_service = None
         app.state.rag_service = None
         app.state.rag_service_available = False
+        app.state.ingestion_jobs = None
+
+    app.state.startup_seconds = round(time.perf_counter() - startup_started, 3)
+    print(f"⏱️ Startup completed in {app.state.startup_seconds}s")
 
     yield  # ---- App is running ----
 
     # ----------------------
     # Shutdown
     # ----------------------
+    if app.state.readiness:
+        await app.state.readiness.stop()
+
+    if app.state.ingestion_jobs:
+        await app.state.ingestion_jobs.stop()
+
     if app.state.db_service:
+        await app.state.db_service.stop_history_writer()  # drain pending chat history
         await app.state.db_service.close()
         print("🛑 Database connection closed")
 
@@ -94,21 +176,130 @@ app.add_middleware(
 # -------------------------------------------------------------------
 class QueryRequest(BaseModel):
     question: str
+    # Optional search scope: only retrieve from this chapter and/or module
+    chapter_id: Optional[str] = None
+    module_id: Optional[str] = None
 
 
 class ChatbotResponse(BaseModel):
     llm_answer: str
     source_documents: List[str]
+    stale: bool = False  # served from cache past its TTL
+
+
+class BatchQueryRequest(BaseModel):
+    questions: List[QueryRequest]
+
+
+class BatchQueryItem(BaseModel):
+    question: str
+    llm_answer: Optional[str] = None
+    source_documents: List[str] = []
+    stale: bool = False
+    error: Optional[str] = None  # set instead of an answer when this question failed
+
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryItem]
 
 
 class SelectedTextRequest(BaseModel):
     selected_text: str
     question: str
+    # Chapter the selection was made in; lets the server find its source chunk directly
+    chapter_id: Optional[str] = None
+
+
+class HistoryItem(BaseModel):
+    id: int
+    question: str
+    answer: str
+    source_documents: List[str]
+    created_at: datetime
+
+
+class HistoryPage(BaseModel):
+    items: List[HistoryItem]
+    next_cursor: Optional[str] = None
 
 
 class IngestContentRequest(BaseModel):
     chapter_id: str
     content_markdown: str
+    module_id: Optional[str] = None
+
+
+# -------------------------------------------------------------------
+# Helpers
+# -------------------------------------------------------------------
+async def save_chat_history(question: str, answer: str, source_documents: List[str]):
+    """
+    Record a question/answer pair for the default user (non-fatal).
+    Rows are queued for the background writer; the user id is cached, so
+    this does not wait on the database after the first call.
+    """
+    db = app.state.db_service
+    if not db:
+        return
+
+    try:
+        user_id = await db.get_or_create_user(
+            username="default_user",
+            email="default@example.com"
+        )
+
+        if user_id and not db.enqueue_chat_history(
+            user_id=user_id,
+            question=question,
+            answer=answer,
+            source_documents=source_documents,
+        ):
+            # Writer not running: fall back to a direct insert
+            await db.save_chat_history(
+                user_id=user_id,
+                question=question,
+                answer=answer,
+                source_documents=source_documents,
+            )
+    except Exception as db_error:
+        print("⚠️ DB error (ignored):", db_error)
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Encode one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_chat_events(
+    events: AsyncIterator[Dict[str, Any]], question: str
+) -> AsyncIterator[str]:
+    """
+    Relay service stream items as SSE and save chat history once the
+    answer has been streamed completely.
+    """
+    answer_parts: List[str] = []
+    source_documents: List[str] = []
+    failed = False
+
+    async for item in events:
+        if item["event"] == "token":
+            answer_parts.append(item["data"])
+        elif item["event"] == "sources":
+            source_documents = item["data"]
+        elif item["event"] == "error":
+            failed = True
+        yield format_sse(item["event"], item["data"])
+
+    yield format_sse("done", {})
+
+    if not failed:
+        await save_chat_history(question, "".join(answer_parts), source_documents)
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # disable proxy buffering (nginx, Railway)
+}
 
 
 # -------------------------------------------------------------------
@@ -119,20 +310,56 @@ def root():
     return {
         "message": "PAHR RAG Chatbot API is running",
         "health": "/api/health",
+        "ready": "/api/ready",
         "query": "/api/query",
+        "query_stream": "/api/query/stream",
+        "query_batch": "/api/query/batch",
         "ask_selected": "/api/ask-selected",
+        "ask_selected_stream": "/api/ask-selected/stream",
         "ingest": "/api/ingest-content",
+        "ingest_jobs": "/api/ingest-jobs/{job_id}",
+        "history": "/api/history",
+        "stats": "/api/stats",
     }
 
 
 @app.get("/api/health")
 def health_check():
+    # Liveness only: no dependency is contacted here, see /api/ready
     return {
         "status": "healthy",
         "rag_service_available": app.state.rag_service_available
     }
 
 
+@app.get("/api/ready")
+def readiness_check():
+    readiness = app.state.readiness
+    if not readiness:
+        return JSONResponse(
+            status_code=503,
+            content={"ready": False, "error": "Startup failed", "startup_seconds": app.state.startup_seconds},
+        )
+
+    body = readiness.snapshot()
+    body["startup_seconds"] = app.state.startup_seconds
+    return JSONResponse(status_code=200 if body["ready"] else 503, content=jsonable_encoder(body))
+
+
+@app.get("/api/stats")
+def stats():
+    rag_service = app.state.rag_service
+
+    if not rag_service:
+        raise HTTPException(503, "RAG service not available")
+
+    stats = rag_service.get_stats()
+    db = app.state.db_service
+    if db and db.history_writer:
+        stats["chat_history_writer"] = db.history_writer.stats()
+    return stats
+
+
 @app.post("/api/query", response_model=ChatbotResponse)
 async def query_chatbot(payload: QueryRequest):
     rag_service = app.state.rag_service
@@ -141,33 +368,19 @@ async def query_chatbot(payload: QueryRequest):
         raise HTTPException(503, "RAG service not available")
 
     try:
-        response = rag_service.query(payload.question)
+        response = await rag_service.aquery(payload.question, payload.chapter_id, payload.module_id)
 
         # Save chat history (optional, non-fatal)
-        db = app.state.db_service
-        if db:
-            try:
-                user_id = 1
-                user = await db.get_user(user_id)
-                if not user:
-                    user_id = await db.add_user(
-                        username="default_user",
-                        email="default@example.com"
-                    )
-
-                if user_id:
-                    await db.save_chat_history(
-                        user_id=user_id,
-                        question=payload.question,
-                        answer=response["llm_answer"],
-                        source_documents=response["source_documents"],
-                    )
-            except Exception as db_error:
-                print("⚠️ DB error (ignored):", db_error)
+        await save_chat_history(
+            payload.question,
+            response["llm_answer"],
+            response["source_documents"],
+        )
 
         return ChatbotResponse(
             llm_answer=response["llm_answer"],
             source_documents=response["source_documents"],
+            stale=response.get("stale", False),
         )
 
     except Exception as e:
@@ -176,48 +389,151 @@ async def query_chatbot(payload: QueryRequest):
         raise HTTPException(500, str(e))
 
 
+@app.post("/api/query/stream")
+async def query_chatbot_stream(payload: QueryRequest):
+    rag_service = app.state.rag_service
+
+    if not rag_service:
+        raise HTTPException(503, "RAG service not available")
+
+    return StreamingResponse(
+        stream_chat_events(rag_service.astream_query(payload.question, payload.chapter_id, payload.module_id), payload.question),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@app.post("/api/query/batch", response_model=BatchQueryResponse)
+async def query_chatbot_batch(payload: BatchQueryRequest):
+    rag_service = app.state.rag_service
+
+    if not rag_service:
+        raise HTTPException(503, "RAG service not available")
+    max_questions = int(os.getenv("BATCH_MAX_QUESTIONS", "200"))
+    if not payload.questions or len(payload.questions) > max_questions:
+        raise HTTPException(400, f"Send between 1 and {max_questions} questions")
+
+    try:
+        responses = await rag_service.aquery_batch([item.model_dump() for item in payload.questions])
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(500, str(e))
+
+    # Batch answers are pre-computed content, not user chat, so they are
+    # not written to the chat history
+    return BatchQueryResponse(results=[
+        BatchQueryItem(
+            question=item.question,
+            llm_answer=response.get("llm_answer"),
+            source_documents=response.get("source_documents", []),
+            stale=response.get("stale", False),
+            error=response.get("error"),
+        )
+        for item, response in zip(payload.questions, responses)
+    ])
+
+
 @app.post("/api/ask-selected", response_model=ChatbotResponse)
-def ask_selected(payload: SelectedTextRequest):
+async def ask_selected(payload: SelectedTextRequest):
     rag_service = app.state.rag_service
 
     if not rag_service:
         raise HTTPException(503, "RAG service not available")
 
     try:
-        response = rag_service.ask_selected_text(
+        response = await rag_service.aask_selected_text(
             payload.selected_text,
-            payload.question
+            payload.question,
+            payload.chapter_id,
         )
 
         return ChatbotResponse(
             llm_answer=response["llm_answer"],
             source_documents=response["source_documents"],
+            stale=response.get("stale", False),
         )
 
     except Exception as e:
         raise HTTPException(500, str(e))
 
 
-@app.post("/api/ingest-content")
-def ingest_content(payload: IngestContentRequest):
+@app.post("/api/ask-selected/stream")
+async def ask_selected_stream(payload: SelectedTextRequest):
     rag_service = app.state.rag_service
 
-    if not rag_service or not rag_service.vector_store_service:
-        raise HTTPException(503, "Vector store not available")
+    if not rag_service:
+        raise HTTPException(503, "RAG service not available")
+
+    return StreamingResponse(
+        stream_chat_events(
+            rag_service.astream_selected_text(payload.selected_text, payload.question, payload.chapter_id),
+            payload.question,
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@app.get("/api/history", response_model=HistoryPage)
+async def chat_history(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+):
+    db = app.state.db_service
+    if not db:
+        raise HTTPException(503, "Database not available")
+
+    user_id = await db.get_or_create_user(
+        username="default_user",
+        email="default@example.com"
+    )
+    if not user_id:
+        raise HTTPException(503, "Database not available")
 
     try:
-        rag_service.vector_store_service.add_document(
-            doc_id=payload.chapter_id,
-            content=payload.content_markdown,
-            metadata={
-                "source": f"chapter_{payload.chapter_id}",
-                "type": "markdown",
-            },
-        )
-        return {"message": "Content ingested successfully"}
+        return await db.get_chat_history_page(user_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
-    except Exception as e:
-        raise HTTPException(500, str(e))
+
+@app.post("/api/ingest-content", status_code=202)
+async def ingest_content(payload: IngestContentRequest):
+    jobs = app.state.ingestion_jobs
+    if not jobs:
+        raise HTTPException(503, "Vector store not available")
+    if not jobs.vector_store_service.embeddings and not jobs.vector_store_service.sparse_index:
+        raise HTTPException(503, "Embeddings not configured")
+
+    metadata = {
+        "source": f"chapter_{payload.chapter_id}",
+        "type": "markdown",
+    }
+    if payload.module_id:
+        metadata["module_id"] = payload.module_id
+    job = await jobs.submit(
+        chapter_id=payload.chapter_id,
+        content_markdown=payload.content_markdown,
+        metadata=metadata,
+    )
+    return {
+        "message": "Content ingestion queued",
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/api/ingest-jobs/{job.job_id}",
+    }
+
+
+@app.get("/api/ingest-jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    jobs = app.state.ingestion_jobs
+    if not jobs:
+        raise HTTPException(503, "Vector store not available")
+
+    job = await jobs.get(job_id)
+    if not job:
+        raise HTTPException(404, "Ingestion job not found")
+    return job
 
 
 # -------------------------------------------------------------------
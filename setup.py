@@ -14,7 +14,7 @@ setup(
         "langchain-google-genai>=1.0.0",
         "openai>=1.10.0",
         "openrouter>=0.1.0",
-        "qdrant-client>=1.7.0",
+        "qdrant-client>=1.10.0",
         "psycopg2-binary>=2.9.0",
         "asyncpg>=0.29.0",
         "pydantic>=2.5.0",
@@ -1,13 +1,24 @@
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+import asyncio
 import os
+import threading
+
+import numpy as np
 
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.messages import HumanMessage
 
 from langchain_openai import ChatOpenAI
 
+from src.services.answer_cache import AnswerCache, make_cache_key
+from src.services.embedding_cache import CachedEmbeddings
+from src.services.embeddings import create_embeddings
+from src.services.llm_router import LLMRouter
+from src.services.selection import compress_selection
+from src.services.semantic_cache import SemanticCache
+from src.services.single_flight import SingleFlight
+
 # Optional: Gemini (disabled to avoid quota issues)
 try:
     from langchain_google_genai import ChatGoogleGenerativeAI
@@ -32,65 +43,99 @@ class SimpleRAGService:
 
         self.llm = None
 
+        # Cap on concurrent in-flight LLM calls from the async path
+        self.max_concurrent_llm_calls = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        self._llm_semaphore = asyncio.Semaphore(self.max_concurrent_llm_calls)
+
+        # Concurrent answers per /api/query/batch request
+        self.batch_max_parallelism = int(os.getenv("BATCH_MAX_PARALLELISM", "4"))
+
+        # Over-long selections are cut to their most relevant sentences
+        self.selection_max_tokens = int(os.getenv("SELECTION_MAX_TOKENS", "800"))
+
         # --------------------------------------------
-        # Priority 1: Google Gemini (disabled by default)
+        # LLM providers, in priority order
         # --------------------------------------------
-        if GEMINI_AVAILABLE and False:  # Disabled to prevent quota errors
+        # Clients are only constructed here; no request is made until the
+        # background readiness probe (aprobe_llm) or the first question.
+        self.llm_candidates = []
+
+        # Priority 1: Google Gemini (opt-in; the router's circuit breaker
+        # takes it out of rotation if it starts hitting quota errors)
+        if GEMINI_AVAILABLE and os.getenv("GEMINI_ENABLED", "false").lower() == "true":
             if self.gemini_api_key:
-                try:
-                    self.llm = ChatGoogleGenerativeAI(
-                        model="gemini-2.0-flash",
-                        temperature=0.1,
-                        google_api_key=self.gemini_api_key,
-                    )
-                    self.llm.invoke([HumanMessage(content="ping")])
-                    print("✅ Gemini LLM initialized")
-                except Exception as e:
-                    print("❌ Gemini init failed:", e)
-                    self.llm = None
+                self._add_llm_candidate("gemini", lambda: ChatGoogleGenerativeAI(
+                    model="gemini-2.0-flash",
+                    temperature=0.1,
+                    google_api_key=self.gemini_api_key,
+                ))
 
-        # --------------------------------------------
         # Priority 2: OpenRouter
-        # --------------------------------------------
-        if not self.llm and self.openrouter_api_key:
-            try:
-                self.llm = ChatOpenAI(
-                    model_name="gpt-3.5-turbo",
-                    temperature=0.1,
-                    openai_api_key=self.openrouter_api_key,
-                    openai_api_base="https://openrouter.ai/api/v1"
-                )
-                self.llm.invoke([HumanMessage(content="ping")])
-                print("✅ OpenRouter LLM initialized")
-            except Exception as e:
-                print("❌ OpenRouter init failed:", e)
-                self.llm = None
+        if self.openrouter_api_key:
+            self._add_llm_candidate("openrouter", lambda: ChatOpenAI(
+                model_name="gpt-3.5-turbo",
+                temperature=0.1,
+                openai_api_key=self.openrouter_api_key,
+                openai_api_base="https://openrouter.ai/api/v1"
+            ))
 
-        # --------------------------------------------
         # Priority 3: OpenAI Direct
-        # --------------------------------------------
-        if not self.llm and self.openai_api_key:
-            try:
-                self.llm = ChatOpenAI(
-                    model_name="gpt-3.5-turbo",
-                    temperature=0.1,
-                    openai_api_key=self.openai_api_key
-                )
-                self.llm.invoke([HumanMessage(content="ping")])
-                print("✅ OpenAI LLM initialized")
-            except Exception as e:
-                print("❌ OpenAI init failed:", e)
-                self.llm = None
+        if self.openai_api_key:
+            self._add_llm_candidate("openai", lambda: ChatOpenAI(
+                model_name="gpt-3.5-turbo",
+                temperature=0.1,
+                openai_api_key=self.openai_api_key
+            ))
 
         # --------------------------------------------
-        # Fallback
+        # Router across providers, or fallback
         # --------------------------------------------
-        if not self.llm:
+        if self.llm_candidates:
+            self.llm = LLMRouter.from_env(self.llm_candidates)
+            names = ", ".join(name for name, _ in self.llm_candidates)
+            print(f"✅ LLM router configured: {names} (reachability checked in background)")
+        else:
             print("⚠️ No LLM available — mock responses will be used")
 
         # Build the QA chain
         self.qa_chain = self._build_chain()
 
+        # --------------------------------------------
+        # Semantic answer cache (needs an embeddings key)
+        # --------------------------------------------
+        self.embeddings, _ = create_embeddings()
+        self.semantic_cache = SemanticCache.from_env(self.embeddings)
+
+        # --------------------------------------------
+        # Exact-match answer cache (stale-while-revalidate)
+        # --------------------------------------------
+        self.answer_cache = AnswerCache.from_env()
+        self._background_tasks = set()
+
+        # Identical concurrent questions share one computation
+        self.single_flight = SingleFlight()
+
+    # --------------------------------------------
+    # LLM providers
+    # --------------------------------------------
+    def _add_llm_candidate(self, name: str, factory):
+        try:
+            self.llm_candidates.append((name, factory()))
+        except Exception as e:
+            print(f"❌ {name} init failed:", e)
+
+    async def aprobe_llm(self) -> Dict[str, Any]:
+        """
+        Ping every provider through the router. Raises if none are reachable.
+        """
+        if not self.llm:
+            raise RuntimeError("No LLM API key configured")
+
+        providers = await self.llm.aprobe()
+        if not {"ok", "unchecked"} & set(providers.values()):
+            raise RuntimeError(f"No LLM provider reachable: {providers}")
+        return {"provider": self.llm.preferred, "providers": providers}
+
     # --------------------------------------------
     # Build prompt + chain
     # --------------------------------------------
@@ -114,21 +159,169 @@ Answer:"""
         )
 
     # --------------------------------------------
-    # Query method
+    # Semantic cache
     # --------------------------------------------
-    def query(self, question: str) -> Dict[str, Any]:
+    def _cache_lookup(self, question: str) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+        if not self.semantic_cache:
+            return None, None
+        try:
+            vector = self.semantic_cache.embed(question)
+        except Exception as e:
+            print("Semantic cache lookup failed:", e)
+            return None, None
+        return vector, self.semantic_cache.lookup(vector)
+
+    async def _acache_lookup(self, question: str) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+        if not self.semantic_cache:
+            return None, None
+        try:
+            vector = await self.semantic_cache.aembed(question)
+        except Exception as e:
+            print("Semantic cache lookup failed:", e)
+            return None, None
+        return vector, self.semantic_cache.lookup(vector)
+
+    def _cache_store(self, question: str, vector: Optional[np.ndarray], response: Dict[str, Any]):
+        # General-knowledge answers are not grounded in any chapter
+        if self.semantic_cache and vector is not None:
+            self.semantic_cache.store(question, vector, response)
+
+    def invalidate_chapter(self, chapter_id: str) -> int:
+        if not self.semantic_cache:
+            return 0
+        return self.semantic_cache.invalidate_chapter(chapter_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "answer_cache": self.answer_cache.stats() if self.answer_cache else None,
+            "semantic_cache": self.semantic_cache.stats() if self.semantic_cache else None,
+            "embedding_cache": self.embeddings.stats() if isinstance(self.embeddings, CachedEmbeddings) else None,
+            "llm_router": self.llm.stats() if isinstance(self.llm, LLMRouter) else None,
+            "single_flight": self.single_flight.stats(),
+        }
+
+    # --------------------------------------------
+    # Answer generation (semantic cache + LLM)
+    # --------------------------------------------
+    def _generate(self, prompt_input: str) -> Dict[str, Any]:
+        vector, cached = self._cache_lookup(prompt_input)
+        if cached:
+            return cached
+
+        response = {
+            "llm_answer": self.qa_chain.invoke(prompt_input),
+            "source_documents": ["General knowledge"],
+        }
+        self._cache_store(prompt_input, vector, response)
+        return response
+
+    async def _agenerate(self, prompt_input: str) -> Dict[str, Any]:
+        vector, cached = await self._acache_lookup(prompt_input)
+        if cached:
+            return cached
+
+        async with self._llm_semaphore:
+            answer = await self.qa_chain.ainvoke(prompt_input)
+        response = {"llm_answer": answer, "source_documents": ["General knowledge"]}
+        self._cache_store(prompt_input, vector, response)
+        return response
+
+    # --------------------------------------------
+    # Exact-match cache with stale-while-revalidate
+    # --------------------------------------------
+    def _cached_answer(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a cached response, or None on a miss. Stale responses are
+        flagged and refreshed in the background by the caller.
+        """
+        if not self.answer_cache:
+            return None
+        cached = self.answer_cache.get(cache_key)
+        if not cached:
+            return None
+        response, fresh = cached
+        return response if fresh else {**response, "stale": True}
+
+    def _refresh(self, prompt_input: str, cache_key: str):
+        try:
+            response = {
+                "llm_answer": self.qa_chain.invoke(prompt_input),
+                "source_documents": ["General knowledge"],
+            }
+            self.answer_cache.set(cache_key, response)
+        except Exception as e:
+            print("Background cache refresh failed:", e)
+        finally:
+            self.answer_cache.end_refresh(cache_key)
+
+    async def _arefresh(self, prompt_input: str, cache_key: str):
+        try:
+            async with self._llm_semaphore:
+                answer = await self.qa_chain.ainvoke(prompt_input)
+            self.answer_cache.set(cache_key, {"llm_answer": answer, "source_documents": ["General knowledge"]})
+        except Exception as e:
+            print("Background cache refresh failed:", e)
+        finally:
+            self.answer_cache.end_refresh(cache_key)
+
+    def _schedule_refresh(self, prompt_input: str, cache_key: str):
+        if not self.answer_cache.begin_refresh(cache_key):
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._arefresh(prompt_input, cache_key))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+        except RuntimeError:
+            # Called from sync code: no running event loop
+            threading.Thread(target=self._refresh, args=(prompt_input, cache_key), daemon=True).start()
+
+    def _answer(self, prompt_input: str, cache_key: str) -> Dict[str, Any]:
         if not self.llm:
             return {
                 "llm_answer": "LLM is not configured properly. Please contact the administrator.",
                 "source_documents": [],
             }
 
+        if not self.qa_chain:
+            return {"llm_answer": "LLM unavailable", "source_documents": ["General knowledge"]}
+
+        cached = self._cached_answer(cache_key)
+        if cached:
+            if cached.get("stale"):
+                self._schedule_refresh(prompt_input, cache_key)
+            return cached
+
         try:
-            answer = self.qa_chain.invoke(question) if self.qa_chain else "LLM unavailable"
+            response = self._generate(prompt_input)
+        except Exception as e:
+            print("LLM runtime error:", e)
             return {
-                "llm_answer": answer,
-                "source_documents": ["General knowledge"],
+                "llm_answer": "An error occurred while generating the response.",
+                "source_documents": [],
             }
+
+        if self.answer_cache:
+            self.answer_cache.set(cache_key, response)
+        return response
+
+    async def _aanswer(self, prompt_input: str, cache_key: str) -> Dict[str, Any]:
+        if not self.llm:
+            return {
+                "llm_answer": "LLM is not configured properly. Please contact the administrator.",
+                "source_documents": [],
+            }
+
+        if not self.qa_chain:
+            return {"llm_answer": "LLM unavailable", "source_documents": ["General knowledge"]}
+
+        cached = self._cached_answer(cache_key)
+        if cached:
+            if cached.get("stale"):
+                self._schedule_refresh(prompt_input, cache_key)
+            return cached
+
+        try:
+            response = await self._agenerate(prompt_input)
         except Exception as e:
             print("LLM runtime error:", e)
             return {
@@ -136,9 +329,114 @@ Answer:"""
                 "source_documents": [],
             }
 
+        if self.answer_cache:
+            self.answer_cache.set(cache_key, response)
+        return response
+
+    # --------------------------------------------
+    # Query method
+    # --------------------------------------------
+    def query(self, question: str) -> Dict[str, Any]:
+        return self._answer(question, make_cache_key(question))
+
     # --------------------------------------------
     # Selected text query
     # --------------------------------------------
-    def ask_selected_text(self, selected_text: str, question: str) -> Dict[str, Any]:
-        combined = f"Context:\n{selected_text}\n\nQuestion:\n{question}"
-        return self.query(combined)
+    def _selection_prompt(self, selected_text: str, question: str) -> str:
+        selection = compress_selection(selected_text, question, self.selection_max_tokens)
+        return f"Context:\n{selection}\n\nQuestion:\n{question}"
+
+    def ask_selected_text(self, selected_text: str, question: str, chapter_id: str = None) -> Dict[str, Any]:
+        combined = self._selection_prompt(selected_text, question)
+        return self._answer(combined, make_cache_key(question, selected_text))
+
+    # --------------------------------------------
+    # Async query methods (used by the API routes)
+    # --------------------------------------------
+    # Concurrent calls with the same normalized question (and selected
+    # text) are coalesced into one computation. There is no retrieval here,
+    # so chapter_id/module_id scopes are accepted and ignored.
+    async def aquery(self, question: str, chapter_id: str = None, module_id: str = None) -> Dict[str, Any]:
+        cache_key = make_cache_key(question)
+        return await self.single_flight.do(cache_key, lambda: self._aanswer(question, cache_key))
+
+    async def aquery_batch(self, items: List[Dict[str, Optional[str]]]) -> List[Dict[str, Any]]:
+        # One answer per item, in order; at most batch_max_parallelism at a time
+        parallelism = asyncio.Semaphore(self.batch_max_parallelism)
+
+        async def answer(item: Dict[str, Optional[str]]) -> Dict[str, Any]:
+            async with parallelism:
+                try:
+                    return await self.aquery(item["question"])
+                except Exception as e:
+                    return {"error": str(e)}
+
+        return list(await asyncio.gather(*(answer(item) for item in items)))
+
+    async def aask_selected_text(self, selected_text: str, question: str, chapter_id: str = None) -> Dict[str, Any]:
+        combined = self._selection_prompt(selected_text, question)
+        cache_key = make_cache_key(question, selected_text)
+        return await self.single_flight.do(cache_key, lambda: self._aanswer(combined, cache_key))
+
+    # --------------------------------------------
+    # Streaming query methods (Server-Sent Events)
+    # --------------------------------------------
+    async def _astream_answer(self, prompt_input: str, cache_key: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the answer as {"event": "token"} chunks, followed by a final
+        {"event": "sources"} item (or a single {"event": "error"} item).
+        Cached answers are sent as a single token; stale ones are preceded
+        by a {"event": "stale"} item.
+        """
+        if not self.llm or not self.qa_chain:
+            yield {"event": "token", "data": "LLM is not configured properly. Please contact the administrator."}
+            yield {"event": "sources", "data": []}
+            return
+
+        cached = self._cached_answer(cache_key)
+        if not cached:
+            vector, cached = await self._acache_lookup(prompt_input)
+            if cached and self.answer_cache:
+                # Like the non-stream path: the next identical question is
+                # answered from the exact cache without an embedding call
+                self.answer_cache.set(cache_key, cached)
+        if cached:
+            if cached.get("stale"):
+                self._schedule_refresh(prompt_input, cache_key)
+                yield {"event": "stale", "data": True}
+            yield {"event": "token", "data": cached["llm_answer"]}
+            yield {"event": "sources", "data": cached["source_documents"]}
+            return
+
+        answer_parts = []
+        try:
+            async with self._llm_semaphore:
+                async for chunk in self.qa_chain.astream(prompt_input):
+                    answer_parts.append(chunk)
+                    yield {"event": "token", "data": chunk}
+        except Exception as e:
+            print("LLM runtime error:", e)
+            yield {"event": "error", "data": "An error occurred while generating the response."}
+            return
+
+        response = {"llm_answer": "".join(answer_parts), "source_documents": ["General knowledge"]}
+        self._cache_store(prompt_input, vector, response)
+        if self.answer_cache:
+            self.answer_cache.set(cache_key, response)
+        yield {"event": "sources", "data": response["source_documents"]}
+
+    # Identical concurrent streams are fanned out from one LLM stream
+    async def astream_query(
+        self, question: str, chapter_id: str = None, module_id: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        cache_key = make_cache_key(question)
+        async for item in self.single_flight.stream(cache_key, lambda: self._astream_answer(question, cache_key)):
+            yield item
+
+    async def astream_selected_text(
+        self, selected_text: str, question: str, chapter_id: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        combined = self._selection_prompt(selected_text, question)
+        cache_key = make_cache_key(question, selected_text)
+        async for item in self.single_flight.stream(cache_key, lambda: self._astream_answer(combined, cache_key)):
+            yield item
@@ -0,0 +1,129 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+import hashlib
+import os
+import re
+import threading
+import time
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_question(text: str) -> str:
+    """Fold case, punctuation and whitespace so trivially different wordings match."""
+    return " ".join(_PUNCTUATION.sub("", text.casefold()).split())
+
+
+def make_cache_key(question: str, selected_text: str = None, scope: str = None) -> str:
+    """
+    Build an exact-match cache key from a question, optional selected text
+    and optional search scope (see RAGService.scope_key).
+
+    The key is a sha256 digest so long selections do not inflate cache memory.
+    """
+    normalized = normalize_question(question)
+    if selected_text:
+        normalized += "\x1f" + normalize_question(selected_text)
+    if scope:
+        normalized += "\x1e" + scope
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Bounded exact-match answer cache with stale-while-revalidate semantics.
+
+    Entries are fresh for ttl_seconds. After that they are kept as stale
+    for up to stale_ttl_seconds so they can still be served, flagged as stale,
+    while a background refresh runs or while every LLM provider is failing.
+    """
+
+    def __init__(self, max_entries: int = 2000, ttl_seconds: float = 3600, stale_ttl_seconds: float = 604800):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stale_ttl_seconds = stale_ttl_seconds
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._refreshing: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["AnswerCache"]:
+        """Build a cache from ANSWER_CACHE_* environment variables, or None if disabled."""
+        if os.getenv("ANSWER_CACHE_ENABLED", "true").lower() != "true":
+            return None
+        return cls(
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000")),
+            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+            stale_ttl_seconds=float(os.getenv("ANSWER_CACHE_STALE_TTL_SECONDS", "604800")),
+        )
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """
+        Look up a cached response.
+
+        Returns:
+            (response, is_fresh), or None if the key is missing or past its stale TTL
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            stored_at, response = item
+            age = time.monotonic() - stored_at
+            if age > self.ttl_seconds + self.stale_ttl_seconds:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            if age > self.ttl_seconds:
+                self.stale_hits += 1
+                return response, False
+            self.hits += 1
+            return response, True
+
+    def set(self, key: str, response: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def begin_refresh(self, key: str) -> bool:
+        """Claim the background refresh for a key; False if one is already running."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.refreshes += 1
+            return True
+
+    def end_refresh(self, key: str):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "ttl_seconds": self.ttl_seconds,
+            "stale_ttl_seconds": self.stale_ttl_seconds,
+        }
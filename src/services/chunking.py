@@ -0,0 +1,158 @@
+from dataclasses import dataclass
+from typing import List, Tuple
+import os
+import re
+
+from .tokens import count_tokens, decode, encode
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+
+
+@dataclass
+class Chunk:
+    text: str
+    heading_path: List[str]
+    chunk_index: int
+    token_count: int
+
+
+class MarkdownChunker:
+    """
+    Split a markdown chapter into token-sized chunks.
+
+    Chunks never cross a heading boundary and fenced code blocks are kept
+    whole unless they are larger than a chunk on their own. Within a section,
+    consecutive chunks overlap by up to chunk_overlap tokens. Token counts use
+    tiktoken so they match what the LLM will see.
+    """
+
+    def __init__(self, chunk_size: int = 400, chunk_overlap: int = 60):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    @classmethod
+    def from_env(cls) -> "MarkdownChunker":
+        return cls(
+            chunk_size=int(os.getenv("CHUNK_SIZE_TOKENS", "400")),
+            chunk_overlap=int(os.getenv("CHUNK_OVERLAP_TOKENS", "60")),
+        )
+
+    def split(self, markdown: str) -> List[Chunk]:
+        chunks: List[Chunk] = []
+        for heading_path, blocks in self._sections(markdown):
+            for text in self._pack(blocks):
+                chunks.append(Chunk(
+                    text=text,
+                    heading_path=heading_path,
+                    chunk_index=len(chunks),
+                    token_count=count_tokens(text),
+                ))
+        return chunks
+
+    # --- Parsing ---
+    @staticmethod
+    def _sections(markdown: str) -> List[Tuple[List[str], List[str]]]:
+        """Group the document into (heading path, blocks) sections."""
+        sections: List[Tuple[List[str], List[str]]] = []
+        heading_stack: List[Tuple[int, str]] = []
+        blocks: List[str] = []
+        paragraph: List[str] = []
+        code: List[str] = []
+        fence = None
+
+        def flush_paragraph():
+            if paragraph:
+                blocks.append("\n".join(paragraph))
+                paragraph.clear()
+
+        def close_section():
+            flush_paragraph()
+            # A heading directly followed by a sub-heading carries no content
+            if len(blocks) == 1 and _HEADING.match(blocks[0]):
+                blocks.clear()
+            if blocks:
+                sections.append(([title for _, title in heading_stack], list(blocks)))
+                blocks.clear()
+
+        for line in markdown.splitlines():
+            if fence:
+                code.append(line)
+                if line.strip().startswith(fence):
+                    blocks.append("\n".join(code))
+                    code, fence = [], None
+                continue
+
+            fence_match = _FENCE.match(line)
+            if fence_match:
+                flush_paragraph()
+                fence = fence_match.group(1)
+                code = [line]
+                continue
+
+            heading = _HEADING.match(line)
+            if heading:
+                close_section()
+                level = len(heading.group(1))
+                while heading_stack and heading_stack[-1][0] >= level:
+                    heading_stack.pop()
+                heading_stack.append((level, heading.group(2)))
+                blocks.append(line)
+                continue
+
+            if line.strip():
+                paragraph.append(line)
+            else:
+                flush_paragraph()
+
+        if code:  # unterminated fence
+            blocks.append("\n".join(code))
+        close_section()
+        return sections
+
+    # --- Packing ---
+    def _windows(self, tokens: List[int]) -> List[str]:
+        step = self.chunk_size - self.chunk_overlap
+        return [decode(tokens[i:i + self.chunk_size]) for i in range(0, max(len(tokens) - self.chunk_overlap, 1), step)]
+
+    def _pack(self, blocks: List[str]) -> List[str]:
+        texts: List[str] = []
+        current: List[str] = []
+        current_tokens = 0
+        has_new_content = False  # False while current only holds the overlap tail
+
+        def emit(with_overlap: bool):
+            nonlocal current, current_tokens, has_new_content
+            text = "\n\n".join(current)
+            texts.append(text)
+            current, current_tokens, has_new_content = [], 0, False
+            if with_overlap and self.chunk_overlap:
+                tail = encode(text)[-self.chunk_overlap:]
+                current, current_tokens = [decode(tail)], len(tail)
+
+        for block in blocks:
+            tokens = encode(block)
+            if len(tokens) > self.chunk_size:
+                # Window the pending text together with the oversized block so
+                # short lead-ins (e.g. the heading line) are not left on their own
+                if has_new_content:
+                    tokens = encode("\n\n".join(current + [block]))
+                current, current_tokens, has_new_content = [], 0, False
+                texts.extend(self._windows(tokens))
+                continue
+
+            # +1 for the paragraph separator
+            if current and current_tokens + len(tokens) + 1 > self.chunk_size:
+                if has_new_content:
+                    emit(with_overlap=True)
+                if current_tokens + len(tokens) + 1 > self.chunk_size:
+                    current, current_tokens = [], 0
+            current.append(block)
+            current_tokens += len(tokens) + 1
+            has_new_content = True
+
+        if has_new_content:
+            emit(with_overlap=False)
+        return texts
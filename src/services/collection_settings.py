@@ -0,0 +1,138 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+import os
+
+from qdrant_client.http import models
+
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() == "true"
+
+
+def _optional_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+@dataclass
+class CollectionSettings:
+    """
+    Storage and index tuning for the Qdrant collection.
+
+    quantization keeps a compressed copy of every vector for the first search
+    pass: "scalar" (int8, 4x smaller) or "binary" (1 bit per dimension, 32x
+    smaller; best with high-dimensional embeddings such as OpenAI/Cohere).
+    With rescore enabled, limit * oversampling candidates are re-ranked on the
+    original vectors, which recovers most of the recall. on_disk_vectors and
+    on_disk_payload move the originals and payloads out of RAM, which works
+    well together with an in-RAM quantized copy.
+    """
+
+    quantization: str = "none"
+    quantile: float = 0.99
+    quantization_always_ram: bool = True
+    oversampling: float = 2.0
+    rescore: bool = True
+    on_disk_vectors: bool = False
+    on_disk_payload: bool = False
+    hnsw_m: Optional[int] = None
+    hnsw_ef_construct: Optional[int] = None
+    hnsw_ef: Optional[int] = None  # search-time beam width
+
+    def __post_init__(self):
+        if self.quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"quantization must be one of {QUANTIZATION_MODES}, got {self.quantization!r}")
+
+    @classmethod
+    def from_env(cls) -> "CollectionSettings":
+        return cls(
+            quantization=os.getenv("VECTOR_QUANTIZATION", "none").lower(),
+            quantile=float(os.getenv("VECTOR_QUANTIZATION_QUANTILE", "0.99")),
+            quantization_always_ram=_flag("VECTOR_QUANTIZATION_ALWAYS_RAM", "true"),
+            oversampling=float(os.getenv("VECTOR_OVERSAMPLING", "2.0")),
+            rescore=_flag("VECTOR_RESCORE", "true"),
+            on_disk_vectors=_flag("VECTOR_ON_DISK", "false"),
+            on_disk_payload=_flag("PAYLOAD_ON_DISK", "false"),
+            hnsw_m=_optional_int("HNSW_M"),
+            hnsw_ef_construct=_optional_int("HNSW_EF_CONSTRUCT"),
+            hnsw_ef=_optional_int("HNSW_EF"),
+        )
+
+    # --- Collection creation ---
+    def vectors_config(self, size: int) -> models.VectorParams:
+        return models.VectorParams(size=size, distance=models.Distance.COSINE, on_disk=self.on_disk_vectors)
+
+    def hnsw_config(self) -> Optional[models.HnswConfigDiff]:
+        if self.hnsw_m is None and self.hnsw_ef_construct is None:
+            return None
+        return models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def quantization_config(self):
+        if self.quantization == "scalar":
+            return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=self.quantile,
+                always_ram=self.quantization_always_ram,
+            ))
+        if self.quantization == "binary":
+            return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(
+                always_ram=self.quantization_always_ram,
+            ))
+        return None
+
+    def create_kwargs(self, size: int) -> Dict[str, Any]:
+        """Keyword arguments for QdrantClient.create_collection."""
+        return {
+            "vectors_config": self.vectors_config(size),
+            "hnsw_config": self.hnsw_config(),
+            "quantization_config": self.quantization_config(),
+            "on_disk_payload": self.on_disk_payload,
+        }
+
+    # --- Search ---
+    def search_params(self) -> Optional[models.SearchParams]:
+        quantization = None
+        if self.quantization != "none":
+            quantization = models.QuantizationSearchParams(rescore=self.rescore, oversampling=self.oversampling)
+        if quantization is None and self.hnsw_ef is None:
+            return None
+        return models.SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+    # --- Existing collections ---
+    def update_kwargs(self, info) -> Dict[str, Any]:
+        """
+        Keyword arguments for QdrantClient.update_collection that bring an
+        existing collection in line with these settings (empty if it already is).
+        """
+        changes: Dict[str, Any] = {}
+        params = info.config.params
+
+        if bool(getattr(params.vectors, "on_disk", None)) != self.on_disk_vectors:
+            changes["vectors_config"] = {"": models.VectorParamsDiff(on_disk=self.on_disk_vectors)}
+        if bool(params.on_disk_payload) != self.on_disk_payload:
+            changes["collection_params"] = models.CollectionParamsDiff(on_disk_payload=self.on_disk_payload)
+
+        hnsw = info.config.hnsw_config
+        if (self.hnsw_m is not None and hnsw.m != self.hnsw_m) or (
+            self.hnsw_ef_construct is not None and hnsw.ef_construct != self.hnsw_ef_construct
+        ):
+            changes["hnsw_config"] = self.hnsw_config()
+
+        current = info.config.quantization_config
+        if isinstance(current, models.ScalarQuantization):
+            current_mode = "scalar"
+            unchanged = (
+                current.scalar.quantile == self.quantile
+                and bool(current.scalar.always_ram) == self.quantization_always_ram
+            )
+        elif isinstance(current, models.BinaryQuantization):
+            current_mode = "binary"
+            unchanged = bool(current.binary.always_ram) == self.quantization_always_ram
+        else:
+            current_mode = "none" if current is None else "other"
+            unchanged = True
+        if current_mode != self.quantization or not unchanged:
+            changes["quantization_config"] = self.quantization_config() or models.Disabled.DISABLED
+        return changes
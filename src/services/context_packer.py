@@ -0,0 +1,115 @@
+from typing import Any, Dict, Iterable, List, Optional
+import os
+
+from langchain_core.documents import Document
+
+from .selection import compress_selection, normalize_text, split_sentences
+from .tokens import count_tokens, decode, encode
+
+
+def _model_budgets(spec: str) -> Dict[str, int]:
+    # "gpt-3.5-turbo=3000,gpt-4o=12000"
+    budgets = {}
+    for item in spec.split(","):
+        if "=" in item:
+            model, tokens = item.split("=", 1)
+            budgets[model.strip()] = int(tokens)
+    return budgets
+
+
+class ContextPacker:
+    """
+    Packs retrieved passages into a prompt context of at most max_tokens.
+
+    Passages are taken in retrieval order. Exact duplicates are dropped, and
+    sentences already packed from an earlier passage (chunk overlap,
+    re-ingested copies) are removed. A passage that does not fit the
+    remaining budget is trimmed to its sentences most relevant to the
+    question. Prompt size drives LLM latency and cost, so the budget is a
+    hard limit (counted with the tiktoken encoding in tokens.py).
+    """
+
+    def __init__(self, max_tokens: int = 3000, separator: str = "\n\n"):
+        self.max_tokens = max_tokens
+        self.separator = separator
+
+        self.packed = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.duplicates_dropped = 0
+        self.passages_trimmed = 0
+
+    @classmethod
+    def from_env(cls, model_names: Iterable[Optional[str]] = ()) -> "ContextPacker":
+        """
+        Budget from CONTEXT_MAX_TOKENS, overridden per model by
+        CONTEXT_MODEL_BUDGETS ("model=tokens,..."). With several models
+        (router failover) the smallest budget applies, since any of them may
+        end up answering.
+        """
+        default = int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))
+        budgets = _model_budgets(os.getenv("CONTEXT_MODEL_BUDGETS", ""))
+        model_budgets = [budgets.get(name, default) for name in model_names if name]
+        return cls(max_tokens=min(model_budgets) if model_budgets else default)
+
+    def pack(self, docs: List[Document], question: str) -> str:
+        """
+        Build the context string for a question.
+
+        Args:
+            docs: Retrieved documents, most relevant first
+            question: The question, used to pick sentences when trimming
+
+        Returns:
+            Passages joined by the separator, within max_tokens
+        """
+        separator_tokens = count_tokens(self.separator)
+        seen_passages, seen_sentences = set(), set()
+        parts: List[str] = []
+        used = 0
+
+        for doc in docs:
+            text = doc.page_content.strip()
+            if not text:
+                continue
+            self.tokens_in += count_tokens(text)
+
+            key = normalize_text(text)
+            sentences = split_sentences(text)
+            fresh = [sentence for sentence in sentences if normalize_text(sentence) not in seen_sentences]
+            if key in seen_passages or not fresh:
+                self.duplicates_dropped += 1
+                continue
+            seen_passages.add(key)
+            seen_sentences.update(normalize_text(sentence) for sentence in fresh)
+            passage = text if len(fresh) == len(sentences) else " ".join(fresh)
+
+            remaining = self.max_tokens - used - (separator_tokens if parts else 0)
+            if remaining <= 0:
+                break
+            cost = count_tokens(passage)
+            if cost > remaining:
+                self.passages_trimmed += 1
+                passage = compress_selection(passage, question, remaining)
+                tokens = encode(passage)
+                if len(tokens) > remaining:
+                    passage = decode(tokens[:remaining])
+                cost = min(len(tokens), remaining)
+                if not passage:
+                    break
+            used += cost + (separator_tokens if parts else 0)
+            parts.append(passage)
+
+        self.packed += 1
+        self.tokens_out += used
+        return self.separator.join(parts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_tokens": self.max_tokens,
+            "packed": self.packed,
+            "avg_tokens_in": self.tokens_in / self.packed if self.packed else 0.0,
+            "avg_tokens_out": self.tokens_out / self.packed if self.packed else 0.0,
+            "duplicates_dropped": self.duplicates_dropped,
+            "passages_trimmed": self.passages_trimmed,
+        }
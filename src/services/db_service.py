@@ -1,11 +1,121 @@
 import asyncpg
+import asyncio
+import base64
 import os
-from typing import Optional, List, Dict, Any
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
 from dotenv import load_dotenv
 import json
 
 load_dotenv()
 
+
+class ChatHistoryWriter:
+    """
+    Write-behind recorder for chat history.
+
+    Requests enqueue rows without waiting on the database; a background task
+    writes them in batches with executemany once `batch_size` rows are
+    pending or `flush_interval` seconds have passed since the first one.
+    """
+
+    INSERT_SQL = "INSERT INTO chat_history (user_id, question, answer, source_documents) VALUES ($1, $2, $3, $4)"
+
+    def __init__(self, pool, batch_size: int = 100, flush_interval: float = 1.0, max_pending: int = 10000):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.written = 0
+        self.rejected = 0
+        self.failed = 0
+
+        self._queue: "asyncio.Queue[Tuple]" = asyncio.Queue(maxsize=max_pending)
+        self._batch: List[Tuple] = []
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Future] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def enqueue(self, row: Tuple) -> bool:
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except asyncio.QueueFull:
+            self.rejected += 1
+            print("Warning: chat history queue full, row not queued")
+            return False
+
+    async def _collect(self):
+        # Rows live in self._batch while collecting so drain() can recover
+        # them if the task is cancelled mid-wait
+        self._batch.append(await self._queue.get())
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(self._batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _write(self, batch: List[Tuple]):
+        try:
+            await self.pool.executemany(self.INSERT_SQL, batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"Error writing chat history batch ({len(batch)} rows): {e}")
+
+    async def _run(self):
+        while True:
+            await self._collect()
+            batch, self._batch = self._batch, []
+            # Shielded so cancellation in drain() never aborts a write halfway
+            self._inflight = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._inflight)
+
+    async def drain(self):
+        """Stop the background task and write every pending row."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._inflight:
+            await self._inflight
+
+        pending, self._batch = self._batch, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for i in range(0, len(pending), self.batch_size):
+            await self._write(pending[i:i + self.batch_size])
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self._queue.qsize() + len(self._batch),
+            "written": self.written,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
+
+
+def encode_history_cursor(created_at: datetime, chat_id: int) -> str:
+    """Opaque keyset cursor for the (created_at, id) position of a history row."""
+    raw = json.dumps({"t": created_at.isoformat(), "id": chat_id})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_history_cursor; raises ValueError on a malformed cursor."""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(raw["t"]), int(raw["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid history cursor: {cursor}") from e
+
+
 class NeonDBService:
     """
     Service for interacting with Neon PostgreSQL database.
@@ -17,6 +127,10 @@ class NeonDBService:
             print("Warning: NEON_DATABASE_URL not set. Database functionality will be limited.")
             self.database_url = None
         self.pool = None
+        self.history_writer: Optional[ChatHistoryWriter] = None
+        # In-memory user lookups; users are never updated in place
+        self._users_by_id: Dict[int, Dict[str, Any]] = {}
+        self._user_ids_by_name: Dict[str, int] = {}
     
     async def connect(self):
         """
@@ -30,7 +144,9 @@ class NeonDBService:
                 self.database_url,
                 min_size=1,
                 max_size=10,
-                command_timeout=60
+                command_timeout=60,
+                timeout=float(os.getenv("DB_CONNECT_TIMEOUT_SECONDS", "10")),
+                init=self._init_connection
             )
             print("Connected to Neon database successfully")
             return True
@@ -38,6 +154,19 @@ class NeonDBService:
             print(f"Error connecting to Neon database: {e}")
             return False
     
+    @staticmethod
+    async def _init_connection(conn):
+        # Encode/decode JSONB columns as Python objects
+        await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+    async def ping(self) -> bool:
+        """
+        Cheap reachability check used by the readiness probe.
+        """
+        if not self.pool:
+            raise RuntimeError("Database not connected")
+        return await self.pool.fetchval("SELECT 1") == 1
+
     async def create_tables(self):
         """
         Create necessary tables in the database.
@@ -62,10 +191,35 @@ class NeonDBService:
                 user_id INTEGER REFERENCES users(id),
                 question TEXT NOT NULL,
                 answer TEXT NOT NULL,
-                source_documents TEXT,
+                source_documents JSONB DEFAULT '[]'::jsonb,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+
+        # Migrate source_documents from JSON-encoded TEXT to JSONB
+        await self.pool.execute("""
+            DO $$
+            BEGIN
+                IF EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'chat_history'
+                      AND column_name = 'source_documents'
+                      AND data_type = 'text'
+                ) THEN
+                    ALTER TABLE chat_history
+                        ALTER COLUMN source_documents TYPE JSONB
+                        USING COALESCE(NULLIF(source_documents, ''), '[]')::jsonb,
+                        ALTER COLUMN source_documents SET DEFAULT '[]'::jsonb;
+                END IF;
+            END
+            $$
+        """)
+
+        # Keyset pagination index for history pages (newest first)
+        await self.pool.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chat_history_user_created_id "
+            "ON chat_history (user_id, created_at DESC, id DESC)"
+        )
         
         # Create content_ingestion_log table
         await self.pool.execute("""
@@ -77,6 +231,19 @@ class NeonDBService:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+
+        # Job tracking columns for background ingestion
+        await self.pool.execute("""
+            ALTER TABLE content_ingestion_log
+                ADD COLUMN IF NOT EXISTS job_id VARCHAR(64),
+                ADD COLUMN IF NOT EXISTS progress REAL DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS error TEXT,
+                ADD COLUMN IF NOT EXISTS result TEXT,
+                ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        """)
+        await self.pool.execute(
+            "CREATE INDEX IF NOT EXISTS idx_content_ingestion_log_job_id ON content_ingestion_log (job_id)"
+        )
         
         print("Database tables created successfully")
         return True
@@ -104,6 +271,9 @@ class NeonDBService:
         """
         if not self.pool:
             return None
+
+        if user_id in self._users_by_id:
+            return self._users_by_id[user_id]
         
         try:
             row = await self.pool.fetchrow(
@@ -111,17 +281,84 @@ class NeonDBService:
                 user_id
             )
             if row:
-                return {
+                user = {
                     "id": row["id"],
                     "username": row["username"],
                     "email": row["email"],
                     "created_at": row["created_at"]
                 }
+                self._users_by_id[user_id] = user
+                return user
             return None
         except Exception as e:
             print(f"Error getting user: {e}")
             return None
     
+    async def get_or_create_user(self, username: str, email: str) -> Optional[int]:
+        """
+        Get the ID of a user by username, creating the user if needed.
+        The ID is cached, so repeat calls make no database round-trip.
+        """
+        if not self.pool:
+            return None
+
+        if username in self._user_ids_by_name:
+            return self._user_ids_by_name[username]
+
+        try:
+            user_id = await self.pool.fetchval(
+                """
+                INSERT INTO users (username, email) VALUES ($1, $2)
+                ON CONFLICT (username) DO UPDATE SET username = EXCLUDED.username
+                RETURNING id
+                """,
+                username, email
+            )
+        except Exception as e:
+            # The upsert only covers username; a conflict on the (also
+            # unique) email still raises, so fall back to a plain lookup
+            try:
+                user_id = await self.pool.fetchval("SELECT id FROM users WHERE username = $1", username)
+            except Exception:
+                user_id = None
+            if user_id is None:
+                print(f"Error getting or creating user: {e}")
+                return None
+        self._user_ids_by_name[username] = user_id
+        return user_id
+
+    def start_history_writer(self):
+        """
+        Start the write-behind chat history recorder (call from the event loop).
+        """
+        if not self.pool:
+            return
+        self.history_writer = ChatHistoryWriter(
+            self.pool,
+            batch_size=int(os.getenv("HISTORY_FLUSH_BATCH_SIZE", "100")),
+            flush_interval=float(os.getenv("HISTORY_FLUSH_INTERVAL_SECONDS", "1.0")),
+            max_pending=int(os.getenv("HISTORY_MAX_PENDING", "10000")),
+        )
+        self.history_writer.start()
+
+    async def stop_history_writer(self):
+        """
+        Write all pending chat history rows and stop the recorder.
+        """
+        if self.history_writer:
+            await self.history_writer.drain()
+            print(f"Chat history drained: {self.history_writer.stats()}")
+            self.history_writer = None
+
+    def enqueue_chat_history(self, user_id: int, question: str, answer: str, source_documents: List[str] = None) -> bool:
+        """
+        Queue chat history for the background writer without waiting on the
+        database. Returns False if the row was not queued.
+        """
+        if not self.history_writer:
+            return False
+        return self.history_writer.enqueue((user_id, question, answer, source_documents or []))
+
     async def save_chat_history(self, user_id: int, question: str, answer: str, source_documents: List[str] = None) -> Optional[int]:
         """
         Save chat history to the database.
@@ -130,70 +367,167 @@ class NeonDBService:
             return None
         
         try:
-            source_docs_str = json.dumps(source_documents) if source_documents else "[]"
             chat_id = await self.pool.fetchval(
                 "INSERT INTO chat_history (user_id, question, answer, source_documents) VALUES ($1, $2, $3, $4) RETURNING id",
-                user_id, question, answer, source_docs_str
+                user_id, question, answer, source_documents or []
             )
             return chat_id
         except Exception as e:
             print(f"Error saving chat history: {e}")
             return None
     
-    async def get_chat_history(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+    async def get_chat_history(self, user_id: int, limit: int = 10, before: Tuple[datetime, int] = None) -> List[Dict[str, Any]]:
         """
-        Get chat history for a user.
+        Get chat history for a user, newest first.
+
+        Args:
+            user_id: ID of the user
+            limit: Maximum number of rows to return
+            before: Optional (created_at, id) keyset position; only older rows are returned
         """
         if not self.pool:
             return []
         
         try:
-            rows = await self.pool.fetch(
-                """
-                SELECT id, question, answer, source_documents, created_at 
-                FROM chat_history 
-                WHERE user_id = $1 
-                ORDER BY created_at DESC 
-                LIMIT $2
-                """,
-                user_id, limit
-            )
+            if before:
+                rows = await self.pool.fetch(
+                    """
+                    SELECT id, question, answer, source_documents, created_at
+                    FROM chat_history
+                    WHERE user_id = $1 AND (created_at, id) < ($2, $3)
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT $4
+                    """,
+                    user_id, before[0], before[1], limit
+                )
+            else:
+                rows = await self.pool.fetch(
+                    """
+                    SELECT id, question, answer, source_documents, created_at
+                    FROM chat_history
+                    WHERE user_id = $1
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT $2
+                    """,
+                    user_id, limit
+                )
             
-            history = []
-            for row in rows:
-                history.append({
+            return [
+                {
                     "id": row["id"],
                     "question": row["question"],
                     "answer": row["answer"],
-                    "source_documents": json.loads(row["source_documents"]) if row["source_documents"] else [],
+                    "source_documents": row["source_documents"] or [],
                     "created_at": row["created_at"]
-                })
-            
-            return history
+                }
+                for row in rows
+            ]
         except Exception as e:
             print(f"Error getting chat history: {e}")
             return []
+
+    async def get_chat_history_page(self, user_id: int, limit: int = 20, cursor: str = None) -> Dict[str, Any]:
+        """
+        Get one page of chat history using keyset pagination on
+        (user_id, created_at, id), so the cost of a page does not grow with
+        the table size or the page depth.
+
+        Returns:
+            {"items": [...], "next_cursor": str or None}
+        """
+        before = decode_history_cursor(cursor) if cursor else None
+        rows = await self.get_chat_history(user_id, limit + 1, before)
+        items = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_history_cursor(last["created_at"], last["id"])
+        return {"items": items, "next_cursor": next_cursor}
     
-    async def log_content_ingestion(self, chapter_id: str, content_preview: str, status: str = "completed"):
+    async def log_content_ingestion(self, chapter_id: str, content_preview: str, status: str = "completed", job_id: str = None) -> Optional[int]:
         """
         Log content ingestion to the database.
+
+        Returns:
+            ID of the log row, or None if it could not be written
         """
         if not self.pool:
-            return False
+            return None
         
+        try:
+            log_id = await self.pool.fetchval(
+                "INSERT INTO content_ingestion_log (chapter_id, content_preview, ingestion_status, job_id) VALUES ($1, $2, $3, $4) RETURNING id",
+                chapter_id, content_preview[:500], status, job_id  # Limit preview to 500 chars
+            )
+            return log_id
+        except Exception as e:
+            print(f"Error logging content ingestion: {e}")
+            return None
+
+    async def update_content_ingestion(self, log_id: int, status: str = None, progress: float = None, error: str = None, result: Dict[str, Any] = None) -> bool:
+        """
+        Update the status and progress of a content ingestion log row.
+        Fields passed as None are left unchanged.
+        """
+        if not self.pool or log_id is None:
+            return False
+
         try:
             await self.pool.execute(
-                "INSERT INTO content_ingestion_log (chapter_id, content_preview, ingestion_status) VALUES ($1, $2, $3)",
-                chapter_id, content_preview[:500], status  # Limit preview to 500 chars
+                """
+                UPDATE content_ingestion_log
+                SET ingestion_status = COALESCE($2, ingestion_status),
+                    progress = COALESCE($3, progress),
+                    error = COALESCE($4, error),
+                    result = COALESCE($5, result),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = $1
+                """,
+                log_id, status, progress, error, json.dumps(result) if result is not None else None
             )
             return True
         except Exception as e:
-            print(f"Error logging content ingestion: {e}")
+            print(f"Error updating content ingestion log: {e}")
             return False
+
+    async def get_content_ingestion_by_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the ingestion log row for a background ingestion job.
+        """
+        if not self.pool:
+            return None
+
+        try:
+            row = await self.pool.fetchrow(
+                """
+                SELECT chapter_id, ingestion_status, progress, error, result, created_at, updated_at
+                FROM content_ingestion_log
+                WHERE job_id = $1
+                ORDER BY id DESC
+                LIMIT 1
+                """,
+                job_id
+            )
+            if row:
+                return {
+                    "job_id": job_id,
+                    "chapter_id": row["chapter_id"],
+                    "status": row["ingestion_status"],
+                    "progress": row["progress"],
+                    "error": row["error"],
+                    "result": json.loads(row["result"]) if row["result"] else None,
+                    "created_at": row["created_at"],
+                    "updated_at": row["updated_at"],
+                }
+            return None
+        except Exception as e:
+            print(f"Error getting content ingestion log: {e}")
+            return None
     
     async def close(self):
         """
         Close the database connection pool.
         """
+        await self.stop_history_writer()
         if self.pool:
             await self.pool.close()
\ No newline at end of file
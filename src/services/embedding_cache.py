@@ -0,0 +1,230 @@
+from typing import Dict, List, Optional
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+async def aembed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Embed several queries in one provider request where the client allows it.
+
+    LangChain has no batched embed_query. Cohere embeds a batch of queries
+    with input_type="search_query"; OpenAI embeds queries and documents the
+    same way, so aembed_documents is one request. Other clients fall back to
+    concurrent aembed_query calls.
+    """
+    if not texts:
+        return []
+    if isinstance(embeddings, CachedEmbeddings):
+        return await embeddings.aembed_queries(texts)
+    try:
+        from langchain_cohere import CohereEmbeddings
+        if isinstance(embeddings, CohereEmbeddings):
+            return await embeddings.aembed(texts, input_type="search_query")
+    except ImportError:
+        pass
+    try:
+        from langchain_openai import OpenAIEmbeddings
+        if isinstance(embeddings, OpenAIEmbeddings):
+            return await embeddings.aembed_documents(texts)
+    except ImportError:
+        pass
+    return list(await asyncio.gather(*(embeddings.aembed_query(text) for text in texts)))
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Drop-in Embeddings wrapper with a persistent on-disk cache.
+
+    Vectors are stored in SQLite as float32 blobs keyed by
+    (model name, sha256 of the text). Only cache misses are sent to the
+    wrapped embeddings client, in batches, so re-embedding unchanged text
+    costs no API calls. Query and document embeddings are cached separately
+    because some providers (e.g. Cohere) embed them differently.
+    """
+
+    _LOOKUP_CHUNK = 500  # stay well below SQLite's bound-parameter limit
+
+    def __init__(self, underlying: Embeddings, path: str, model_name: str = None, batch_size: int = 96):
+        self.underlying = underlying
+        self.path = path
+        self.model_name = model_name or self._model_name(underlying)
+        self.batch_size = batch_size
+
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _model_name(embeddings: Embeddings) -> str:
+        model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or "default"
+        return f"{type(embeddings).__name__}:{model}"
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    # --- Storage ---
+    def _load(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(hashes), self._LOOKUP_CHUNK):
+                chunk = hashes[i:i + self._LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk],
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _save(self, model: str, items: Dict[str, List[float]]):
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items.items()],
+            )
+            self._conn.commit()
+
+    def _partition(self, model: str, texts: List[str]):
+        hashes = [self._hash(t) for t in texts]
+        found = self._load(model, list(dict.fromkeys(hashes)))
+        # Unique missing texts, in first-seen order
+        missing: Dict[str, str] = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in found and text_hash not in missing:
+                missing[text_hash] = text
+        miss_count = sum(1 for h in hashes if h not in found)
+        self.hits += len(hashes) - miss_count
+        self.misses += miss_count
+        return hashes, found, missing
+
+    # --- Embeddings interface ---
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        model = f"{self.model_name}:document"
+        hashes, found, missing = self._partition(model, texts)
+
+        missing_hashes = list(missing.keys())
+        for i in range(0, len(missing_hashes), self.batch_size):
+            batch = missing_hashes[i:i + self.batch_size]
+            vectors = self.underlying.embed_documents([missing[h] for h in batch])
+            new = dict(zip(batch, vectors))
+            self._save(model, new)
+            found.update(new)
+
+        return [found[h] for h in hashes]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        model = f"{self.model_name}:document"
+        hashes, found, missing = await asyncio.to_thread(self._partition, model, texts)
+
+        missing_hashes = list(missing.keys())
+        for i in range(0, len(missing_hashes), self.batch_size):
+            batch = missing_hashes[i:i + self.batch_size]
+            vectors = await self.underlying.aembed_documents([missing[h] for h in batch])
+            new = dict(zip(batch, vectors))
+            await asyncio.to_thread(self._save, model, new)
+            found.update(new)
+
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        model = f"{self.model_name}:query"
+        text_hash = self._hash(text)
+        cached = self._load(model, [text_hash]).get(text_hash)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        vector = self.underlying.embed_query(text)
+        self._save(model, {text_hash: vector})
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        model = f"{self.model_name}:query"
+        text_hash = self._hash(text)
+        cached = (await asyncio.to_thread(self._load, model, [text_hash])).get(text_hash)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        vector = await self.underlying.aembed_query(text)
+        await asyncio.to_thread(self._save, model, {text_hash: vector})
+        return vector
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Batched aembed_query: cache misses go to the provider in batches (see aembed_queries)."""
+        model = f"{self.model_name}:query"
+        hashes, found, missing = await asyncio.to_thread(self._partition, model, texts)
+
+        missing_hashes = list(missing.keys())
+        for i in range(0, len(missing_hashes), self.batch_size):
+            batch = missing_hashes[i:i + self.batch_size]
+            vectors = await aembed_queries(self.underlying, [missing[h] for h in batch])
+            new = dict(zip(batch, vectors))
+            await asyncio.to_thread(self._save, model, new)
+            found.update(new)
+
+        return [found[h] for h in hashes]
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def wrap_with_cache(embeddings: Optional[Embeddings]) -> Optional[Embeddings]:
+    """
+    Wrap an embeddings client with the persistent cache configured by the
+    EMBEDDING_CACHE_* environment variables. Falls back to the bare client
+    if the cache is disabled or its file cannot be opened.
+    """
+    if embeddings is None or os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() != "true":
+        return embeddings
+
+    path = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3")
+    try:
+        cached = CachedEmbeddings(
+            embeddings,
+            path=path,
+            batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "96")),
+        )
+        print(f"Embedding cache enabled at {path}")
+        return cached
+    except Exception as e:
+        print(f"Warning: Could not open embedding cache at {path}: {e}")
+        return embeddings
@@ -0,0 +1,35 @@
+from typing import Optional, Tuple
+import os
+
+from langchain_core.embeddings import Embeddings
+
+from .embedding_cache import wrap_with_cache
+
+
+def create_embeddings() -> Tuple[Optional[Embeddings], Optional[int]]:
+    """
+    Create the embeddings client from environment variables.
+
+    Cohere is preferred, OpenAI is the fallback. The client is wrapped in
+    the persistent embedding cache unless EMBEDDING_CACHE_ENABLED=false.
+
+    Returns:
+        Tuple of (embeddings, dimensions), or (None, None) if no valid key is set
+    """
+    cohere_api_key = os.getenv("COHERE_API_KEY")
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+
+    try:
+        if cohere_api_key and cohere_api_key != "your-cohere-api-key-here":
+            from langchain_cohere import CohereEmbeddings
+            print("Using Cohere embeddings")
+            return wrap_with_cache(CohereEmbeddings(cohere_api_key=cohere_api_key, model="embed-english-v3.0")), 1024
+        if openai_api_key and openai_api_key != "sk-your-openai-api-key-here":
+            from langchain_openai import OpenAIEmbeddings
+            print("Using OpenAI embeddings")
+            return wrap_with_cache(OpenAIEmbeddings(api_key=openai_api_key)), 1536
+        print("No valid embeddings API key found.")
+    except Exception as e:
+        print(f"Error initializing embeddings: {e}")
+
+    return None, None
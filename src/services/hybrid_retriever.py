@@ -0,0 +1,309 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import asyncio
+import os
+import time
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, Field
+
+from .embedding_cache import aembed_queries
+from .vector_store_service import VectorStoreService
+
+
+def reciprocal_rank_fusion(
+    rankings: Dict[str, List[Dict[str, Any]]],
+    weights: Dict[str, float],
+    rrf_k: int = 60,
+) -> List[Dict[str, Any]]:
+    """
+    Merge ranked hit lists with weighted reciprocal rank fusion:
+    score(d) = sum over legs of weight / (rrf_k + rank of d in that leg).
+
+    Args:
+        rankings: Leg name -> hits (dicts with an "id"), best first
+        weights: Leg name -> weight
+        rrf_k: Rank offset; larger values flatten the contribution of top ranks
+
+    Returns:
+        Hits ordered by fused score, each with "rrf_score" and "<leg>_rank" set
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for leg, hits in rankings.items():
+        weight = weights.get(leg, 1.0)
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.setdefault(hit["id"], {**hit, "rrf_score": 0.0})
+            entry["rrf_score"] += weight / (rrf_k + rank)
+            entry[f"{leg}_rank"] = rank
+    return sorted(fused.values(), key=lambda hit: hit["rrf_score"], reverse=True)
+
+
+def maximal_marginal_relevance(relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float = 0.7) -> List[int]:
+    """
+    Pick k candidates by maximal marginal relevance:
+    argmax over d of lambda * relevance(d) - (1 - lambda) * max similarity(d, picked).
+
+    The pairwise cosine similarities come from one matrix product; each of
+    the k rounds is a vectorized update over all candidates.
+
+    Args:
+        relevance: (n,) relevance scores, higher is better (scale them to [0, 1])
+        vectors: (n, d) candidate vectors; all-zero rows count as similar to nothing
+        k: Number of candidates to pick
+        lambda_mult: 1.0 ranks purely by relevance, 0.0 purely by diversity
+
+    Returns:
+        Indices of the picked candidates, in pick order
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+    similarity = unit @ unit.T
+
+    picked = np.empty(k, dtype=np.int64)
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    for i in range(k):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        picked[i] = int(np.argmax(scores))
+        available[picked[i]] = False
+        np.maximum(redundancy, similarity[picked[i]], out=redundancy)
+    return picked.tolist()
+
+
+@dataclass
+class MMRStats:
+    """Latency of the MMR stage, shared by every per-request copy of a retriever."""
+
+    calls: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def record(self, seconds: float):
+        self.calls += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "avg_ms": 1000 * self.total_seconds / self.calls if self.calls else 0.0,
+            "max_ms": 1000 * self.max_seconds,
+        }
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever that runs dense (Qdrant vector) and sparse (BM25) search
+    concurrently and merges them with reciprocal rank fusion.
+
+    Dense search catches paraphrases; sparse search catches exact technical
+    terms (rclpy, URDF, Isaac Sim) that embeddings tend to blur. Either leg
+    can be disabled with a zero weight or k. Without embeddings only the
+    sparse leg runs. The fused hits are then diversified with maximal
+    marginal relevance so near-identical passages do not crowd out the rest.
+    """
+
+    vector_store_service: VectorStoreService
+    k: int = 5
+    dense_k: int = 20
+    sparse_k: int = 20
+    dense_weight: float = 1.0
+    sparse_weight: float = 1.0
+    rrf_k: int = 60
+    # MMR over the top fetch_k fused hits; needs the dense leg's vectors
+    mmr_enabled: bool = True
+    mmr_lambda: float = 0.7
+    fetch_k: int = 20
+    mmr_stats: MMRStats = Field(default_factory=MMRStats)
+    # Search scope; set per request through the "chapter_id"/"module_id"
+    # configurable fields (see RAGService)
+    chapter_id: Optional[str] = None
+    module_id: Optional[str] = None
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @classmethod
+    def from_env(cls, vector_store_service: VectorStoreService) -> "HybridRetriever":
+        return cls(
+            vector_store_service=vector_store_service,
+            k=int(os.getenv("RETRIEVAL_K", "5")),
+            dense_k=int(os.getenv("RETRIEVAL_DENSE_K", "20")),
+            sparse_k=int(os.getenv("RETRIEVAL_SPARSE_K", "20")),
+            dense_weight=float(os.getenv("RETRIEVAL_DENSE_WEIGHT", "1.0")),
+            sparse_weight=float(os.getenv("RETRIEVAL_SPARSE_WEIGHT", "1.0")),
+            rrf_k=int(os.getenv("RETRIEVAL_RRF_K", "60")),
+            mmr_enabled=os.getenv("RETRIEVAL_MMR_ENABLED", "true").lower() == "true",
+            mmr_lambda=float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.7")),
+            fetch_k=int(os.getenv("RETRIEVAL_MMR_FETCH_K", "20")),
+        )
+
+    # --- Legs ---
+    @property
+    def dense_enabled(self) -> bool:
+        return self.vector_store_service.embeddings is not None and self.dense_weight > 0 and self.dense_k > 0
+
+    @property
+    def sparse_enabled(self) -> bool:
+        return self.vector_store_service.sparse_index is not None and self.sparse_weight > 0 and self.sparse_k > 0
+
+    def _dense_search(self, vector: List[float]) -> List[Dict[str, Any]]:
+        # One query returns the MMR candidates together with their vectors
+        return self.vector_store_service.search_documents(
+            vector,
+            limit=max(self.dense_k, self.fetch_k) if self.mmr_enabled else self.dense_k,
+            chapter_id=self.chapter_id,
+            module_id=self.module_id,
+            with_vectors=self.mmr_enabled,
+        )
+
+    def _dense(self, query: str) -> List[Dict[str, Any]]:
+        return self._dense_search(self.vector_store_service.embeddings.embed_query(query))
+
+    async def _adense(self, query: str) -> List[Dict[str, Any]]:
+        vector = await self.vector_store_service.embeddings.aembed_query(query)
+        return await asyncio.to_thread(self._dense_search, vector)
+
+    def _sparse(self, query: str) -> List[Dict[str, Any]]:
+        return self.vector_store_service.keyword_search(
+            query, limit=self.sparse_k, chapter_id=self.chapter_id, module_id=self.module_id
+        )
+
+    # --- Fusion ---
+    def _fuse(self, dense: Optional[List[Dict[str, Any]]], sparse: Optional[List[Dict[str, Any]]]) -> List[Document]:
+        rankings = {}
+        if dense is not None:
+            rankings["dense"] = dense
+        if sparse is not None:
+            rankings["sparse"] = sparse
+        fused = reciprocal_rank_fusion(
+            rankings, {"dense": self.dense_weight, "sparse": self.sparse_weight}, self.rrf_k
+        )
+
+        documents = []
+        for hit in self._diversify(fused):
+            metadata = dict(hit.get("metadata") or {})
+            metadata.update({
+                "doc_id": hit.get("doc_id"),
+                "point_id": hit["id"],
+                "rrf_score": hit["rrf_score"],
+                "dense_rank": hit.get("dense_rank"),
+                "sparse_rank": hit.get("sparse_rank"),
+            })
+            documents.append(Document(page_content=hit.get("content", ""), metadata=metadata))
+        return documents
+
+    async def abatch_retrieve(
+        self,
+        queries: List[str],
+        scopes: List[Dict[str, Optional[str]]],
+        vectors: Optional[List[List[float]]] = None,
+    ) -> List[List[Document]]:
+        """
+        Retrieve for many queries at once: one batched embedding request and
+        one Qdrant batch search for the dense leg, then per-query BM25 and fusion.
+
+        Args:
+            queries: Query texts
+            scopes: {"chapter_id", "module_id"} per query (values may be None)
+            vectors: Query embeddings, if the caller already has them
+
+        Returns:
+            Documents per query, in order
+        """
+        dense: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+        if self.dense_enabled:
+            try:
+                if vectors is None:
+                    vectors = await aembed_queries(self.vector_store_service.embeddings, queries)
+                dense = await asyncio.to_thread(
+                    self.vector_store_service.search_documents_batch,
+                    vectors,
+                    max(self.dense_k, self.fetch_k) if self.mmr_enabled else self.dense_k,
+                    scopes,
+                    self.mmr_enabled,
+                )
+            except Exception as e:
+                self._leg_result("dense", e)
+
+        sparse: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+        if self.sparse_enabled:
+            def keyword_searches():
+                return [
+                    self.vector_store_service.keyword_search(query, self.sparse_k, **scope)
+                    for query, scope in zip(queries, scopes)
+                ]
+            try:
+                sparse = await asyncio.to_thread(keyword_searches)
+            except Exception as e:
+                self._leg_result("sparse", e)
+
+        return [self._fuse(dense_hits, sparse_hits) for dense_hits, sparse_hits in zip(dense, sparse)]
+
+    def _diversify(self, fused: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Top k fused hits, reranked with MMR when enabled and vectors are available."""
+        candidates = fused[:max(self.k, self.fetch_k)]
+        if not self.mmr_enabled or len(candidates) <= self.k:
+            return fused[:self.k]
+        dimensions = next((len(hit["vector"]) for hit in candidates if hit.get("vector") is not None), None)
+        if dimensions is None:
+            return fused[:self.k]
+
+        started = time.perf_counter()
+        # Sparse-only hits have no vector; a zero row makes them similar to nothing
+        vectors = np.zeros((len(candidates), dimensions), dtype=np.float32)
+        rows = [i for i, hit in enumerate(candidates) if hit.get("vector") is not None]
+        vectors[rows] = np.asarray([candidates[i]["vector"] for i in rows], dtype=np.float32)
+        relevance = np.array([hit["rrf_score"] for hit in candidates], dtype=np.float32)
+        relevance /= relevance.max()
+        picked = maximal_marginal_relevance(relevance, vectors, self.k, self.mmr_lambda)
+        self.mmr_stats.record(time.perf_counter() - started)
+        return [candidates[i] for i in picked]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mmr_enabled": self.mmr_enabled,
+            "mmr_lambda": self.mmr_lambda,
+            "fetch_k": self.fetch_k,
+            "mmr_latency": self.mmr_stats.snapshot(),
+        }
+
+    @staticmethod
+    def _leg_result(leg: str, result: Any) -> Optional[List[Dict[str, Any]]]:
+        # A failing leg (e.g. the embeddings API is down) degrades to the other one
+        if isinstance(result, Exception):
+            print(f"Warning: {leg} retrieval failed: {result}")
+            return None
+        return result
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            dense = executor.submit(self._dense, query) if self.dense_enabled else None
+            sparse = self._sparse(query) if self.sparse_enabled else None
+            dense_hits = None
+            if dense:
+                try:
+                    dense_hits = dense.result()
+                except Exception as e:
+                    dense_hits = self._leg_result("dense", e)
+            return self._fuse(dense_hits, sparse)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        async def nothing():
+            return None
+
+        dense, sparse = await asyncio.gather(
+            self._adense(query) if self.dense_enabled else nothing(),
+            asyncio.to_thread(self._sparse, query) if self.sparse_enabled else nothing(),
+            return_exceptions=True,
+        )
+        return self._fuse(self._leg_result("dense", dense), self._leg_result("sparse", sparse))
@@ -0,0 +1,179 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import uuid
+
+from .db_service import NeonDBService
+from .vector_store_service import VectorStoreService
+
+
+@dataclass
+class IngestionJob:
+    job_id: str
+    chapter_id: str
+    content_markdown: str
+    metadata: Dict[str, Any]
+    status: str = "pending"  # pending | running | completed | failed
+    progress: float = 0.0
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    log_id: Optional[int] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    updated_at: datetime = field(default_factory=datetime.utcnow)
+    # Progress writes to the ingestion log still in flight
+    progress_writes: List[Future] = field(default_factory=list, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "chapter_id": self.chapter_id,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class IngestionJobManager:
+    """
+    In-process worker pool for chapter ingestion.
+
+    Jobs are queued and processed by `workers` asyncio tasks; the blocking
+    chunk/embed/upsert work runs in a thread via VectorStoreService.ingest_chapter.
+    Status and progress are kept in memory (bounded to the most recent
+    `max_jobs` jobs) and recorded in the content_ingestion_log table.
+    """
+
+    def __init__(
+        self,
+        vector_store_service: VectorStoreService,
+        db_service: Optional[NeonDBService] = None,
+        on_complete: Callable[[str, Dict[str, Any]], None] = None,
+        workers: int = 2,
+        max_jobs: int = 1000,
+    ):
+        self.vector_store_service = vector_store_service
+        self.db_service = db_service
+        self.on_complete = on_complete
+        self.workers = workers
+        self.max_jobs = max_jobs
+
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queue: "asyncio.Queue[IngestionJob]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"Ingestion job workers started ({self.workers})")
+
+    async def stop(self):
+        """
+        Cancel the workers and mark every unfinished job as failed, so the
+        ingestion log does not report jobs cut off by shutdown as still
+        pending or running.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        for job in list(self._jobs.values()):
+            if job.status in ("pending", "running"):
+                await self._flush_progress(job)
+                await self._update(job, "failed", error="interrupted by shutdown")
+
+    async def submit(self, chapter_id: str, content_markdown: str, metadata: Dict[str, Any] = None) -> IngestionJob:
+        """
+        Queue a chapter for ingestion and return its job immediately.
+        """
+        job = IngestionJob(
+            job_id=uuid.uuid4().hex,
+            chapter_id=chapter_id,
+            content_markdown=content_markdown,
+            metadata=metadata or {},
+        )
+        if self.db_service:
+            job.log_id = await self.db_service.log_content_ingestion(
+                chapter_id, content_markdown, status="pending", job_id=job.job_id
+            )
+
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self.max_jobs:
+            oldest_id = next(iter(self._jobs))
+            if self._jobs[oldest_id].status in ("pending", "running"):
+                break
+            del self._jobs[oldest_id]
+
+        await self._queue.put(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Job status from memory, falling back to the ingestion log for jobs
+        that were evicted or ran before a restart.
+        """
+        job = self._jobs.get(job_id)
+        if job:
+            return job.to_dict()
+        if self.db_service:
+            return await self.db_service.get_content_ingestion_by_job(job_id)
+        return None
+
+    def _set_progress(self, job: IngestionJob, fraction: float):
+        # Called from the ingestion thread. Only progress is written: the
+        # status belongs to _update, which runs after these writes finish.
+        job.progress = fraction
+        job.updated_at = datetime.utcnow()
+        if self.db_service and job.log_id is not None:
+            job.progress_writes.append(asyncio.run_coroutine_threadsafe(
+                self.db_service.update_content_ingestion(job.log_id, progress=fraction),
+                self._loop,
+            ))
+
+    async def _flush_progress(self, job: IngestionJob):
+        """Wait for in-flight progress writes so they cannot land after the final status."""
+        writes, job.progress_writes = job.progress_writes, []
+        if writes:
+            await asyncio.gather(*(asyncio.wrap_future(write) for write in writes), return_exceptions=True)
+
+    async def _update(self, job: IngestionJob, status: str, **fields):
+        job.status = status
+        job.updated_at = datetime.utcnow()
+        for name, value in fields.items():
+            setattr(job, name, value)
+        if self.db_service:
+            await self.db_service.update_content_ingestion(
+                job.log_id, status, progress=job.progress, error=job.error, result=job.result
+            )
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._update(job, "running")
+                result = await asyncio.to_thread(
+                    self.vector_store_service.ingest_chapter,
+                    job.chapter_id,
+                    job.content_markdown,
+                    job.metadata,
+                    lambda fraction: self._set_progress(job, fraction),
+                )
+                await self._flush_progress(job)
+                await self._update(job, "completed", progress=1.0, result=result)
+                if self.on_complete:
+                    self.on_complete(job.chapter_id, result)
+            except Exception as e:
+                print(f"Ingestion job {job.job_id} failed: {e}")
+                await self._flush_progress(job)
+                await self._update(job, "failed", error=str(e))
+            finally:
+                # The markdown is no longer needed once the job has run
+                job.content_markdown = ""
+                self._queue.task_done()
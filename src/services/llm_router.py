@@ -0,0 +1,354 @@
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import os
+import time
+
+import numpy as np
+from langchain_core.runnables import Runnable, RunnableConfig
+
+_EMPTY = object()  # first-chunk marker for a stream that produced nothing
+
+
+@dataclass
+class LLMProvider:
+    """One chat model behind the router, with its rolling health window."""
+
+    name: str
+    llm: Any
+    window: int = 50
+    # True/False per recent call (success/failure)
+    outcomes: Deque[bool] = field(default=None)
+    # Seconds per recent successful call: "invoke" is the full response,
+    # "stream" the time to the first chunk
+    latencies: Dict[str, Deque[float]] = field(default=None)
+    consecutive_failures: int = 0
+    opened_at: Optional[float] = None
+    trial_in_flight: bool = False
+    calls: int = 0
+    failures: int = 0
+    circuit_trips: int = 0
+
+    def __post_init__(self):
+        self.outcomes = deque(maxlen=self.window)
+        self.latencies = {"invoke": deque(maxlen=self.window), "stream": deque(maxlen=self.window)}
+
+    def percentile(self, kind: str, q: float) -> Optional[float]:
+        samples = self.latencies[kind]
+        return float(np.percentile(samples, q)) if samples else None
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class LLMRouter(Runnable):
+    """
+    Route chat model calls across several providers.
+
+    Each call goes to the fastest healthy provider, judged by the rolling
+    median latency of its recent calls (priority order breaks ties and
+    ranks providers without samples; a provider whose last call failed
+    ranks last). A provider's circuit opens after
+    `failure_threshold` consecutive failures, or when the error rate over
+    the window reaches `error_rate_threshold`. While open the provider is
+    skipped; after `cooldown` seconds a single trial call is let through
+    and its outcome closes or re-opens the circuit. A failed call fails
+    over to the next provider.
+
+    On the async path, if the first provider has not answered (or, for
+    streams, produced its first chunk) within its own p95 latency, a hedged
+    request is sent to the next provider and whichever answers first wins.
+    The slower call is cancelled.
+
+    The router is a Runnable, so it drops into LCEL chains in place of a
+    single chat model.
+    """
+
+    def __init__(
+        self,
+        providers: List[Tuple[str, Any]],
+        window: int = 50,
+        failure_threshold: int = 3,
+        error_rate_threshold: float = 0.5,
+        min_calls: int = 10,
+        cooldown: float = 30.0,
+        hedging: bool = True,
+        hedge_min_samples: int = 20,
+        hedge_min_delay: float = 0.25,
+    ):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.providers = [LLMProvider(name, llm, window=window) for name, llm in providers]
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.hedging = hedging
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    @classmethod
+    def from_env(cls, providers: List[Tuple[str, Any]]) -> "LLMRouter":
+        return cls(
+            providers,
+            window=int(os.getenv("LLM_ROUTER_WINDOW", "50")),
+            failure_threshold=int(os.getenv("LLM_CIRCUIT_FAILURES", "3")),
+            error_rate_threshold=float(os.getenv("LLM_CIRCUIT_ERROR_RATE", "0.5")),
+            cooldown=float(os.getenv("LLM_CIRCUIT_COOLDOWN_SECONDS", "30")),
+            hedging=os.getenv("LLM_HEDGING_ENABLED", "true").lower() == "true",
+            hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+            hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.25")),
+        )
+
+    # --- Health bookkeeping ---
+    def _state(self, provider: LLMProvider, now: float) -> str:
+        if provider.opened_at is None:
+            return "closed"
+        if now - provider.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def _record(self, provider: LLMProvider, kind: str, ok: bool, latency: Optional[float] = None):
+        provider.trial_in_flight = False
+        provider.outcomes.append(ok)
+        if ok:
+            provider.consecutive_failures = 0
+            if latency is not None:
+                provider.latencies[kind].append(latency)
+            if provider.opened_at is not None:
+                # Trial call succeeded: close the circuit with a clean window
+                provider.opened_at = None
+                provider.outcomes.clear()
+                print(f"LLM circuit closed for {provider.name}")
+            return
+
+        provider.failures += 1
+        provider.consecutive_failures += 1
+        tripped = (
+            provider.consecutive_failures >= self.failure_threshold
+            or (len(provider.outcomes) >= self.min_calls and provider.error_rate() >= self.error_rate_threshold)
+        )
+        if provider.opened_at is not None or tripped:
+            if provider.opened_at is None:
+                provider.circuit_trips += 1
+                print(f"LLM circuit opened for {provider.name}")
+            provider.opened_at = time.monotonic()
+
+    def _ranked(self, kind: str) -> List[LLMProvider]:
+        """Healthy providers, fastest first. Falls back to all providers if every circuit is open."""
+        now = time.monotonic()
+        healthy = []
+        for index, provider in enumerate(self.providers):
+            state = self._state(provider, now)
+            if state == "open" or (state == "half_open" and provider.trial_in_flight):
+                continue
+            median = provider.percentile(kind, 50)
+            # A provider whose last call failed goes behind the others
+            healthy.append((provider.consecutive_failures > 0, median if median is not None else float("inf"), index, provider))
+        if not healthy:
+            return list(self.providers)
+        return [item[-1] for item in sorted(healthy, key=lambda item: item[:3])]
+
+    def _start(self, provider: LLMProvider):
+        provider.calls += 1
+        if provider.opened_at is not None:
+            provider.trial_in_flight = True
+
+    def _hedge_delay(self, provider: LLMProvider, kind: str) -> Optional[float]:
+        if not self.hedging or len(provider.latencies[kind]) < self.hedge_min_samples:
+            return None
+        return max(provider.percentile(kind, 95), self.hedge_min_delay)
+
+    async def _timed(self, provider: LLMProvider, kind: str, call: Awaitable[Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            result = await call
+        except asyncio.CancelledError:
+            provider.trial_in_flight = False
+            raise
+        except Exception:
+            self._record(provider, kind, ok=False)
+            raise
+        self._record(provider, kind, ok=True, latency=time.perf_counter() - started)
+        return result
+
+    # --- Async calls (hedged) ---
+    async def _race(self, kind: str, launch: Callable[[LLMProvider], Tuple[Awaitable[Any], Any]]) -> Tuple[LLMProvider, Any, Any]:
+        """
+        Run `launch` on the best provider, hedging to the next one after the
+        first exceeds its p95 and failing over on errors.
+
+        Returns:
+            (provider, result, handle) of the first successful call
+        """
+        queue = self._ranked(kind)
+        pending: Dict[asyncio.Future, Tuple[LLMProvider, Any]] = {}
+        errors: Dict[str, str] = {}
+        primary = queue[0]
+        hedged = False
+
+        def submit():
+            provider = queue.pop(0)
+            self._start(provider)
+            call, handle = launch(provider)
+            pending[asyncio.ensure_future(self._timed(provider, kind, call))] = (provider, handle)
+
+        submit()
+        try:
+            while pending:
+                timeout = None
+                if queue and not hedged and len(pending) == 1:
+                    timeout = self._hedge_delay(next(iter(pending.values()))[0], kind)
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self.hedges_sent += 1
+                    submit()
+                    continue
+                for task in done:
+                    provider, handle = pending.pop(task)
+                    if task.exception() is None:
+                        if hedged and provider is not primary:
+                            self.hedges_won += 1
+                        return provider, task.result(), handle
+                    errors[provider.name] = str(task.exception()) or type(task.exception()).__name__
+                if not pending and queue:
+                    submit()
+            raise RuntimeError(f"All LLM providers failed: {errors}")
+        finally:
+            # Cancel the losing call (and close its stream)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for _, handle in pending.values():
+                if handle is not None:
+                    await handle.aclose()
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        _, result, _ = await self._race("invoke", lambda provider: (provider.llm.ainvoke(input, config, **kwargs), None))
+        return result
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        async def first_chunk(stream):
+            try:
+                return await stream.__anext__()
+            except StopAsyncIteration:
+                return _EMPTY
+
+        def launch(provider):
+            stream = provider.llm.astream(input, config, **kwargs).__aiter__()
+            return first_chunk(stream), stream
+
+        provider, first, stream = await self._race("stream", launch)
+        try:
+            if first is _EMPTY:
+                return
+            yield first
+            async for chunk in stream:
+                yield chunk
+        except Exception:
+            self._record(provider, "stream", ok=False)
+            raise
+        finally:
+            await stream.aclose()
+
+    # --- Sync calls (failover only) ---
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        errors: Dict[str, str] = {}
+        for provider in self._ranked("invoke"):
+            self._start(provider)
+            started = time.perf_counter()
+            try:
+                result = provider.llm.invoke(input, config, **kwargs)
+            except Exception as e:
+                self._record(provider, "invoke", ok=False)
+                errors[provider.name] = str(e)
+                continue
+            self._record(provider, "invoke", ok=True, latency=time.perf_counter() - started)
+            return result
+        raise RuntimeError(f"All LLM providers failed: {errors}")
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        errors: Dict[str, str] = {}
+        for provider in self._ranked("stream"):
+            self._start(provider)
+            started = time.perf_counter()
+            chunks = iter(provider.llm.stream(input, config, **kwargs))
+            try:
+                first = next(chunks, _EMPTY)
+            except Exception as e:
+                self._record(provider, "stream", ok=False)
+                errors[provider.name] = str(e)
+                continue
+            self._record(provider, "stream", ok=True, latency=time.perf_counter() - started)
+            if first is _EMPTY:
+                return
+            yield first
+            try:
+                yield from chunks
+            except Exception:
+                self._record(provider, "stream", ok=False)
+                raise
+            return
+        raise RuntimeError(f"All LLM providers failed: {errors}")
+
+    # --- Probing and stats ---
+    async def aprobe(self, timeout: float = 10.0) -> Dict[str, str]:
+        """
+        Ping every provider for the readiness probe. The ping lists the
+        provider's models (OpenAI-compatible APIs), which is free, instead of
+        requesting a billable completion; providers without such an endpoint
+        are reported as "unchecked". Only the status is reported: a models
+        listing says nothing about completions, so the outcome never feeds
+        the failure window or the circuit breaker.
+
+        Returns:
+            Mapping of provider name to "ok", "unchecked" or the error message
+        """
+        async def ping(provider: LLMProvider) -> str:
+            client = getattr(provider.llm, "root_async_client", None)
+            if client is None:
+                return "unchecked"
+            try:
+                await asyncio.wait_for(client.models.list(), timeout)
+            except Exception as e:
+                return str(e) or type(e).__name__
+            return "ok"
+
+        results = await asyncio.gather(*(ping(provider) for provider in self.providers))
+        return {provider.name: result for provider, result in zip(self.providers, results)}
+
+    @property
+    def preferred(self) -> str:
+        return self._ranked("invoke")[0].name
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "preferred": self.preferred,
+            "hedging": self.hedging,
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won,
+            "providers": {
+                provider.name: {
+                    "circuit": self._state(provider, now),
+                    "calls": provider.calls,
+                    "failures": provider.failures,
+                    "circuit_trips": provider.circuit_trips,
+                    "error_rate": round(provider.error_rate(), 3),
+                    "invoke_p50_ms": ms(provider.percentile("invoke", 50)),
+                    "invoke_p95_ms": ms(provider.percentile("invoke", 95)),
+                    "first_token_p50_ms": ms(provider.percentile("stream", 50)),
+                    "first_token_p95_ms": ms(provider.percentile("stream", 95)),
+                }
+                for provider in self.providers
+            },
+        }
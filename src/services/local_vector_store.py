@@ -0,0 +1,513 @@
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import uuid
+
+import numpy as np
+from qdrant_client.http import models
+
+
+class _IVFIndex:
+    """
+    Inverted-file approximate index: rows are bucketed by their nearest
+    k-means centroid and a search only scores the rows in the `nprobe`
+    buckets closest to the query.
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray):
+        self.centroids = centroids
+        self.assignments = assignments  # row -> bucket, -1 for rows added after the build
+        self.order = np.argsort(assignments, kind="stable")
+        self.offsets = np.searchsorted(assignments[self.order], np.arange(len(centroids) + 1))
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, alive: np.ndarray, iterations: int = 10, seed: int = 0) -> "_IVFIndex":
+        rows = np.flatnonzero(alive)
+        # Never more buckets than rows (ANN_MIN_POINTS may be set very low)
+        buckets = min(int(np.clip(np.sqrt(len(rows)), 16, 4096)), len(rows))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(rows, size=min(len(rows), buckets * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=buckets, replace=False)].copy()
+        for _ in range(iterations):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            for bucket in range(buckets):
+                members = sample[nearest == bucket]
+                if len(members):
+                    centroids[bucket] = members.mean(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        assignments = np.full(len(vectors), -1, dtype=np.int32)
+        for start in range(0, len(rows), 65536):
+            batch = rows[start:start + 65536]
+            assignments[batch] = np.argmax(vectors[batch] @ centroids.T, axis=1)
+        return cls(centroids.astype(np.float32), assignments)
+
+    def candidates(self, query: np.ndarray, nprobe: int, total_rows: int) -> np.ndarray:
+        probe = np.argsort(-(self.centroids @ query))[:nprobe]
+        parts = [self.order[self.offsets[bucket]:self.offsets[bucket + 1]] for bucket in probe]
+        # Rows written after the build are always scanned exactly
+        parts.append(np.flatnonzero(self.assignments[:total_rows] == -1))
+        parts.append(np.arange(len(self.assignments), total_rows))
+        # Rows rewritten since the build appear both in a bucket and as unassigned
+        return np.unique(np.concatenate(parts))
+
+
+class LocalCollection:
+    """
+    One collection on disk: a memory-mapped float32 matrix (vectors.f32)
+    plus a SQLite table mapping point ID -> (row, payload).
+
+    Opening a collection maps the matrix instead of reading it, so even
+    large collections load almost instantly. Deleted rows are masked out
+    and reused by later inserts. For cosine distance the stored vectors are
+    normalized, so a search is one matrix-vector product and a top-k
+    partition.
+    """
+
+    _INITIAL_CAPACITY = 1024
+
+    def __init__(self, path: str, ann: bool = False, ann_min_points: int = 20000, ann_nprobe: int = 16):
+        self.path = path
+        self.ann = ann
+        self.ann_min_points = ann_min_points
+        self.ann_nprobe = ann_nprobe
+
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.size = meta["size"]
+        self.distance = meta["distance"]
+        self.rows = meta["rows"]  # high-water mark of used rows
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(path, "payload.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS points (
+                id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL UNIQUE,
+                payload TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+        self._vectors = self._map(max(self._capacity_on_disk(), self._INITIAL_CAPACITY))
+        self._ids: List[Optional[str]] = [None] * self.rows
+        for point_id, row in self._conn.execute("SELECT id, row FROM points"):
+            if row < self.rows:
+                self._ids[row] = point_id
+        self._row_of = {point_id: row for row, point_id in enumerate(self._ids) if point_id is not None}
+        self._alive = np.zeros(len(self._vectors), dtype=bool)
+        self._alive[list(self._row_of.values())] = True
+        self._free = [row for row, point_id in enumerate(self._ids) if point_id is None]
+        self._ivf: Optional[_IVFIndex] = None
+        self._ivf_built_for = 0
+
+    @classmethod
+    def create(cls, path: str, size: int, distance: str, **kwargs) -> "LocalCollection":
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"size": size, "distance": distance, "rows": 0}, f)
+        return cls(path, **kwargs)
+
+    # --- Storage ---
+    @property
+    def _matrix_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    def _capacity_on_disk(self) -> int:
+        if not os.path.exists(self._matrix_path):
+            return 0
+        return os.path.getsize(self._matrix_path) // (4 * self.size)
+
+    def _map(self, capacity: int) -> np.memmap:
+        if self._capacity_on_disk() < capacity:
+            with open(self._matrix_path, "ab") as f:
+                f.truncate(capacity * self.size * 4)
+        return np.memmap(self._matrix_path, dtype=np.float32, mode="r+", shape=(capacity, self.size))
+
+    def _grow(self, needed_rows: int):
+        capacity = len(self._vectors)
+        if needed_rows <= capacity:
+            return
+        while capacity < needed_rows:
+            capacity *= 2
+        self._vectors.flush()
+        self._vectors = self._map(capacity)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive
+        self._alive = alive
+
+    def _save_meta(self):
+        tmp_path = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"size": self.size, "distance": self.distance, "rows": self.rows}, f)
+        os.replace(tmp_path, os.path.join(self.path, "meta.json"))
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.size)
+        if self.distance == models.Distance.COSINE:
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+    # --- Writes ---
+    def upsert(self, ids: Sequence[str], vectors: np.ndarray, payloads: Sequence[Dict[str, Any]]):
+        vectors = self._prepare(vectors)
+        with self._lock:
+            rows = []
+            for point_id in ids:
+                row = self._row_of.get(point_id)
+                if row is None:
+                    if self._free:
+                        row = self._free.pop()
+                    else:
+                        row = self.rows
+                        self.rows += 1
+                        self._ids.append(None)
+                    self._ids[row] = point_id
+                    self._row_of[point_id] = row
+                rows.append(row)
+            self._grow(self.rows)
+
+            rows = np.asarray(rows)
+            self._vectors[rows] = vectors
+            self._vectors.flush()
+            if self._ivf is not None:
+                self._ivf.assignments[rows[rows < len(self._ivf.assignments)]] = -1
+            self._alive[rows] = True
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO points (id, row, payload) VALUES (?, ?, ?)",
+                [(point_id, row, json.dumps(payload or {}, default=str)) for point_id, row, payload in zip(ids, rows.tolist(), payloads)],
+            )
+            self._conn.commit()
+            self._save_meta()
+
+    def delete(self, ids: Iterable[str]):
+        with self._lock:
+            rows = [self._row_of.pop(point_id) for point_id in ids if point_id in self._row_of]
+            if not rows:
+                return
+            for row in rows:
+                self._ids[row] = None
+                self._free.append(row)
+            self._alive[rows] = False
+            self._conn.executemany("DELETE FROM points WHERE row = ?", [(row,) for row in rows])
+            self._conn.commit()
+
+    # --- Reads ---
+    def ids_matching(self, query_filter: Optional[models.Filter]) -> Optional[List[str]]:
+        """Point IDs whose payload matches the filter (None means no filter)."""
+        if query_filter is None:
+            return None
+        where, params = _filter_sql(query_filter)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(f"SELECT id FROM points WHERE {where}", params)]
+
+    def payloads(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT id, payload FROM points WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((point_id, json.loads(payload)) for point_id, payload in rows)
+        return found
+
+    def vector(self, point_id: str) -> List[float]:
+        return self._vectors[self._row_of[point_id]].tolist()
+
+    def create_index(self, key: str):
+        """SQLite expression index on a payload key, used by filtered search, scroll and delete."""
+        name = "idx_payload_" + key.replace(".", "_")
+        with self._lock:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON points ({_json_path(key)})")
+            self._conn.commit()
+
+    def count(self, query_filter: Optional[models.Filter] = None) -> int:
+        matching = self.ids_matching(query_filter)
+        return len(self._row_of) if matching is None else len(matching)
+
+    def _ensure_ivf(self):
+        # Caller holds the lock
+        alive_rows = len(self._row_of)
+        if not self.ann or alive_rows == 0 or alive_rows < self.ann_min_points:
+            self._ivf = None
+            return
+        if self._ivf is None or alive_rows > self._ivf_built_for * 1.2:
+            self._ivf = _IVFIndex.build(self._vectors[:self.rows], self._alive[:self.rows])
+            self._ivf_built_for = alive_rows
+
+    def search(self, query: Sequence[float], limit: int, query_filter: Optional[models.Filter] = None) -> List[Tuple[str, float]]:
+        """
+        Top-`limit` (point ID, score) pairs by similarity, best first.
+        """
+        query = self._prepare(query)[0]
+        allowed = self.ids_matching(query_filter)
+        with self._lock:
+            if not self.rows or not self._row_of:
+                return []
+            matrix = self._vectors[:self.rows]
+            alive = self._alive[:self.rows].copy()
+            ids = list(self._ids)
+            if allowed is not None:
+                alive &= False
+                alive[[self._row_of[point_id] for point_id in allowed if point_id in self._row_of]] = True
+            self._ensure_ivf()
+            candidates = self._ivf.candidates(query, self.ann_nprobe, self.rows) if self._ivf and allowed is None else None
+
+        if candidates is not None:
+            candidates = candidates[alive[candidates]]
+        else:
+            candidates = np.flatnonzero(alive)
+        if not len(candidates):
+            return []
+
+        scores = matrix[candidates] @ query if len(candidates) < len(matrix) else (matrix @ query)[candidates]
+        top = min(limit, len(candidates))
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best])]
+        return [(ids[candidates[i]], float(scores[i])) for i in best]
+
+    def scroll(self, query_filter: Optional[models.Filter], limit: int, offset: Optional[str]) -> Tuple[List[Tuple[str, Dict[str, Any]]], Optional[str]]:
+        where, params = _filter_sql(query_filter) if query_filter else ("1", [])
+        if offset is not None:
+            where, params = f"({where}) AND id >= ?", [*params, offset]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, payload FROM points WHERE {where} ORDER BY id LIMIT ?", [*params, limit + 1]
+            ).fetchall()
+        next_offset = rows[limit][0] if len(rows) > limit else None
+        return [(point_id, json.loads(payload)) for point_id, payload in rows[:limit]], next_offset
+
+    def close(self):
+        with self._lock:
+            self._vectors.flush()
+            self._conn.close()
+
+
+_PAYLOAD_KEY = re.compile(r"^[A-Za-z0-9_]+(\.[A-Za-z0-9_]+)*$")
+
+
+def _json_path(key: str) -> str:
+    """SQL expression for a payload key; inlined (not bound) so expression indexes apply."""
+    if not _PAYLOAD_KEY.match(key):
+        raise ValueError(f"Unsupported payload key: {key!r}")
+    return f"json_extract(payload, '$.{key}')"
+
+
+def _condition_sql(condition: models.FieldCondition) -> Tuple[str, List[Any]]:
+    if not isinstance(condition, models.FieldCondition) or condition.match is None:
+        raise NotImplementedError(f"Unsupported filter condition for the local vector store: {condition}")
+    path = _json_path(condition.key)
+    if isinstance(condition.match, models.MatchValue):
+        return f"{path} = ?", [condition.match.value]
+    if isinstance(condition.match, models.MatchAny):
+        values = list(condition.match.any)
+        return f"{path} IN ({','.join('?' * len(values))})", values
+    raise NotImplementedError(f"Unsupported match for the local vector store: {condition.match}")
+
+
+def _filter_sql(query_filter: models.Filter) -> Tuple[str, List[Any]]:
+    """Translate a Qdrant filter (must / should / must_not of match conditions) into SQL over the payload."""
+    clauses: List[str] = []
+    params: List[Any] = []
+
+    def conditions(group):
+        if group is None:
+            return []
+        return group if isinstance(group, list) else [group]
+
+    def compile_group(group) -> List[str]:
+        parts = []
+        for condition in conditions(group):
+            if isinstance(condition, models.Filter):
+                sql, sub_params = _filter_sql(condition)
+            else:
+                sql, sub_params = _condition_sql(condition)
+            parts.append(sql)
+            params.extend(sub_params)
+        return parts
+
+    must = compile_group(query_filter.must)
+    clauses.extend(must)
+    should = compile_group(query_filter.should)
+    if should:
+        clauses.append("(" + " OR ".join(should) + ")")
+    for sql in compile_group(query_filter.must_not):
+        clauses.append(f"NOT ({sql})")
+    return (" AND ".join(f"({clause})" for clause in clauses) or "1"), params
+
+
+class LocalVectorClient:
+    """
+    Persistent single-process vector store exposing the subset of the
+    QdrantClient API that VectorStoreService and the bulk ingestion CLI use,
+    so small deployments need no Qdrant server and keep their index across
+    restarts. Each collection lives in its own directory under `path`.
+
+    With `ann=True`, collections of at least `ann_min_points` points are
+    searched through an inverted-file (k-means bucket) index that scores only
+    the `ann_nprobe` nearest buckets; smaller collections and filtered
+    searches are scanned exactly.
+    """
+
+    def __init__(self, path: str, ann: bool = False, ann_min_points: int = 20000, ann_nprobe: int = 16):
+        self.path = path
+        self.options = {"ann": ann, "ann_min_points": ann_min_points, "ann_nprobe": ann_nprobe}
+        os.makedirs(path, exist_ok=True)
+        self._collections: Dict[str, LocalCollection] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "LocalVectorClient":
+        return cls(
+            path=os.getenv("LOCAL_VECTOR_PATH", ".cache/vectors"),
+            ann=os.getenv("LOCAL_VECTOR_ANN", "false").lower() == "true",
+            ann_min_points=int(os.getenv("LOCAL_VECTOR_ANN_MIN_POINTS", "20000")),
+            ann_nprobe=int(os.getenv("LOCAL_VECTOR_ANN_NPROBE", "16")),
+        )
+
+    def _collection(self, collection_name: str) -> LocalCollection:
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                directory = os.path.join(self.path, collection_name)
+                if not os.path.exists(os.path.join(directory, "meta.json")):
+                    raise ValueError(f"Collection {collection_name} not found")
+                collection = self._collections[collection_name] = LocalCollection(directory, **self.options)
+            return collection
+
+    # --- Collections ---
+    def get_collection(self, collection_name: str):
+        collection = self._collection(collection_name)
+        return SimpleNamespace(
+            points_count=collection.count(),
+            config=SimpleNamespace(params=SimpleNamespace(
+                vectors=models.VectorParams(size=collection.size, distance=collection.distance)
+            )),
+        )
+
+    def collection_exists(self, collection_name: str) -> bool:
+        return os.path.exists(os.path.join(self.path, collection_name, "meta.json"))
+
+    def create_collection(self, collection_name: str, vectors_config: models.VectorParams, **kwargs) -> bool:
+        if vectors_config.distance not in (models.Distance.COSINE, models.Distance.DOT):
+            raise NotImplementedError("The local vector store supports cosine and dot distance")
+        # Like Qdrant, never replace existing data; callers delete explicitly
+        if self.collection_exists(collection_name):
+            raise ValueError(f"Collection {collection_name} already exists")
+        with self._lock:
+            self._collections[collection_name] = LocalCollection.create(
+                os.path.join(self.path, collection_name), vectors_config.size, vectors_config.distance, **self.options
+            )
+        return True
+
+    def delete_collection(self, collection_name: str, **kwargs) -> bool:
+        with self._lock:
+            collection = self._collections.pop(collection_name, None)
+            if collection:
+                collection.close()
+            shutil.rmtree(os.path.join(self.path, collection_name), ignore_errors=True)
+        return True
+
+    def create_payload_index(self, collection_name: str, field_name: str, field_schema=None, **kwargs):
+        self._collection(collection_name).create_index(field_name)
+
+    # --- Points ---
+    def upsert(self, collection_name: str, points: List[models.PointStruct], wait: bool = True, **kwargs):
+        if points:
+            self._collection(collection_name).upsert(
+                [str(point.id) for point in points],
+                np.asarray([point.vector for point in points], dtype=np.float32),
+                [point.payload for point in points],
+            )
+
+    def upload_collection(self, collection_name: str, vectors, payload=None, ids=None, batch_size: int = 64, **kwargs):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        payload = list(payload) if payload is not None else [{}] * len(vectors)
+        # Random IDs when none are given, as qdrant-client does
+        ids = [str(point_id) for point_id in ids] if ids is not None else [str(uuid.uuid4()) for _ in vectors]
+        self._collection(collection_name).upsert(ids, vectors, payload)
+
+    def delete(self, collection_name: str, points_selector, wait: bool = True, **kwargs):
+        collection = self._collection(collection_name)
+        if isinstance(points_selector, models.PointIdsList):
+            collection.delete(str(point_id) for point_id in points_selector.points)
+        elif isinstance(points_selector, models.FilterSelector):
+            collection.delete(collection.ids_matching(points_selector.filter))
+        else:
+            raise NotImplementedError(f"Unsupported points selector: {points_selector}")
+
+    def count(self, collection_name: str, count_filter: models.Filter = None, exact: bool = True, **kwargs):
+        return models.CountResult(count=self._collection(collection_name).count(count_filter))
+
+    def scroll(
+        self,
+        collection_name: str,
+        scroll_filter: models.Filter = None,
+        limit: int = 10,
+        offset: str = None,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        **kwargs,
+    ):
+        collection = self._collection(collection_name)
+        records, next_offset = collection.scroll(scroll_filter, limit, offset)
+        return [
+            models.Record(
+                id=point_id,
+                payload=payload if with_payload else None,
+                vector=collection.vector(point_id) if with_vectors else None,
+            )
+            for point_id, payload in records
+        ], next_offset
+
+    def query_points(
+        self,
+        collection_name: str,
+        query: Sequence[float],
+        limit: int = 10,
+        query_filter: models.Filter = None,
+        with_payload: bool = True,
+        with_vectors: bool = False,
+        **kwargs,
+    ):
+        collection = self._collection(collection_name)
+        hits = collection.search(query, limit, query_filter)
+        payloads = collection.payloads([point_id for point_id, _ in hits]) if with_payload else {}
+        return models.QueryResponse(points=[
+            models.ScoredPoint(
+                id=point_id,
+                version=0,
+                score=score,
+                payload=payloads.get(point_id) if with_payload else None,
+                vector=collection.vector(point_id) if with_vectors else None,
+            )
+            for point_id, score in hits
+        ])
+
+    def query_batch_points(self, collection_name: str, requests: Sequence[models.QueryRequest], **kwargs):
+        return [
+            self.query_points(
+                collection_name,
+                query=request.query,
+                limit=request.limit or 10,
+                query_filter=request.filter,
+                with_payload=bool(request.with_payload),
+                with_vectors=bool(request.with_vector),
+            )
+            for request in requests
+        ]
+
+    def close(self):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
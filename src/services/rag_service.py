@@ -1,46 +1,63 @@
 # rag_service.py
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+import asyncio
 import os
 from dotenv import load_dotenv
+import numpy as np
 
+from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import ConfigurableField, RunnableConfig, RunnableLambda, RunnableParallel, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_cohere import CohereEmbeddings
-from langchain_qdrant import Qdrant
+from langchain_openai import ChatOpenAI
 
+from .answer_cache import make_cache_key
+from .context_packer import ContextPacker
+from .embedding_cache import CachedEmbeddings, aembed_queries
+from .embeddings import create_embeddings
+from .hybrid_retriever import HybridRetriever
+from .llm_router import LLMRouter
+from .selection import compress_selection
+from .semantic_cache import SemanticCache
+from .single_flight import SingleFlight
 from .vector_store_service import VectorStoreService
 
 # Load environment variables
 load_dotenv()
 
+SELECTION_TEMPLATE = """Answer the question about the selected passage from the textbook.
+Use the surrounding textbook context where it helps.
+
+Selected passage:
+{selection}
+
+Surrounding context:
+{context}
+
+Question: {question}
+"""
+
 # --- OpenRouter wrapper ---
 try:
     from langchain_openai import ChatOpenAI as OpenAIChat
     OPENROUTER_AVAILABLE = True
 
-    class ChatOpenRouter:
-        """Wrapper for using OpenRouter API as LangChain-compatible Chat LLM."""
-        def __init__(self, model="openai/gpt-3.5-turbo", temperature=0.1, openrouter_api_key=None):
+    class ChatOpenRouter(OpenAIChat):
+        """OpenRouter API as a LangChain chat model (native sync, async and streaming calls)."""
+        def __init__(self, model="openai/gpt-3.5-turbo", temperature=0.1, openrouter_api_key=None, **kwargs):
             if not openrouter_api_key:
                 raise ValueError("OpenRouter API key is required.")
 
-            self._llm = OpenAIChat(
+            super().__init__(
                 model=model,
                 temperature=temperature,
                 api_key=openrouter_api_key,
-                base_url="https://openrouter.ai/api/v1"
+                base_url="https://openrouter.ai/api/v1",
+                **kwargs
             )
 
-        def invoke(self, input_data):
-            return self._llm.invoke(input_data)
-
-        def __call__(self, input_data):
-            return self._llm.invoke(input_data)
-
 except ImportError:
     OPENROUTER_AVAILABLE = False
     ChatOpenRouter = None
@@ -69,97 +86,115 @@ class RAGService:
             self.collection_name = None
 
         # --- Initialize embeddings ---
-        self.embeddings = None
-        try:
-            if self.cohere_api_key and self.cohere_api_key != "your-cohere-api-key-here":
-                self.embeddings = CohereEmbeddings(cohere_api_key=self.cohere_api_key, model="embed-english-v3.0")
-                print("Using Cohere embeddings")
-                if self.vector_store_service:
-                    self.vector_store_service.update_embedding_dimensions(1024)
-            elif self.openai_api_key and self.openai_api_key != "sk-your-openai-api-key-here":
-                self.embeddings = OpenAIEmbeddings(api_key=self.openai_api_key)
-                print("Using OpenAI embeddings")
-                if self.vector_store_service:
-                    self.vector_store_service.update_embedding_dimensions(1536)
-            else:
-                print("No valid embeddings API key found.")
-        except Exception as e:
-            print(f"Error initializing embeddings: {e}")
+        self.embeddings, dimensions = create_embeddings()
+        if self.embeddings and self.vector_store_service:
+            self.vector_store_service.set_embeddings(self.embeddings, dimensions)
+
+        # --- Semantic answer cache ---
+        self.semantic_cache = SemanticCache.from_env(self.embeddings)
+
+        # --- Coalescing of identical in-flight questions ---
+        self.single_flight = SingleFlight()
+
+        # --- Selected-text fast path ---
+        # Selections are answered from the chunks they came from and their
+        # neighbours instead of a full retrieval
+        self.selection_max_tokens = int(os.getenv("SELECTION_MAX_TOKENS", "800"))
+        self.selection_neighbor_chunks = int(os.getenv("SELECTION_NEIGHBOR_CHUNKS", "1"))
+
+        # --- Batch queries ---
+        # Concurrent LLM calls per batch (also bounded by LLM_MAX_CONCURRENCY)
+        self.batch_max_parallelism = int(os.getenv("BATCH_MAX_PARALLELISM", "4"))
 
         # --- Initialize LLM ---
         self.llm = None
+        # Cap on concurrent in-flight LLM calls from the async path
+        self.max_concurrent_llm_calls = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        self._llm_semaphore = asyncio.Semaphore(self.max_concurrent_llm_calls)
+        # Providers in priority order, behind a latency-aware router;
+        # constructing a client makes no network call, reachability is
+        # checked in the background by aprobe_llm
+        self.llm_candidates: List[Tuple[str, Any]] = []
         try:
             if self.openrouter_api_key and OPENROUTER_AVAILABLE:
-                self.llm = ChatOpenRouter(
+                self.llm_candidates.append(("openrouter", ChatOpenRouter(
                     model="openai/gpt-3.5-turbo",
                     temperature=0.1,
                     openrouter_api_key=self.openrouter_api_key
-                )
-                print("Using OpenRouter LLM")
-            elif self.openai_api_key:
-                self.llm = ChatOpenAI(
+                )))
+            if self.openai_api_key:
+                self.llm_candidates.append(("openai", ChatOpenAI(
                     model="gpt-3.5-turbo",
                     temperature=0.1,
                     api_key=self.openai_api_key
-                )
-                print("Using OpenAI LLM")
-            else:
-                print("No LLM API key found. Service will return mock responses.")
+                )))
         except Exception as e:
             print(f"Error initializing LLM: {e}")
 
-        # --- Initialize Qdrant retriever ---
+        if self.llm_candidates:
+            self.llm = LLMRouter.from_env(self.llm_candidates)
+            print(f"Using LLM router: {', '.join(name for name, _ in self.llm_candidates)}")
+        else:
+            print("No LLM API key found. Service will return mock responses.")
+
+        # --- Prompt context budget ---
+        self.context_packer = ContextPacker.from_env(
+            getattr(model, "model_name", None) for _, model in self.llm_candidates
+        )
+
+        # --- Initialize hybrid (dense + BM25) retriever ---
+        # The sparse leg needs no embeddings, so retrieval works without an
+        # embeddings key as long as chapters have been ingested.
         self.retriever = None
-        if self.qdrant_client and self.embeddings:
-            try:
-                from langchain_qdrant import QdrantVectorStore
-                self.qdrant_vectorstore = QdrantVectorStore(
-                    client=self.qdrant_client,
-                    collection_name=self.collection_name,
-                    embeddings=self.embeddings
-                )
-                self.retriever = self.qdrant_vectorstore.as_retriever(search_kwargs={"k": 5})
-                print("QdrantVectorStore retriever initialized")
-            except Exception as e:
-                print(f"Warning: QdrantVectorStore retriever not available: {e}")
-                # Fallback to original Qdrant class if QdrantVectorStore fails
-                try:
-                    self.qdrant_vectorstore = Qdrant(
-                        client=self.qdrant_client,
-                        collection_name=self.collection_name,
-                        embeddings=self.embeddings
-                    )
-                    self.retriever = self.qdrant_vectorstore.as_retriever(search_kwargs={"k": 5})
-                    print("Legacy Qdrant retriever initialized")
-                except Exception as fallback_e:
-                    print(f"Both Qdrant initializations failed: {e}, {fallback_e}")
-                    self.retriever = None
+        if self.vector_store_service and (self.embeddings or self.vector_store_service.sparse_index):
+            self.retriever = HybridRetriever.from_env(self.vector_store_service)
+            legs = [
+                name for name, enabled in (("dense", self.retriever.dense_enabled), ("sparse", self.retriever.sparse_enabled))
+                if enabled
+            ]
+            print(f"Hybrid retriever initialized ({' + '.join(legs) or 'no legs enabled'})")
 
         # --- Build QA chain ---
         self.qa_chain = self._build_qa_chain()
 
+    async def aprobe_llm(self) -> Dict[str, Any]:
+        """
+        Ping every LLM provider through the router.
+
+        Returns:
+            {"provider": preferred provider, "providers": per-provider result}
+
+        Raises:
+            RuntimeError: If no provider is configured or reachable
+        """
+        if not self.llm:
+            raise RuntimeError("No LLM API key configured")
+
+        providers = await self.llm.aprobe()
+        if not {"ok", "unchecked"} & set(providers.values()):
+            raise RuntimeError(f"No LLM provider reachable: {providers}")
+        return {"provider": self.llm.preferred, "providers": providers}
+
     def _build_qa_chain(self):
+        """
+        Build the QA chain. Its output is a dict with "question", "answer" and,
+        when a retriever is configured, the retrieved "docs". The retriever runs
+        once per question and its documents feed both the prompt context and
+        the returned sources.
+        """
         if not self.llm:
             return None
 
         # If retriever exists, build retrieval-based chain
         if self.retriever:
-            template = """Answer the question based only on the following context:
-{context}
-
-Question: {question}
-"""
-            prompt = PromptTemplate.from_template(template)
-
-            def format_docs(docs):
-                return "\n\n".join(doc.page_content for doc in docs)
-
-            return (
-                {"context": self.retriever | format_docs, "question": RunnablePassthrough()}
-                | prompt
-                | self.llm
-                | StrOutputParser()
+            # The search scope is chosen per call: config={"configurable": {"chapter_id": ...}}
+            retriever = self.retriever.configurable_fields(
+                chapter_id=ConfigurableField(id="chapter_id", name="Chapter ID"),
+                module_id=ConfigurableField(id="module_id", name="Module ID"),
             )
+            return RunnableParallel(
+                docs=retriever, question=RunnablePassthrough()
+            ).assign(answer=self._answer_chain())
         else:
             # Fallback: simple LLM without context
             template = """You are an AI assistant. Answer the user's question using general knowledge.
@@ -168,35 +203,401 @@ Question: {question}
 
 Answer:"""
             prompt = PromptTemplate.from_template(template)
-            return ({"question": RunnablePassthrough()} | prompt | self.llm | StrOutputParser())
+            return RunnableParallel(question=RunnablePassthrough()).assign(
+                answer=prompt | self.llm | StrOutputParser()
+            )
+
+    def _answer_chain(self):
+        """Prompt + LLM over {"docs", "question"}; the QA chain feeds it the retriever's documents."""
+        template = """Answer the question based only on the following context:
+{context}
+
+Question: {question}
+"""
+        prompt = PromptTemplate.from_template(template)
+
+        def format_docs(inputs):
+            return {
+                "context": self.context_packer.pack(inputs["docs"], inputs["question"]),
+                "question": inputs["question"],
+            }
+
+        return RunnableLambda(format_docs) | prompt | self.llm | StrOutputParser()
+
+    def _format_response(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Turn a QA chain result into the API response. The retrieved documents
+        are kept under "retrieved_documents" for citations and logging.
+        """
+        if self.retriever:
+            docs = result.get("docs") or []
+            sources = [doc.metadata.get("source", "Unknown") for doc in docs]
+            print(f"Retrieved {len(docs)} documents: {sources}")
+        else:
+            docs = []
+            sources = ["No retriever configured"]
+
+        return {
+            "llm_answer": result["answer"],
+            "source_documents": sources,
+            "retrieved_documents": docs,
+        }
+
+    # --- Search scope ---
+    @staticmethod
+    def scope_key(chapter_id: str = None, module_id: str = None) -> str:
+        """Stable string for a search scope ("" when unscoped); used in cache keys."""
+        return "&".join(f"{name}={value}" for name, value in (("chapter", chapter_id), ("module", module_id)) if value)
+
+    def _scope_config(self, chapter_id: str = None, module_id: str = None) -> Optional[RunnableConfig]:
+        if not self.retriever or not (chapter_id or module_id):
+            return None
+        return {"configurable": {"chapter_id": chapter_id, "module_id": module_id}}
+
+    # --- Semantic cache ---
+    def _cache_lookup(self, question: str, scope: str = "") -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+        if not self.semantic_cache:
+            return None, None
+        try:
+            vector = self.semantic_cache.embed(question)
+        except Exception as e:
+            print(f"Semantic cache lookup failed: {e}")
+            return None, None
+        return vector, self.semantic_cache.lookup(vector, scope)
+
+    async def _acache_lookup(self, question: str, scope: str = "") -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+        if not self.semantic_cache:
+            return None, None
+        try:
+            vector = await self.semantic_cache.aembed(question)
+        except Exception as e:
+            print(f"Semantic cache lookup failed: {e}")
+            return None, None
+        return vector, self.semantic_cache.lookup(vector, scope)
+
+    def _cache_store(self, question: str, vector: Optional[np.ndarray], response: Dict[str, Any], scope: str = ""):
+        if not self.semantic_cache or vector is None:
+            return
+        chapter_ids = {
+            doc.metadata.get("chapter_id") or doc.metadata.get("doc_id")
+            for doc in response.get("retrieved_documents", [])
+        }
+        self.semantic_cache.store(question, vector, response, [c for c in chapter_ids if c], scope)
+
+    def invalidate_chapter(self, chapter_id: str) -> int:
+        """Drop cached answers grounded in a chapter that has just been re-ingested."""
+        if not self.semantic_cache:
+            return 0
+        return self.semantic_cache.invalidate_chapter(chapter_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "semantic_cache": self.semantic_cache.stats() if self.semantic_cache else None,
+            "embedding_cache": self.embeddings.stats() if isinstance(self.embeddings, CachedEmbeddings) else None,
+            "llm_router": self.llm.stats() if isinstance(self.llm, LLMRouter) else None,
+            "single_flight": self.single_flight.stats(),
+            "context_packer": self.context_packer.stats(),
+            "retrieval": self.retriever.stats() if self.retriever else None,
+            "sparse_index": (
+                self.vector_store_service.sparse_index.stats()
+                if self.vector_store_service and self.vector_store_service.sparse_index else None
+            ),
+        }
 
     # --- Query methods ---
-    def query(self, question: str) -> Dict[str, Any]:
+    def query(self, question: str, chapter_id: str = None, module_id: str = None) -> Dict[str, Any]:
+        if not self.qa_chain:
+            return {
+                "llm_answer": f"Cannot answer: No LLM configured. Question: {question}",
+                "source_documents": []
+            }
+
+        scope = self.scope_key(chapter_id, module_id)
+        vector, cached = self._cache_lookup(question, scope)
+        if cached:
+            return cached
+
+        try:
+            result = self.qa_chain.invoke(question, config=self._scope_config(chapter_id, module_id))
+            response = self._format_response(result)
+            self._cache_store(question, vector, response, scope)
+            return response
+        except Exception as e:
+            return {"llm_answer": f"Error: {str(e)}", "source_documents": []}
+
+    def ask_selected_text(self, selected_text: str, question: str, chapter_id: str = None) -> Dict[str, Any]:
+        if not self.llm:
+            return {
+                "llm_answer": f"Cannot answer: No LLM configured. Question: {question}",
+                "source_documents": []
+            }
+
+        scope = self._selection_scope(selected_text)
+        vector, cached = self._cache_lookup(question, scope)
+        if cached:
+            return cached
+
+        docs = self._locate_selection(selected_text, chapter_id)
+        try:
+            answer = self._selection_chain().invoke(self._selection_inputs(selected_text, question, docs))
+            response = self._selection_response(answer, docs)
+            self._cache_store(question, vector, response, scope)
+            return response
+        except Exception as e:
+            return {"llm_answer": f"Error: {str(e)}", "source_documents": []}
+
+    async def aquery(self, question: str, chapter_id: str = None, module_id: str = None) -> Dict[str, Any]:
+        """Answer a question, optionally searching only one chapter and/or module."""
+        key = make_cache_key(question, scope=self.scope_key(chapter_id, module_id))
+        return await self.single_flight.do(key, lambda: self._aquery(question, chapter_id, module_id))
+
+    async def _aquery(self, question: str, chapter_id: str = None, module_id: str = None) -> Dict[str, Any]:
         if not self.qa_chain:
             return {
                 "llm_answer": f"Cannot answer: No LLM configured. Question: {question}",
                 "source_documents": []
             }
 
+        scope = self.scope_key(chapter_id, module_id)
+        vector, cached = await self._acache_lookup(question, scope)
+        if cached:
+            return cached
+
+        try:
+            async with self._llm_semaphore:
+                result = await self.qa_chain.ainvoke(question, config=self._scope_config(chapter_id, module_id))
+            response = self._format_response(result)
+            self._cache_store(question, vector, response, scope)
+            return response
+        except Exception as e:
+            return {"llm_answer": f"Error: {str(e)}", "source_documents": []}
+
+    async def aask_selected_text(self, selected_text: str, question: str, chapter_id: str = None) -> Dict[str, Any]:
+        """Answer a question about a selection from its source chunks, without broad retrieval."""
+        key = make_cache_key(question, selected_text, self.scope_key(chapter_id))
+        return await self.single_flight.do(
+            key, lambda: self._aask_selected_text(selected_text, question, chapter_id)
+        )
+
+    async def _aask_selected_text(self, selected_text: str, question: str, chapter_id: str = None) -> Dict[str, Any]:
+        if not self.llm:
+            return {
+                "llm_answer": f"Cannot answer: No LLM configured. Question: {question}",
+                "source_documents": []
+            }
+
+        scope = self._selection_scope(selected_text)
+        vector, cached = await self._acache_lookup(question, scope)
+        if cached:
+            return cached
+
+        docs = await asyncio.to_thread(self._locate_selection, selected_text, chapter_id)
         try:
-            answer = self.qa_chain.invoke(question)
-            # Retrieve source docs if retriever exists
-            if self.retriever:
-                try:
-                    source_docs = self.retriever.invoke(question)
-                    sources = [doc.metadata.get("source", "Unknown") for doc in source_docs]
-                except Exception:
-                    sources = ["Content retrieval not available"]
-            else:
-                sources = ["No retriever configured"]
-
-            return {"llm_answer": answer, "source_documents": sources}
+            async with self._llm_semaphore:
+                answer = await self._selection_chain().ainvoke(self._selection_inputs(selected_text, question, docs))
+            response = self._selection_response(answer, docs)
+            self._cache_store(question, vector, response, scope)
+            return response
         except Exception as e:
             return {"llm_answer": f"Error: {str(e)}", "source_documents": []}
 
-    def ask_selected_text(self, selected_text: str, question: str) -> Dict[str, Any]:
-        enhanced_question = f"Based on the following text: '{selected_text}', {question}"
-        return self.query(enhanced_question)
+    async def aquery_batch(self, items: List[Dict[str, Optional[str]]]) -> List[Dict[str, Any]]:
+        """
+        Answer many questions together. All questions are embedded in one
+        batched request, which serves both the semantic cache and one Qdrant
+        batch search. Generation then runs concurrently, at most
+        batch_max_parallelism answers at a time.
+
+        Args:
+            items: {"question", "chapter_id", "module_id"} per question
+
+        Returns:
+            One response per item, in order; a failed item is {"error": message}
+        """
+        questions = [item["question"] for item in items]
+        if not self.qa_chain:
+            return [
+                {"llm_answer": f"Cannot answer: No LLM configured. Question: {question}", "source_documents": []}
+                for question in questions
+            ]
+
+        scopes = [{"chapter_id": item.get("chapter_id"), "module_id": item.get("module_id")} for item in items]
+        scope_keys = [self.scope_key(**scope) for scope in scopes]
+
+        vectors = None
+        if self.embeddings and (self.semantic_cache or (self.retriever and self.retriever.dense_enabled)):
+            try:
+                vectors = await aembed_queries(self.embeddings, questions)
+            except Exception as e:
+                print(f"Batch embedding failed: {e}")
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        cache_vectors: List[Optional[np.ndarray]] = [None] * len(items)
+        if self.semantic_cache and vectors is not None:
+            for i, vector in enumerate(vectors):
+                cache_vectors[i] = self.semantic_cache.normalize(vector)
+                results[i] = self.semantic_cache.lookup(cache_vectors[i], scope_keys[i])
+        pending = [i for i, result in enumerate(results) if result is None]
+
+        docs: Dict[int, List[Document]] = {}
+        if self.retriever and pending:
+            retrieved = await self.retriever.abatch_retrieve(
+                [questions[i] for i in pending],
+                [scopes[i] for i in pending],
+                [vectors[i] for i in pending] if vectors is not None else None,
+            )
+            docs = dict(zip(pending, retrieved))
+
+        answer_chain = self._answer_chain() if self.retriever else None
+        parallelism = asyncio.Semaphore(self.batch_max_parallelism)
+
+        async def answer(i: int) -> Dict[str, Any]:
+            try:
+                async with parallelism, self._llm_semaphore:
+                    if answer_chain:
+                        result = {"docs": docs[i], "question": questions[i]}
+                        result["answer"] = await answer_chain.ainvoke(result)
+                    else:
+                        result = await self.qa_chain.ainvoke(questions[i])
+                response = self._format_response(result)
+            except Exception as e:
+                return {"error": str(e)}
+            self._cache_store(questions[i], cache_vectors[i], response, scope_keys[i])
+            return response
+
+        for i, response in zip(pending, await asyncio.gather(*(answer(i) for i in pending))):
+            results[i] = response
+        return results
+
+    async def astream_query(
+        self, question: str, chapter_id: str = None, module_id: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream answer tokens, then the source documents as a final event."""
+        key = make_cache_key(question, scope=self.scope_key(chapter_id, module_id))
+        async for item in self.single_flight.stream(key, lambda: self._astream_query(question, chapter_id, module_id)):
+            yield item
+
+    async def _astream_query(
+        self, question: str, chapter_id: str = None, module_id: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        # Identical concurrent streams share this one (see astream_query)
+        if not self.qa_chain:
+            yield {"event": "token", "data": f"Cannot answer: No LLM configured. Question: {question}"}
+            yield {"event": "sources", "data": []}
+            return
+
+        scope = self.scope_key(chapter_id, module_id)
+        vector, cached = await self._acache_lookup(question, scope)
+        if cached:
+            yield {"event": "token", "data": cached["llm_answer"]}
+            yield {"event": "sources", "data": cached["source_documents"]}
+            return
+
+        result: Dict[str, Any] = {"answer": ""}
+        try:
+            async with self._llm_semaphore:
+                async for chunk in self.qa_chain.astream(question, config=self._scope_config(chapter_id, module_id)):
+                    if "docs" in chunk:
+                        result["docs"] = chunk["docs"]
+                    if "answer" in chunk:
+                        result["answer"] += chunk["answer"]
+                        yield {"event": "token", "data": chunk["answer"]}
+        except Exception as e:
+            yield {"event": "error", "data": f"Error: {str(e)}"}
+            return
+
+        response = self._format_response(result)
+        self._cache_store(question, vector, response, scope)
+        yield {"event": "sources", "data": response["source_documents"]}
+
+    async def astream_selected_text(
+        self, selected_text: str, question: str, chapter_id: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        key = make_cache_key(question, selected_text, self.scope_key(chapter_id))
+        stream = lambda: self._astream_selected_text(selected_text, question, chapter_id)
+        async for item in self.single_flight.stream(key, stream):
+            yield item
+
+    async def _astream_selected_text(
+        self, selected_text: str, question: str, chapter_id: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        if not self.llm:
+            yield {"event": "token", "data": f"Cannot answer: No LLM configured. Question: {question}"}
+            yield {"event": "sources", "data": []}
+            return
+
+        scope = self._selection_scope(selected_text)
+        vector, cached = await self._acache_lookup(question, scope)
+        if cached:
+            yield {"event": "token", "data": cached["llm_answer"]}
+            yield {"event": "sources", "data": cached["source_documents"]}
+            return
+
+        docs = await asyncio.to_thread(self._locate_selection, selected_text, chapter_id)
+        answer = ""
+        try:
+            async with self._llm_semaphore:
+                inputs = self._selection_inputs(selected_text, question, docs)
+                async for chunk in self._selection_chain().astream(inputs):
+                    answer += chunk
+                    yield {"event": "token", "data": chunk}
+        except Exception as e:
+            yield {"event": "error", "data": f"Error: {str(e)}"}
+            return
+
+        response = self._selection_response(answer, docs)
+        self._cache_store(question, vector, response, scope)
+        yield {"event": "sources", "data": response["source_documents"]}
+
+    # --- Selected-text helpers ---
+    @staticmethod
+    def _selection_scope(selected_text: str) -> str:
+        # Semantic cache hits must be about the same selection
+        return "selection=" + make_cache_key(selected_text)
+
+    def _selection_chain(self):
+        return PromptTemplate.from_template(SELECTION_TEMPLATE) | self.llm | StrOutputParser()
+
+    def _locate_selection(self, selected_text: str, chapter_id: str = None) -> List[Document]:
+        """Source chunk(s) of the selection plus adjacent chunks, in reading order."""
+        if not self.vector_store_service:
+            return []
+        try:
+            chunks = self.vector_store_service.locate_selection(
+                selected_text, chapter_id, self.selection_neighbor_chunks
+            )
+        except Exception as e:
+            print(f"Could not locate selected text: {e}")
+            return []
+        return [
+            Document(
+                page_content=chunk.get("content", ""),
+                metadata={
+                    **(chunk.get("metadata") or {}),
+                    "doc_id": chunk.get("doc_id"),
+                    "point_id": chunk["id"],
+                    "matched": chunk["matched"],
+                },
+            )
+            for chunk in chunks
+        ]
+
+    def _selection_inputs(self, selected_text: str, question: str, docs: List[Document]) -> Dict[str, str]:
+        return {
+            "selection": compress_selection(selected_text, question, self.selection_max_tokens),
+            "context": self.context_packer.pack(docs, question) or "(not found in the textbook)",
+            "question": question,
+        }
+
+    @staticmethod
+    def _selection_response(answer: str, docs: List[Document]) -> Dict[str, Any]:
+        sources = list(dict.fromkeys(doc.metadata.get("source", "Unknown") for doc in docs)) or ["Selected text"]
+        print(f"Answered from {len(docs)} chunks around the selection: {sources}")
+        return {
+            "llm_answer": answer,
+            "source_documents": sources,
+            "retrieved_documents": docs,
+        }
 
     def safety_check(self, response: str) -> bool:
         lower_response = response.lower()
@@ -0,0 +1,102 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import os
+import time
+
+
+@dataclass
+class DependencyStatus:
+    name: str
+    required: bool = True
+    status: str = "pending"  # pending | ok | down | disabled
+    latency_ms: Optional[float] = None
+    detail: Any = None
+    error: Optional[str] = None
+    checked_at: Optional[datetime] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "required": self.required,
+            "latency_ms": self.latency_ms,
+            "detail": self.detail,
+            "error": self.error,
+            "checked_at": self.checked_at,
+        }
+
+
+class ReadinessProbe:
+    """
+    Background reachability checks for external dependencies.
+
+    Each check is an async callable that raises on failure and may return a
+    detail value. Checks run once right after start() and then every
+    `interval` seconds, each bounded by `timeout`; request handlers only
+    read the cached results, so /api/ready never waits on the network.
+    """
+
+    def __init__(self, interval: float = 60.0, timeout: float = 10.0):
+        self.interval = interval
+        self.timeout = timeout
+        self._checks: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._status: Dict[str, DependencyStatus] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "ReadinessProbe":
+        return cls(
+            interval=float(os.getenv("READINESS_PROBE_INTERVAL_SECONDS", "60")),
+            timeout=float(os.getenv("READINESS_PROBE_TIMEOUT_SECONDS", "10")),
+        )
+
+    def add_check(self, name: str, check: Callable[[], Awaitable[Any]], required: bool = True):
+        self._checks[name] = check
+        self._status[name] = DependencyStatus(name=name, required=required)
+
+    def add_disabled(self, name: str, reason: str):
+        """Record a dependency that is not configured; it never blocks readiness."""
+        self._status[name] = DependencyStatus(name=name, required=False, status="disabled", detail=reason)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run_checks(self):
+        await asyncio.gather(*(self._check(name, check) for name, check in self._checks.items()))
+
+    async def _check(self, name: str, check: Callable[[], Awaitable[Any]]):
+        status = self._status[name]
+        started = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(check(), self.timeout)
+            status.status, status.detail, status.error = "ok", detail, None
+        except asyncio.TimeoutError:
+            status.status, status.error = "down", f"timed out after {self.timeout:g}s"
+        except Exception as e:
+            status.status, status.error = "down", str(e) or type(e).__name__
+        status.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        status.checked_at = datetime.utcnow()
+
+    async def _run(self):
+        while True:
+            await self.run_checks()
+            await asyncio.sleep(self.interval)
+
+    @property
+    def ready(self) -> bool:
+        return all(s.status == "ok" for s in self._status.values() if s.required)
+
+    def snapshot(self) -> Dict[str, Any]:
+        pending: List[str] = [s.name for s in self._status.values() if s.status == "pending"]
+        return {
+            "ready": self.ready,
+            "pending": pending,
+            "dependencies": {name: s.to_dict() for name, s in self._status.items()},
+        }
@@ -0,0 +1,108 @@
+from collections import Counter
+from typing import Any, Dict, List
+import math
+import re
+
+from .sparse_index import tokenize
+from .tokens import count_tokens, decode, encode
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+_WHITESPACE = re.compile(r"\s+")
+_MARKDOWN = re.compile(r"[#*_`>\[\]]")
+
+# Sentences shorter than this are too generic to pin a selection to a chunk
+_MIN_PROBE_CHARS = 24
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split prose into sentences; paragraph breaks always end a sentence."""
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+def normalize_text(text: str) -> str:
+    """Fold case, markdown markup and whitespace so rendered selections match the stored markdown."""
+    return _WHITESPACE.sub(" ", _MARKDOWN.sub("", text.casefold())).strip()
+
+
+def compress_selection(selection: str, question: str, max_tokens: int) -> str:
+    """
+    Shrink a selection to at most max_tokens by extractive sentence ranking.
+
+    Sentences are scored by the IDF-weighted overlap of their terms with the
+    question, plus a small weight for how central they are to the selection
+    itself (so selections unrelated to the question wording still keep their
+    main sentences). The best sentences are kept in their original order.
+
+    Args:
+        selection: Text the user selected
+        question: The user's question about it
+        max_tokens: Token budget; 0 or less disables compression
+
+    Returns:
+        The selection unchanged if it fits, otherwise the kept sentences joined by spaces
+    """
+    if max_tokens <= 0 or count_tokens(selection) <= max_tokens:
+        return selection
+
+    sentences = split_sentences(selection)
+    terms = [Counter(tokenize(sentence)) for sentence in sentences]
+    document_frequency = Counter(term for counts in terms for term in counts)
+    idf = {term: math.log(1 + len(sentences) / df) for term, df in document_frequency.items()}
+    question_terms = set(tokenize(question))
+
+    def score(counts: Counter) -> float:
+        if not counts:
+            return 0.0
+        overlap = sum(idf.get(term, 0.0) for term in question_terms if term in counts)
+        centrality = sum(document_frequency[term] - 1 for term in counts) / sum(counts.values())
+        return overlap + 0.1 * centrality
+
+    ranked = sorted(range(len(sentences)), key=lambda i: score(terms[i]), reverse=True)
+    kept, used = set(), 0
+    for i in ranked:
+        cost = count_tokens(sentences[i])
+        if used + cost > max_tokens:
+            continue
+        kept.add(i)
+        used += cost
+    if not kept:
+        # Even the best sentence is over budget: keep its leading tokens
+        return decode(encode(sentences[ranked[0]])[:max_tokens])
+    return " ".join(sentences[i] for i in sorted(kept))
+
+
+def match_selection(selection: str, chunks: List[Dict[str, Any]]) -> List[int]:
+    """
+    Positions of the chunks a selection was taken from.
+
+    A chunk matches when it contains one of the selection's sentences (or
+    the whole selection, if short). Selections spanning a chunk boundary match
+    every chunk they touch. If nothing matches verbatim (e.g. the selection
+    was rendered differently), the chunk with the highest term overlap is
+    used instead.
+
+    Args:
+        selection: Text the user selected
+        chunks: Chunks of one chapter ({"content", ...}), in chapter order
+
+    Returns:
+        Sorted positions into chunks; empty if no chunk shares a term with the selection
+    """
+    contents = [normalize_text(chunk.get("content", "")) for chunk in chunks]
+    probes = [normalize_text(sentence) for sentence in split_sentences(selection)]
+    probes = [probe for probe in probes if len(probe) >= _MIN_PROBE_CHARS] or [normalize_text(selection)]
+
+    matched = [i for i, content in enumerate(contents) if any(probe in content for probe in probes)]
+    if matched:
+        return matched
+
+    selection_terms = set(tokenize(selection))
+    best, best_overlap = None, 0.0
+    for i, chunk in enumerate(chunks):
+        chunk_terms = set(tokenize(chunk.get("content", "")))
+        if not chunk_terms:
+            continue
+        overlap = len(selection_terms & chunk_terms) / len(selection_terms | chunk_terms)
+        if overlap > best_overlap:
+            best, best_overlap = i, overlap
+    return [best] if best is not None else []
@@ -0,0 +1,175 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import itertools
+import os
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+@dataclass
+class SemanticCacheEntry:
+    question: str
+    vector: np.ndarray
+    response: Dict[str, Any]
+    chapter_ids: List[str] = field(default_factory=list)
+    scope: str = ""  # answers retrieved from one chapter/module only match that scope
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class SemanticCache:
+    """
+    Answer cache keyed on question meaning rather than wording.
+
+    Questions are embedded and compared by cosine similarity against previously
+    answered questions; a match above the threshold returns the stored response
+    without calling the LLM. Entries are evicted LRU-first once the cache is
+    full, expire after a TTL, and can be dropped per chapter when that chapter
+    is re-ingested.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        similarity_threshold: float = 0.92,
+        max_entries: int = 1000,
+        ttl_seconds: float = 86400,
+    ):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self._entries: "OrderedDict[int, SemanticCacheEntry]" = OrderedDict()
+        self._ids = itertools.count()
+        self._matrix: Optional[np.ndarray] = None  # stacked entry vectors, rebuilt lazily
+        self._matrix_keys: List[int] = []
+        self._matrix_scopes: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, embeddings: Optional[Embeddings]) -> Optional["SemanticCache"]:
+        """
+        Build a cache from SEMANTIC_CACHE_* environment variables, or return
+        None if caching is disabled or no embeddings are available.
+        """
+        if embeddings is None or os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() != "true":
+            return None
+        return cls(
+            embeddings,
+            similarity_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000")),
+            ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400")),
+        )
+
+    # --- Embedding ---
+    @staticmethod
+    def normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def embed(self, question: str) -> np.ndarray:
+        return self.normalize(self.embeddings.embed_query(question))
+
+    async def aembed(self, question: str) -> np.ndarray:
+        return self.normalize(await self.embeddings.aembed_query(question))
+
+    # --- Lookup / store ---
+    def lookup(self, vector: np.ndarray, scope: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Return the stored response for the most similar cached question in
+        the same scope, or None if nothing is above the similarity threshold.
+        """
+        with self._lock:
+            self._expire()
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._matrix_keys = list(self._entries.keys())
+                self._matrix = np.stack([self._entries[k].vector for k in self._matrix_keys])
+                self._matrix_scopes = np.array([self._entries[k].scope for k in self._matrix_keys], dtype=object)
+
+            scores = np.where(self._matrix_scopes == scope, self._matrix @ vector, -np.inf)
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            key = self._matrix_keys[best]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key].response
+
+    def store(
+        self,
+        question: str,
+        vector: np.ndarray,
+        response: Dict[str, Any],
+        chapter_ids: List[str] = None,
+        scope: str = "",
+    ):
+        """Cache a response, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[next(self._ids)] = SemanticCacheEntry(
+                question=question,
+                vector=vector,
+                response=response,
+                chapter_ids=list(chapter_ids or []),
+                scope=scope,
+            )
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate_chapter(self, chapter_id: str) -> int:
+        """
+        Drop every entry grounded in the given chapter.
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if chapter_id in e.chapter_ids]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self._matrix = None
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def _expire(self):
+        # Entries are ordered by recency of use, not age, so scan them all
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [k for k, e in self._entries.items() if e.created_at < cutoff]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "similarity_threshold": self.similarity_threshold,
+            "ttl_seconds": self.ttl_seconds,
+        }
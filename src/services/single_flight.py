@@ -0,0 +1,101 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+import asyncio
+
+
+class _StreamFlight:
+    """Items produced so far by one in-flight stream, replayed to every subscriber."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: BaseException = None
+        self.changed = asyncio.Condition()
+
+    async def publish(self, item: Any):
+        async with self.changed:
+            self.items.append(item)
+            self.changed.notify_all()
+
+    async def finish(self, error: BaseException = None):
+        async with self.changed:
+            self.done, self.error = True, error
+            self.changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        position = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: position < len(self.items) or self.done)
+                items, done, error = self.items[position:], self.done, self.error
+            position += len(items)
+            for item in items:
+                yield item
+            if done and position == len(self.items):
+                if error:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical requests into one in-flight computation.
+
+    The first caller for a key runs the work; callers that arrive while it
+    is running wait for the same result instead of starting their own. For
+    streams, every subscriber receives the full item sequence: late joiners
+    get the items produced so far, then follow live. The work runs as its
+    own task, so a caller that disconnects does not cancel it for the rest
+    (its result still reaches the caches).
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, _StreamFlight] = {}
+        self._tasks = set()
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def stream(self, key: str, fn: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        flight = self._streams.get(key)
+        if flight:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            flight = _StreamFlight()
+            self._streams[key] = flight
+            task = asyncio.ensure_future(self._produce(key, flight, fn))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        async for item in flight.subscribe():
+            yield item
+
+    async def _produce(self, key: str, flight: _StreamFlight, fn: Callable[[], AsyncIterator[Any]]):
+        error = None
+        try:
+            async for item in fn():
+                await flight.publish(item)
+        except Exception as e:
+            error = e
+        finally:
+            # New requests start a fresh flight once this one has finished
+            self._streams.pop(key, None)
+            await flight.finish(error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,259 @@
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+
+_TOKEN = re.compile(r"[a-z0-9_]+")
+
+# Very common English words; they carry almost no BM25 weight but have the
+# longest posting lists
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in into is it its "
+    "me my of on or so that the their then there these this to was we what when where which "
+    "who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; identifiers such as rclpy or isaac_sim stay whole."""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    Local inverted index with Okapi BM25 scoring over ingested chunks.
+
+    Chunk text and metadata are stored in SQLite so the index survives
+    restarts; the postings are rebuilt in memory on first use. Scoring needs
+    no embeddings, so keyword search keeps working without an embedding API.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                chapter_id TEXT,
+                content TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_chapter_id ON chunks (chapter_id)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+        # In-memory postings, built lazily: term -> {chunk id: term frequency}
+        self._postings: Optional[Dict[str, Dict[str, int]]] = None
+        self._lengths: Dict[str, int] = {}
+        self._total_length = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["BM25Index"]:
+        if os.getenv("SPARSE_INDEX_ENABLED", "true").lower() != "true":
+            return None
+        path = os.getenv("SPARSE_INDEX_PATH", ".cache/sparse_index.sqlite3")
+        try:
+            return cls(path)
+        except Exception as e:
+            print(f"Warning: Could not open sparse index at {path}: {e}")
+            return None
+
+    # --- In-memory postings ---
+    def _ensure_loaded(self):
+        # Caller holds the lock
+        if self._postings is not None:
+            return
+        self._postings = defaultdict(dict)
+        self._lengths, self._total_length = {}, 0
+        for chunk_id, content in self._conn.execute("SELECT id, content FROM chunks"):
+            self._add_postings(chunk_id, content)
+
+    def _add_postings(self, chunk_id: str, content: str):
+        tokens = tokenize(content)
+        for term, frequency in Counter(tokens).items():
+            self._postings[term][chunk_id] = frequency
+        self._lengths[chunk_id] = len(tokens)
+        self._total_length += len(tokens)
+
+    def _remove_postings(self, chunk_id: str, content: str):
+        for term in set(tokenize(content)):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(chunk_id, 0)
+
+    def _contents(self, ids: List[str]) -> Dict[str, str]:
+        found = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT id, content FROM chunks WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update(rows)
+        return found
+
+    # --- Updates ---
+    def upsert(self, rows: Iterable[Tuple[str, str, Dict[str, Any]]]):
+        """
+        Add or replace chunks.
+
+        Args:
+            rows: (chunk id, text, metadata) tuples; metadata["chapter_id"] groups chunks by chapter
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            for chunk_id, old_content in self._contents([chunk_id for chunk_id, _, _ in rows]).items():
+                self._remove_postings(chunk_id, old_content)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, chapter_id, content, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (chunk_id, metadata.get("chapter_id"), text, json.dumps(metadata, default=str))
+                    for chunk_id, text, metadata in rows
+                ],
+            )
+            self._conn.commit()
+            for chunk_id, text, _ in rows:
+                self._add_postings(chunk_id, text)
+
+    def delete(self, ids: List[str]):
+        if not ids:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            for chunk_id, content in self._contents(list(ids)).items():
+                self._remove_postings(chunk_id, content)
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in ids])
+            self._conn.commit()
+
+    def chapter_ids(self, chapter_id: str) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT id FROM chunks WHERE chapter_id = ?", (chapter_id,))]
+
+    def delete_chapter(self, chapter_id: str):
+        self.delete(self.chapter_ids(chapter_id))
+
+    def replace_chapter(self, chapter_id: str, rows: List[Tuple[str, str, Dict[str, Any]]]):
+        """Make the index hold exactly `rows` for a chapter."""
+        keep = {chunk_id for chunk_id, _, _ in rows}
+        self.delete([chunk_id for chunk_id in self.chapter_ids(chapter_id) if chunk_id not in keep])
+        self.upsert(rows)
+
+    def chapter_chunks(self, chapter_id: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """(chunk id, text, metadata) for every chunk of a chapter."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, content, metadata FROM chunks WHERE chapter_id = ?", (chapter_id,)
+            ).fetchall()
+        return [(chunk_id, content, json.loads(metadata)) for chunk_id, content, metadata in rows]
+
+    def chapter_hashes(self, chapter_id: str) -> Dict[str, Optional[str]]:
+        """Map chunk ID -> stored content hash for every chunk of a chapter."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, metadata FROM chunks WHERE chapter_id = ?", (chapter_id,)).fetchall()
+        return {chunk_id: json.loads(metadata).get("content_hash") for chunk_id, metadata in rows}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.commit()
+            self._postings = None
+
+    # --- Search ---
+    def _scope_ids(self, chapter_id: str = None, module_id: str = None) -> Optional[set]:
+        # Caller holds the lock
+        if not chapter_id and not module_id:
+            return None
+        clauses, params = [], []
+        if chapter_id:
+            clauses.append("chapter_id = ?")
+            params.append(chapter_id)
+        if module_id:
+            clauses.append("json_extract(metadata, '$.module_id') = ?")
+            params.append(module_id)
+        return {row[0] for row in self._conn.execute(f"SELECT id FROM chunks WHERE {' AND '.join(clauses)}", params)}
+
+    def search(self, query: str, k: int = 5, chapter_id: str = None, module_id: str = None) -> List[Dict[str, Any]]:
+        """
+        Top-k chunks by BM25 score, optionally restricted to a chapter and/or module.
+
+        Returns:
+            List of {"id", "content", "metadata", "score"}, best first
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            self._ensure_loaded()
+            total = len(self._lengths)
+            if not terms or not total:
+                return []
+            average_length = self._total_length / total
+            allowed = self._scope_ids(chapter_id, module_id)
+            if allowed is not None and not allowed:
+                return []
+
+            scores: Dict[str, float] = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, frequency in postings.items():
+                    if allowed is not None and chunk_id not in allowed:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / average_length)
+                    scores[chunk_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            if not top:
+                return []
+            ids = [chunk_id for chunk_id, _ in top]
+            rows = self._conn.execute(
+                f"SELECT id, content, metadata FROM chunks WHERE id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall()
+
+        stored = {chunk_id: (content, metadata) for chunk_id, content, metadata in rows}
+        return [
+            {
+                "id": chunk_id,
+                "content": stored[chunk_id][0],
+                "metadata": json.loads(stored[chunk_id][1]),
+                "score": score,
+            }
+            for chunk_id, score in top
+            if chunk_id in stored
+        ]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            loaded = self._postings is not None
+            return {
+                "path": self.path,
+                "chunks": self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0],
+                "terms": len(self._postings) if loaded else None,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
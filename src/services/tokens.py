@@ -0,0 +1,49 @@
+from functools import lru_cache
+from typing import List
+import os
+import re
+
+import tiktoken
+
+
+class _ApproximateEncoding:
+    """
+    Whitespace-and-punctuation tokenizer used when the tiktoken BPE file
+    cannot be loaded (e.g. offline hosts). Tokens are the text pieces
+    themselves, so decode(encode(text)) round-trips exactly.
+    """
+
+    name = "approximate"
+    _PIECE = re.compile(r"\s*\w+|\s*[^\w\s]|\s+")
+
+    def encode(self, text: str, **kwargs) -> List[str]:
+        return self._PIECE.findall(text)
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = None):
+    """
+    Return the tiktoken encoding used for token budgets (TOKEN_ENCODING,
+    default cl100k_base, the gpt-3.5/gpt-4 tokenizer).
+    """
+    name = name or os.getenv("TOKEN_ENCODING", "cl100k_base")
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        print(f"Warning: Could not load tiktoken encoding '{name}', using approximate token counts: {e}")
+        return _ApproximateEncoding()
+
+
+def count_tokens(text: str) -> int:
+    return len(encode(text))
+
+
+def encode(text: str) -> list:
+    return get_encoding().encode(text, disallowed_special=())
+
+
+def decode(tokens: list) -> str:
+    return get_encoding().decode(tokens)
@@ -1,13 +1,68 @@
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
-from typing import List, Dict, Any
+from dataclasses import dataclass, field
+from typing import Callable, List, Dict, Any, Optional, Tuple
+import hashlib
+import json
 import os
 from dotenv import load_dotenv
 import uuid
 
+from langchain_core.embeddings import Embeddings
+
+from .chunking import MarkdownChunker
+from .collection_settings import CollectionSettings
+from .local_vector_store import LocalVectorClient
+from .selection import match_selection
+from .sparse_index import BM25Index
+
 # Load environment variables
 load_dotenv()
 
+# Namespace for content-derived point IDs; changing it re-keys every point
+POINT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "ai-note-book/textbook_chapters")
+
+
+def point_id(doc_id: str, chunk_index: int = None) -> str:
+    """
+    Stable point ID for a document or one of its chunks. Unlike hash(),
+    uuid5 is not salted per process, so re-ingesting after a restart
+    overwrites the same points instead of duplicating them.
+    """
+    name = doc_id if chunk_index is None else f"{doc_id}:{chunk_index}"
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, name))
+
+
+# Payload fields chunks are filtered on; each gets a keyword payload index
+SCOPE_FIELDS = ("chapter_id", "module_id")
+
+
+def scope_filter(chapter_id: str = None, module_id: str = None) -> Optional[models.Filter]:
+    """Qdrant filter restricting a search to one chapter and/or module (None if unscoped)."""
+    conditions = [
+        models.FieldCondition(key=f"metadata.{name}", match=models.MatchValue(value=value))
+        for name, value in (("chapter_id", chapter_id), ("module_id", module_id))
+        if value
+    ]
+    return models.Filter(must=conditions) if conditions else None
+
+
+def content_hash(text: str, metadata: Dict[str, Any]) -> str:
+    """Hash of a chunk's text and metadata, used to detect changed chunks."""
+    serialized = json.dumps({"text": text, "metadata": metadata}, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+@dataclass
+class ChapterSyncPlan:
+    """Chunks of a chapter that need (re-)embedding, and points to delete."""
+    chapter_id: str
+    total_chunks: int
+    total_tokens: int
+    changed: List[Tuple[str, str, Dict[str, Any]]] = field(default_factory=list)  # (point id, text, metadata)
+    stale_ids: List[str] = field(default_factory=list)
+    chunks: List[Tuple[str, str, Dict[str, Any]]] = field(default_factory=list)  # every chunk, changed or not
+
+
 class VectorStoreService:
     """
     Service for interacting with the Qdrant vector store.
@@ -19,167 +74,510 @@ class VectorStoreService:
         """
         self.qdrant_url = os.getenv("QDRANT_URL")
         self.qdrant_api_key = os.getenv("QDRANT_API_KEY")
+        # Bounds each request, including the collection check at startup
+        self.qdrant_timeout = int(os.getenv("QDRANT_TIMEOUT_SECONDS", "10"))
 
         try:
             if self.qdrant_url:
                 if self.qdrant_api_key:
-                    self.client = QdrantClient(url=self.qdrant_url, api_key=self.qdrant_api_key, prefer_grpc=True)
+                    self.client = QdrantClient(url=self.qdrant_url, api_key=self.qdrant_api_key, prefer_grpc=True, timeout=self.qdrant_timeout)
                 else:
-                    self.client = QdrantClient(url=self.qdrant_url, prefer_grpc=True)
+                    self.client = QdrantClient(url=self.qdrant_url, prefer_grpc=True, timeout=self.qdrant_timeout)
             else:
-                # For local development, use local Qdrant server instead of in-memory
-                # In-memory has compatibility issues with langchain-qdrant
-                print("Using local gRPC-based in-memory storage instead of HTTP in-memory")
-                self.client = QdrantClient(location=":memory:", prefer_grpc=True)
+                # No Qdrant server: use the persistent local store so the
+                # index survives restarts (VECTOR_BACKEND=memory for throwaway runs)
+                self.client = self._local_client()
         except Exception as e:
             print(f"Warning: Could not connect to Qdrant: {e}")
-            # Fallback to gRPC-based in-memory storage
-            self.client = QdrantClient(location=":memory:", prefer_grpc=True)
+            self.client = self._local_client()
 
         self.collection_name = "textbook_chapters"
+        self.collection_settings = CollectionSettings.from_env()
+        self.embeddings: Optional[Embeddings] = None
+        self.embed_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "96"))
+        self.chunker = MarkdownChunker.from_env()
+        # Keyword (BM25) index over the same chunks; needs no embeddings
+        self.sparse_index = BM25Index.from_env()
         self._initialize_collection()
 
+    @staticmethod
+    def _local_client():
+        if os.getenv("VECTOR_BACKEND", "local") == "memory":
+            print("Using in-memory Qdrant storage (not persisted)")
+            return QdrantClient(location=":memory:")
+        client = LocalVectorClient.from_env()
+        print(f"Using local vector store at {client.path}")
+        return client
+
     def _initialize_collection(self):
         """
-        Initialize the Qdrant collection for storing textbook content.
+        Initialize the Qdrant collection for storing textbook content, and
+        bring an existing collection's storage, quantization and HNSW
+        configuration in line with the current settings.
         """
         # Default to OpenAI's dimension size if not specified
         dimensions = getattr(self, 'embedding_dimensions', 1536)
 
-        try:
-            # Check if collection exists
-            collection_info = self.client.get_collection(self.collection_name)
-            # If collection exists, check if dimensions match
-            existing_size = collection_info.config.params.vectors.size
-            if existing_size != dimensions:
-                print(f"Warning: Collection exists with different dimensions ({existing_size}) than expected ({dimensions})")
-        except:
+        if not self.client.collection_exists(self.collection_name):
             # Create collection if it doesn't exist
+            self._create_collection(dimensions)
+            self._ensure_payload_indexes()
+            print(f"Created collection with {dimensions} dimensions")
+            return
+
+        # Any other failure is raised: treating it as a missing collection
+        # would recreate (and so wipe) a collection that only failed to open
+        collection_info = self.client.get_collection(self.collection_name)
+
+        # If collection exists, check if dimensions match
+        existing_size = collection_info.config.params.vectors.size
+        if existing_size != dimensions:
+            if not collection_info.points_count:
+                # Nothing stored yet, so it is safe to recreate with the right size
+                self.client.delete_collection(self.collection_name)
+                self._create_collection(dimensions)
+                self._ensure_payload_indexes()
+                print(f"Recreated empty collection with {dimensions} dimensions")
+                return
+            print(f"Warning: Collection exists with different dimensions ({existing_size}) than expected ({dimensions})")
+        self._apply_collection_settings(collection_info)
+        self._ensure_payload_indexes(collection_info)
+
+    def _ensure_payload_indexes(self, collection_info=None):
+        """
+        Create keyword payload indexes on the chapter/module IDs so scoped
+        searches are served from the index instead of scanning payloads.
+        """
+        existing = getattr(collection_info, "payload_schema", None) or {}
+        for name in SCOPE_FIELDS:
+            field_name = f"metadata.{name}"
+            if field_name in existing:
+                continue
+            try:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=models.PayloadSchemaType.KEYWORD,
+                )
+            except Exception as e:
+                print(f"Warning: Could not create payload index on {field_name}: {e}")
+
+    def _create_collection(self, dimensions: int):
+        if isinstance(self.client, LocalVectorClient):
+            # Quantization and HNSW settings only apply to Qdrant
             self.client.create_collection(
                 collection_name=self.collection_name,
                 vectors_config=models.VectorParams(size=dimensions, distance=models.Distance.COSINE)
             )
-            print(f"Created collection with {dimensions} dimensions")
+            return
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            **self.collection_settings.create_kwargs(dimensions)
+        )
+
+    def _apply_collection_settings(self, collection_info):
+        """
+        Update an existing collection whose configuration differs from the
+        settings. Qdrant rebuilds quantized vectors and HNSW graphs in the
+        background, so the collection stays searchable meanwhile.
+        """
+        if isinstance(self.client, LocalVectorClient):
+            return
+        try:
+            changes = self.collection_settings.update_kwargs(collection_info)
+            if changes:
+                self.client.update_collection(collection_name=self.collection_name, **changes)
+                print(f"Updated collection configuration: {', '.join(changes)}")
+        except Exception as e:
+            print(f"Warning: Could not update collection configuration: {e}")
 
-    def add_document(self, doc_id: str, content: str, metadata: Dict[str, Any] = None):
+    def add_document(self, doc_id: str, content: str, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
         """
-        Add a document to the vector store.
+        Add a document to the vector store. The document is chunked, embedded
+        and synced like a chapter (see ingest_chapter), with doc_id as the
+        chapter ID.
 
         Args:
             doc_id: Unique identifier for the document
-            content: Text content of the document
+            content: Markdown content of the document
             metadata: Additional metadata about the document
+
+        Returns:
+            The ingest_chapter summary
         """
-        if metadata is None:
-            metadata = {}
+        return self.ingest_chapter(doc_id, content, metadata)
 
-        # Determine embedding dimensions (default to OpenAI's 1536 if not set)
-        dimensions = getattr(self, 'embedding_dimensions', 1536)
+    def plan_chapter(self, chapter_id: str, content_markdown: str, metadata: Dict[str, Any] = None) -> ChapterSyncPlan:
+        """
+        Chunk a chapter and diff it against what the collection already holds.
 
-        # Add the document to the collection
-        # Note: In a real implementation, we would generate embeddings here
-        # For now, we'll store the content with a placeholder embedding
-        try:
-            # Generate a random vector for this example with correct dimensions
-            import numpy as np
-            vector = [float(x) for x in np.random.random(dimensions)]
+        Chunk point IDs are derived from (chapter_id, chunk_index). A chunk is
+        listed as changed when its content hash differs from the hash stored
+        on the existing point; points beyond the new chunk count are stale.
+        Without embeddings only the sparse index is synced, so the diff is
+        taken against it instead.
+        """
+        chunks = self.chunker.split(content_markdown)
+        if self.embeddings is None and self.sparse_index:
+            existing = self.sparse_index.chapter_hashes(chapter_id)
+        else:
+            existing = self.get_chapter_hashes(chapter_id)
+
+        plan = ChapterSyncPlan(
+            chapter_id=chapter_id,
+            total_chunks=len(chunks),
+            total_tokens=sum(chunk.token_count for chunk in chunks),
+        )
+        for chunk in chunks:
+            chunk_metadata = {
+                **(metadata or {}),
+                "chapter_id": chapter_id,
+                "heading_path": chunk.heading_path,
+                "section": " > ".join(chunk.heading_path),
+                "chunk_index": chunk.chunk_index,
+                "token_count": chunk.token_count,
+            }
+            chunk_metadata["content_hash"] = content_hash(chunk.text, chunk_metadata)
+            chunk_id = point_id(chapter_id, chunk.chunk_index)
+            plan.chunks.append((chunk_id, chunk.text, chunk_metadata))
+            if existing.get(chunk_id) != chunk_metadata["content_hash"]:
+                plan.changed.append((chunk_id, chunk.text, chunk_metadata))
+
+        new_ids = {point_id(chapter_id, chunk.chunk_index) for chunk in chunks}
+        plan.stale_ids = [pid for pid in existing if pid not in new_ids]
+        return plan
+
+    @staticmethod
+    def chunk_payload(chapter_id: str, text: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        return {"content": text, "doc_id": chapter_id, "metadata": metadata}
+
+    def ingest_chapter(
+        self,
+        chapter_id: str,
+        content_markdown: str,
+        metadata: Dict[str, Any] = None,
+        progress_callback: Callable[[float], None] = None,
+    ) -> Dict[str, Any]:
+        """
+        Chunk a markdown chapter and incrementally sync it into the collection:
+        only new or changed chunks are embedded (in batches) and upserted in a
+        single batch, and stale points are deleted. The sparse index is then
+        set to the chapter's full chunk list; without embeddings it is the
+        only index updated.
+
+        Args:
+            chapter_id: Identifier of the chapter
+            content_markdown: Full chapter markdown
+            metadata: Extra metadata stored with every chunk (e.g. source)
+            progress_callback: Called with the completed fraction (0.0 - 1.0)
+
+        Returns:
+            Summary of chunks upserted, unchanged and deleted
+        """
+        if self.embeddings is None and not self.sparse_index:
+            raise RuntimeError("No embeddings configured for ingestion")
+
+        report = progress_callback or (lambda fraction: None)
+        plan = self.plan_chapter(chapter_id, content_markdown, metadata)
+        report(0.1)
+
+        if self.embeddings is not None:
+            texts = [text for _, text, _ in plan.changed]
+            vectors: List[List[float]] = []
+            for i in range(0, len(texts), self.embed_batch_size):
+                vectors.extend(self.embeddings.embed_documents(texts[i:i + self.embed_batch_size]))
+                report(0.1 + 0.8 * len(vectors) / len(texts))
+
+            points = [
+                models.PointStruct(
+                    id=chunk_id,
+                    vector=vector,
+                    payload=self.chunk_payload(chapter_id, text, chunk_metadata),
+                )
+                for (chunk_id, text, chunk_metadata), vector in zip(plan.changed, vectors)
+            ]
+            if points:
+                self.client.upsert(collection_name=self.collection_name, points=points, wait=True)
+        self.delete_points(plan.stale_ids)
+        if self.sparse_index:
+            self.sparse_index.replace_chapter(chapter_id, plan.chunks)
+        report(1.0)
 
-            # Create a unique ID for the document
-            point_id = abs(hash(f"{doc_id}_{content[:50]}")) % (10**10)  # Ensure a reasonable integer ID
+        summary = {
+            "chapter_id": chapter_id,
+            "chunks": plan.total_chunks,
+            "upserted": len(plan.changed),
+            "unchanged": plan.total_chunks - len(plan.changed),
+            "deleted": len(plan.stale_ids),
+            "tokens": plan.total_tokens,
+        }
+        print(f"Chapter {chapter_id} synced: {summary}")
+        return summary
 
-            self.client.upsert(
+    def delete_points(self, ids: List[str]):
+        if ids:
+            self.client.delete(
                 collection_name=self.collection_name,
-                points=[
-                    models.PointStruct(
-                        id=point_id,
-                        vector=vector,
-                        payload={
-                            "content": content,
-                            "doc_id": doc_id,
-                            **metadata
-                        }
-                    )
-                ]
+                points_selector=models.PointIdsList(points=ids),
+                wait=True,
             )
-            print(f"Document {doc_id} added successfully to vector store")
-        except Exception as e:
-            print(f"Error adding document to vector store: {e}")
-            # Still try to add even if there's an error with ID generation
-            try:
-                self.client.upsert(
-                    collection_name=self.collection_name,
-                    points=[
-                        models.PointStruct(
-                            id=uuid.uuid4().int & (1<<64)-1,  # 64-bit integer ID
-                            vector=[float(x) for x in np.random.random(dimensions)],
-                            payload={
-                                "content": content,
-                                "doc_id": doc_id,
-                                **metadata
-                            }
-                        )
-                    ]
-                )
-                print(f"Document {doc_id} added with fallback ID")
-            except Exception as fallback_e:
-                print(f"Fallback also failed: {fallback_e}")
+            if self.sparse_index:
+                self.sparse_index.delete(ids)
+
+    def get_chapter_hashes(self, chapter_id: str) -> Dict[str, Optional[str]]:
+        """
+        Map point ID -> stored content hash for every chunk of a chapter.
+        """
+        hashes: Dict[str, Optional[str]] = {}
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=models.Filter(must=[
+                    models.FieldCondition(key="metadata.chapter_id", match=models.MatchValue(value=chapter_id))
+                ]),
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            for record in records:
+                hashes[str(record.id)] = (record.payload.get("metadata") or {}).get("content_hash")
+            if offset is None:
+                return hashes
 
-    def search_documents(self, query_vector: List[float], limit: int = 5) -> List[Dict[str, Any]]:
+    def delete_chapter(self, chapter_id: str):
+        """
+        Delete every chunk stored for a chapter.
+        """
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(must=[
+                    models.FieldCondition(key="metadata.chapter_id", match=models.MatchValue(value=chapter_id))
+                ])
+            ),
+            wait=True,
+        )
+        if self.sparse_index:
+            self.sparse_index.delete_chapter(chapter_id)
+
+    def search_documents(
+        self,
+        query_vector: List[float],
+        limit: int = 5,
+        chapter_id: str = None,
+        module_id: str = None,
+        with_vectors: bool = False,
+    ) -> List[Dict[str, Any]]:
         """
         Search for documents similar to the query vector.
 
         Args:
             query_vector: Vector representation of the query
             limit: Maximum number of results to return
+            chapter_id: Only search chunks of this chapter
+            module_id: Only search chunks of this module
+            with_vectors: Also return each hit's stored vector under "vector"
 
         Returns:
             List of documents with their metadata
         """
         try:
-            from qdrant_client.http import models
-            search_results = self.client.search(
+            response = self.client.query_points(
                 collection_name=self.collection_name,
-                query_vector=query_vector,
-                limit=limit
+                query=query_vector,
+                query_filter=scope_filter(chapter_id, module_id),
+                limit=limit,
+                with_payload=True,
+                with_vectors=with_vectors,
+                search_params=self.collection_settings.search_params(),
             )
 
-            results = []
-            for hit in search_results:
-                results.append({
-                    "content": hit.payload.get("content", ""),
-                    "doc_id": hit.payload.get("doc_id", ""),
-                    "score": hit.score,
-                    **hit.payload
-                })
-
-            return results
-        except AttributeError as e:
-            # Handle potential API changes in Qdrant client
-            print(f"AttributeError in search_documents: {e}")
-            try:
-                # Alternative search method for newer versions
-                search_results = self.client.search_points(
-                    collection_name=self.collection_name,
-                    query=query_vector,
-                    limit=limit
-                )
+            return [self._search_result(hit, with_vectors) for hit in response.points]
+        except Exception as e:
+            print(f"Error searching documents: {e}")
+            return []
 
-                results = []
-                for hit in search_results:
-                    results.append({
-                        "content": hit.payload.get("content", ""),
-                        "doc_id": hit.payload.get("doc_id", ""),
-                        "score": hit.score,
-                        **hit.payload
-                    })
-
-                return results
-            except Exception as fallback_e:
-                print(f"Fallback search also failed: {fallback_e}")
-                return []
+    def search_documents_batch(
+        self,
+        query_vectors: List[List[float]],
+        limit: int = 5,
+        scopes: List[Dict[str, Optional[str]]] = None,
+        with_vectors: bool = False,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Run several vector searches in one Qdrant batch request.
+
+        Args:
+            query_vectors: One vector per search
+            limit: Maximum number of results per search
+            scopes: Optional {"chapter_id", "module_id"} per search
+            with_vectors: Also return each hit's stored vector under "vector"
+
+        Returns:
+            One result list per query vector, in order (see search_documents)
+        """
+        if not query_vectors:
+            return []
+        scopes = scopes or [{}] * len(query_vectors)
+        search_params = self.collection_settings.search_params()
+        requests = [
+            models.QueryRequest(
+                query=vector,
+                filter=scope_filter(scope.get("chapter_id"), scope.get("module_id")),
+                limit=limit,
+                with_payload=True,
+                with_vector=with_vectors,
+                params=search_params,
+            )
+            for vector, scope in zip(query_vectors, scopes)
+        ]
+        try:
+            responses = self.client.query_batch_points(collection_name=self.collection_name, requests=requests)
+            return [[self._search_result(hit, with_vectors) for hit in response.points] for response in responses]
         except Exception as e:
             print(f"Error searching documents: {e}")
+            return [[] for _ in query_vectors]
+
+    @staticmethod
+    def _search_result(hit, with_vectors: bool) -> Dict[str, Any]:
+        result = {
+            "content": hit.payload.get("content", ""),
+            "doc_id": hit.payload.get("doc_id", ""),
+            "score": hit.score,
+            **hit.payload,
+            "id": str(hit.id),
+        }
+        if with_vectors:
+            result["vector"] = hit.vector
+        return result
+
+    def keyword_search(self, query: str, limit: int = 5, chapter_id: str = None, module_id: str = None) -> List[Dict[str, Any]]:
+        """
+        BM25 keyword search over the sparse index; works without embeddings.
+
+        Args:
+            query: Query text
+            limit: Maximum number of results to return
+            chapter_id: Only search chunks of this chapter
+            module_id: Only search chunks of this module
+
+        Returns:
+            List of documents in the same shape as search_documents
+        """
+        if not self.sparse_index:
             return []
+        return [
+            {
+                "content": hit["content"],
+                "doc_id": hit["metadata"].get("chapter_id", ""),
+                "score": hit["score"],
+                "metadata": hit["metadata"],
+                "id": hit["id"],
+            }
+            for hit in self.sparse_index.search(query, limit, chapter_id=chapter_id, module_id=module_id)
+        ]
+
+    # --- Selected text ---
+    def chapter_chunks(self, chapter_id: str) -> List[Dict[str, Any]]:
+        """
+        Every chunk of a chapter in reading order, as {"id", "content", "doc_id", "metadata"}.
+        Served from the chapter_id payload index, so no embedding is needed.
+        """
+        chunks = []
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scope_filter(chapter_id),
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            chunks.extend({**record.payload, "id": str(record.id)} for record in records)
+            if offset is None:
+                break
+        if not chunks and self.sparse_index:
+            # Sparse-only deployments store chunks in the BM25 index alone
+            chunks = [
+                {"id": chunk_id, "content": content, "doc_id": chapter_id, "metadata": metadata}
+                for chunk_id, content, metadata in self.sparse_index.chapter_chunks(chapter_id)
+            ]
+        return sorted(chunks, key=lambda chunk: (chunk.get("metadata") or {}).get("chunk_index", 0))
+
+    def locate_selection(self, selected_text: str, chapter_id: str = None, neighbors: int = 1) -> List[Dict[str, Any]]:
+        """
+        Find the chunk(s) a selection was taken from, plus their neighbours.
+
+        Without a chapter_id the chapter is guessed from the best BM25 match
+        for the selection, which needs no embedding call either.
+
+        Args:
+            selected_text: Text the user selected
+            chapter_id: Chapter the selection came from, if the client knows it
+            neighbors: Adjacent chunks to include on each side of a matched chunk
+
+        Returns:
+            Chunks in reading order, each with "matched" set for the ones
+            containing the selection; empty if the source cannot be located
+        """
+        if not chapter_id:
+            hits = self.keyword_search(selected_text, limit=1)
+            if not hits:
+                return []
+            chapter_id = (hits[0].get("metadata") or {}).get("chapter_id") or hits[0].get("doc_id")
+            if not chapter_id:
+                return []
+
+        chunks = self.chapter_chunks(chapter_id)
+        matched = set(match_selection(selected_text, chunks))
+        if not matched:
+            return []
+        window = {
+            position
+            for i in matched
+            for position in range(max(0, i - neighbors), min(len(chunks), i + neighbors + 1))
+        }
+        return [{**chunks[i], "matched": i in matched} for i in sorted(window)]
+
+    def sparse_index_needs_backfill(self) -> bool:
+        """
+        True when the sparse index does not hold the same number of chunks as
+        the collection: empty on a new replica, or out of sync after writes
+        that reached only one of the two.
+        """
+        if not self.sparse_index:
+            return False
+        return self.client.count(self.collection_name, exact=True).count != self.sparse_index.count()
+
+    def rebuild_sparse_index(self) -> int:
+        """
+        Rebuild the sparse index from the chunk payloads stored in the collection.
+
+        Returns:
+            Number of chunks indexed
+        """
+        self.sparse_index.clear()
+        indexed = 0
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=256,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            self.sparse_index.upsert(
+                (str(record.id), record.payload.get("content", ""), record.payload.get("metadata") or {})
+                for record in records
+            )
+            indexed += len(records)
+            if offset is None:
+                print(f"Sparse index rebuilt with {indexed} chunks")
+                return indexed
 
     def retrieve_content(self, query: str) -> List[Dict[str, Any]]:
         """
@@ -198,6 +596,12 @@ class VectorStoreService:
         # For now, returning empty list
         return []
 
+    def ping(self) -> Dict[str, Any]:
+        """
+        Cheap reachability check used by the readiness probe.
+        """
+        return {"points": self.client.count(self.collection_name, exact=False).count}
+
     def update_embedding_dimensions(self, dimensions: int):
         """
         Update the expected embedding dimensions.
@@ -205,4 +609,16 @@ class VectorStoreService:
         Args:
             dimensions: The dimension size for the embeddings (e.g., 1024 for Cohere, 1536 for OpenAI)
         """
-        self.embedding_dimensions = dimensions
\ No newline at end of file
+        self.embedding_dimensions = dimensions
+        self._initialize_collection()
+
+    def set_embeddings(self, embeddings: Embeddings, dimensions: int):
+        """
+        Set the embeddings client used to embed chunks at ingestion time.
+
+        Args:
+            embeddings: LangChain embeddings client
+            dimensions: The dimension size of its vectors
+        """
+        self.embeddings = embeddings
+        self.update_embedding_dimensions(dimensions)
@@ -0,0 +1,39 @@
+from src.services import answer_cache
+from src.services.answer_cache import AnswerCache, make_cache_key
+
+
+def test_cache_key_ignores_case_punctuation_and_whitespace():
+    assert make_cache_key("What is ROS 2?") == make_cache_key("  what is ros 2 ")
+    assert make_cache_key("What is ROS 2?") != make_cache_key("What is ROS 2?", selected_text="Nodes")
+    assert make_cache_key("What is ROS 2?") != make_cache_key("What is ROS 2?", scope="chapter:intro")
+
+
+def test_entries_go_stale_then_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    cache = AnswerCache(ttl_seconds=10, stale_ttl_seconds=20)
+    cache.set("key", {"llm_answer": "a"})
+
+    assert cache.get("key") == ({"llm_answer": "a"}, True)
+    now[0] += 15
+    assert cache.get("key") == ({"llm_answer": "a"}, False)
+    now[0] += 20
+    assert cache.get("key") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.set("a", {"n": 1})
+    cache.set("b", {"n": 2})
+    cache.get("a")
+    cache.set("c", {"n": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_only_one_refresh_per_key():
+    cache = AnswerCache()
+    assert cache.begin_refresh("key")
+    assert not cache.begin_refresh("key")
+    cache.end_refresh("key")
+    assert cache.begin_refresh("key")
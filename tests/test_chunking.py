@@ -0,0 +1,53 @@
+import pytest
+
+from src.services.chunking import MarkdownChunker
+from src.services.tokens import decode, encode
+
+
+def paragraph(n: int) -> str:
+    return " ".join(f"word{n}x{i}" for i in range(40)) + "."
+
+
+def test_chunks_respect_the_size_limit():
+    markdown = "# Title\n\n" + "\n\n".join(paragraph(n) for n in range(20))
+    chunker = MarkdownChunker(chunk_size=120, chunk_overlap=20)
+    chunks = chunker.split(markdown)
+    assert len(chunks) > 1
+    # +1 per paragraph separator is budgeted; the re-joined text may differ by a token
+    assert all(chunk.token_count <= chunker.chunk_size + 1 for chunk in chunks)
+    assert [chunk.chunk_index for chunk in chunks] == list(range(len(chunks)))
+
+
+def test_consecutive_chunks_overlap():
+    markdown = "\n\n".join(paragraph(n) for n in range(10))
+    chunks = MarkdownChunker(chunk_size=120, chunk_overlap=30).split(markdown)
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        # Each chunk starts with the last chunk_overlap tokens of the previous one
+        assert current.text.startswith(decode(encode(previous.text)[-30:]))
+
+
+def test_no_overlap_when_disabled():
+    markdown = "\n\n".join(paragraph(n) for n in range(10))
+    chunks = MarkdownChunker(chunk_size=120, chunk_overlap=0).split(markdown)
+    words = [word for chunk in chunks for word in chunk.text.split()]
+    assert len(words) == len(set(words))
+
+
+def test_chunks_never_cross_headings():
+    markdown = "# Guide\n\n## Setup\n\nInstall it.\n\n## Usage\n\nRun it."
+    chunks = MarkdownChunker(chunk_size=400, chunk_overlap=60).split(markdown)
+    assert [chunk.heading_path for chunk in chunks] == [["Guide", "Setup"], ["Guide", "Usage"]]
+    assert "Run it." not in chunks[0].text
+
+
+def test_code_fences_stay_whole():
+    code = "```python\n" + "\n".join(f"value_{i} = {i}" for i in range(5)) + "\n\nprint(value_0)\n```"
+    markdown = "# Code\n\n" + paragraph(1) + "\n\n" + code
+    chunks = MarkdownChunker(chunk_size=80, chunk_overlap=10).split(markdown)
+    assert any(code in chunk.text for chunk in chunks)
+
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        MarkdownChunker(chunk_size=50, chunk_overlap=50)
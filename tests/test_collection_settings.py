@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import pytest
+from qdrant_client.http import models
+
+from src.services.collection_settings import CollectionSettings
+
+
+def collection_info(on_disk=False, on_disk_payload=False, m=16, ef_construct=100, quantization=None):
+    return SimpleNamespace(config=SimpleNamespace(
+        params=SimpleNamespace(
+            vectors=models.VectorParams(size=8, distance=models.Distance.COSINE, on_disk=on_disk),
+            on_disk_payload=on_disk_payload,
+        ),
+        hnsw_config=SimpleNamespace(m=m, ef_construct=ef_construct),
+        quantization_config=quantization,
+    ))
+
+
+def scalar(quantile=0.99, always_ram=True):
+    return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+        type=models.ScalarType.INT8, quantile=quantile, always_ram=always_ram,
+    ))
+
+
+def test_matching_collection_needs_no_update():
+    assert CollectionSettings().update_kwargs(collection_info()) == {}
+    settings = CollectionSettings(quantization="scalar", on_disk_vectors=True, hnsw_m=16)
+    assert settings.update_kwargs(collection_info(on_disk=True, quantization=scalar())) == {}
+
+
+def test_changed_hnsw_m_only_updates_hnsw():
+    changes = CollectionSettings(hnsw_m=32).update_kwargs(collection_info())
+    assert list(changes) == ["hnsw_config"]
+    assert changes["hnsw_config"].m == 32
+
+
+def test_storage_changes():
+    changes = CollectionSettings(on_disk_vectors=True, on_disk_payload=True).update_kwargs(collection_info())
+    assert set(changes) == {"vectors_config", "collection_params"}
+    assert changes["vectors_config"][""].on_disk is True
+    assert changes["collection_params"].on_disk_payload is True
+
+
+def test_quantization_changes():
+    enable = CollectionSettings(quantization="binary").update_kwargs(collection_info())
+    assert list(enable) == ["quantization_config"]
+    assert isinstance(enable["quantization_config"], models.BinaryQuantization)
+
+    retune = CollectionSettings(quantization="scalar", quantile=0.95).update_kwargs(collection_info(quantization=scalar()))
+    assert retune["quantization_config"].scalar.quantile == 0.95
+
+    disable = CollectionSettings().update_kwargs(collection_info(quantization=scalar()))
+    assert disable == {"quantization_config": models.Disabled.DISABLED}
+
+
+def test_search_params():
+    assert CollectionSettings().search_params() is None
+    params = CollectionSettings(quantization="scalar", oversampling=3.0, hnsw_ef=64).search_params()
+    assert params.hnsw_ef == 64
+    assert params.quantization.rescore is True and params.quantization.oversampling == 3.0
+
+
+def test_unknown_quantization_is_rejected():
+    with pytest.raises(ValueError):
+        CollectionSettings(quantization="product")
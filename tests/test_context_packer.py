@@ -0,0 +1,52 @@
+from langchain_core.documents import Document
+
+from src.services.context_packer import ContextPacker
+from src.services.tokens import count_tokens
+
+
+def docs(*texts):
+    return [Document(page_content=text) for text in texts]
+
+
+def sentences(topic: str, n: int) -> str:
+    return " ".join(f"The {topic} sentence number {i} explains detail {i} of the {topic}." for i in range(n))
+
+
+def test_context_fits_the_budget():
+    packer = ContextPacker(max_tokens=120)
+    context = packer.pack(docs(sentences("robot", 20), sentences("sensor", 20), sentences("motor", 20)), "robot sensor")
+    assert context
+    assert count_tokens(context) <= 120
+    assert packer.stats()["passages_trimmed"] >= 1
+
+
+def test_small_context_is_kept_unchanged():
+    packer = ContextPacker(max_tokens=1000)
+    passages = ["ROS 2 nodes publish messages.", "Topics carry typed data."]
+    assert packer.pack(docs(*passages), "What is a topic?") == "\n\n".join(passages)
+
+
+def test_duplicate_passages_and_sentences_are_dropped():
+    packer = ContextPacker(max_tokens=1000)
+    context = packer.pack(docs(
+        "Nodes publish messages. Topics carry data.",
+        "Nodes publish messages. Topics carry data.",
+        "Topics carry data. Services answer requests.",
+    ), "question")
+    assert context.count("Topics carry data.") == 1
+    assert "Services answer requests." in context
+    assert packer.stats()["duplicates_dropped"] == 1
+
+
+def test_budget_smaller_than_one_sentence_still_holds():
+    packer = ContextPacker(max_tokens=5)
+    context = packer.pack(docs(sentences("gazebo", 3)), "gazebo")
+    assert count_tokens(context) <= 5
+
+
+def test_smallest_model_budget_applies(monkeypatch):
+    monkeypatch.setenv("CONTEXT_MAX_TOKENS", "3000")
+    monkeypatch.setenv("CONTEXT_MODEL_BUDGETS", "small=1000,large=8000")
+    assert ContextPacker.from_env(["large", "small"]).max_tokens == 1000
+    assert ContextPacker.from_env(["unknown"]).max_tokens == 3000
+    assert ContextPacker.from_env([]).max_tokens == 3000
@@ -0,0 +1,84 @@
+import asyncio
+
+import asyncpg
+
+from src.services.db_service import ChatHistoryWriter, NeonDBService
+
+
+class FakePool:
+    def __init__(self, write_delay: float = 0.0):
+        self.batches = []
+        self.write_delay = write_delay
+        self.users = {"default_user": 7}
+        self.fetches = []
+
+    async def executemany(self, sql, rows):
+        await asyncio.sleep(self.write_delay)
+        self.batches.append(list(rows))
+
+    async def fetchval(self, sql, *args):
+        self.fetches.append(sql.split()[0])
+        if sql.lstrip().startswith("INSERT"):
+            # default_user already exists under another email
+            raise asyncpg.UniqueViolationError("duplicate key value violates unique constraint \"users_email_key\"")
+        return self.users.get(args[0])
+
+
+def rows(n):
+    return [(1, f"question {i}", f"answer {i}", []) for i in range(n)]
+
+
+def test_rows_are_written_in_batches():
+    pool = FakePool()
+
+    async def main():
+        writer = ChatHistoryWriter(pool, batch_size=3, flush_interval=0.05)
+        writer.start()
+        for row in rows(7):
+            writer.enqueue(row)
+        await asyncio.sleep(0.2)
+        await writer.drain()
+        return writer.stats()
+
+    stats = asyncio.run(main())
+    assert [len(batch) for batch in pool.batches] == [3, 3, 1]
+    assert stats == {"pending": 0, "written": 7, "rejected": 0, "failed": 0}
+
+
+def test_drain_writes_every_pending_row():
+    pool = FakePool(write_delay=0.05)
+
+    async def main():
+        writer = ChatHistoryWriter(pool, batch_size=2, flush_interval=10)
+        writer.start()
+        for row in rows(5):
+            writer.enqueue(row)
+        await asyncio.sleep(0.01)  # the first batch is being written
+        await writer.drain()
+        return writer.stats()
+
+    stats = asyncio.run(main())
+    assert sorted(row[1] for batch in pool.batches for row in batch) == sorted(row[1] for row in rows(5))
+    assert stats["written"] == 5 and stats["pending"] == 0
+
+
+def test_full_queue_rejects_rows():
+    async def main():
+        writer = ChatHistoryWriter(FakePool(), max_pending=2)
+        return [writer.enqueue(row) for row in rows(3)], writer.stats()["rejected"]
+
+    assert asyncio.run(main()) == ([True, True, False], 1)
+
+
+def test_user_id_falls_back_to_lookup_on_email_conflict():
+    db = NeonDBService()
+    db.pool = FakePool()
+
+    async def main():
+        first = await db.get_or_create_user("default_user", "new@example.com")
+        second = await db.get_or_create_user("default_user", "new@example.com")
+        return first, second
+
+    assert asyncio.run(main()) == (7, 7)
+    # The second call is served from memory
+    assert db.pool.fetches == ["INSERT", "SELECT"]
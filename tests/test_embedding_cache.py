@@ -0,0 +1,77 @@
+import asyncio
+
+from langchain_core.embeddings import Embeddings
+
+from src.services.embedding_cache import CachedEmbeddings
+
+
+class RecordingEmbeddings(Embeddings):
+    """Deterministic embeddings that record every request sent upstream."""
+
+    model = "recording"
+
+    def __init__(self):
+        self.document_calls = []
+        self.query_calls = []
+
+    def embed_documents(self, texts):
+        self.document_calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        self.query_calls.append(text)
+        return [float(len(text)), -1.0]
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+def test_only_misses_go_upstream(tmp_path):
+    upstream = RecordingEmbeddings()
+    cache = CachedEmbeddings(upstream, str(tmp_path / "embeddings.sqlite3"))
+
+    cache.embed_documents(["alpha", "beta"])
+    vectors = cache.embed_documents(["alpha", "gamma", "beta"])
+
+    assert upstream.document_calls == [["alpha", "beta"], ["gamma"]]
+    assert vectors == [[5.0, 1.0], [5.0, 1.0], [4.0, 1.0]]
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 3
+
+
+def test_misses_are_deduplicated_and_batched(tmp_path):
+    upstream = RecordingEmbeddings()
+    cache = CachedEmbeddings(upstream, str(tmp_path / "embeddings.sqlite3"), batch_size=2)
+
+    texts = ["a", "b", "a", "c", "b"]
+    vectors = asyncio.run(cache.aembed_documents(texts))
+
+    assert upstream.document_calls == [["a", "b"], ["c"]]
+    assert len(vectors) == len(texts) and vectors[0] == vectors[2]
+
+
+def test_query_and_document_vectors_are_cached_separately(tmp_path):
+    upstream = RecordingEmbeddings()
+    cache = CachedEmbeddings(upstream, str(tmp_path / "embeddings.sqlite3"))
+
+    document = cache.embed_documents(["ROS 2"])[0]
+    query = cache.embed_query("ROS 2")
+
+    assert document != query
+    assert upstream.query_calls == ["ROS 2"]
+    assert cache.embed_query("ROS 2") == query
+    assert upstream.query_calls == ["ROS 2"]
+
+
+def test_vectors_survive_reopening_the_cache(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    first = CachedEmbeddings(RecordingEmbeddings(), path)
+    stored = first.embed_documents(["persisted text"])
+    first.close()
+
+    upstream = RecordingEmbeddings()
+    reopened = CachedEmbeddings(upstream, path)
+    assert reopened.embed_documents(["persisted text"]) == stored
+    assert upstream.document_calls == []
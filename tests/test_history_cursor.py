@@ -0,0 +1,25 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from src.services.db_service import decode_history_cursor, encode_history_cursor
+
+
+@pytest.mark.parametrize("created_at", [
+    datetime(2024, 5, 1, 12, 30, 15, 123456),
+    datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc),
+])
+def test_cursor_round_trip(created_at):
+    cursor = encode_history_cursor(created_at, 42)
+    assert decode_history_cursor(cursor) == (created_at, 42)
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_history_cursor(datetime(2024, 5, 1), 10 ** 12)
+    assert all(c.isalnum() or c in "-_=" for c in cursor)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "eyJ0IjogMX0="])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_history_cursor(cursor)
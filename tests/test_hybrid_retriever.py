@@ -0,0 +1,55 @@
+import numpy as np
+
+from src.services.hybrid_retriever import maximal_marginal_relevance, reciprocal_rank_fusion
+
+
+def hits(*ids):
+    return [{"id": hit_id, "content": hit_id} for hit_id in ids]
+
+
+def test_rrf_ranks_documents_found_by_both_legs_first():
+    fused = reciprocal_rank_fusion(
+        {"dense": hits("a", "b", "c"), "sparse": hits("c", "d")},
+        weights={"dense": 1.0, "sparse": 1.0},
+    )
+    assert [hit["id"] for hit in fused] == ["c", "a", "b", "d"]
+
+
+def test_rrf_records_per_leg_ranks_and_scores():
+    fused = {hit["id"]: hit for hit in reciprocal_rank_fusion(
+        {"dense": hits("a", "b"), "sparse": hits("b")},
+        weights={"dense": 1.0, "sparse": 1.0},
+        rrf_k=60,
+    )}
+    assert fused["b"]["dense_rank"] == 2
+    assert fused["b"]["sparse_rank"] == 1
+    assert "sparse_rank" not in fused["a"]
+    assert np.isclose(fused["b"]["rrf_score"], 1 / 62 + 1 / 61)
+
+
+def test_rrf_weights_shift_the_order():
+    rankings = {"dense": hits("a", "b"), "sparse": hits("b", "a")}
+    dense_heavy = reciprocal_rank_fusion(rankings, weights={"dense": 2.0, "sparse": 1.0})
+    sparse_heavy = reciprocal_rank_fusion(rankings, weights={"dense": 1.0, "sparse": 2.0})
+    assert dense_heavy[0]["id"] == "a"
+    assert sparse_heavy[0]["id"] == "b"
+
+
+def test_mmr_skips_near_duplicates():
+    relevance = np.array([1.0, 0.99, 0.5], dtype=np.float32)
+    vectors = np.array([[1.0, 0.0], [1.0, 0.001], [0.0, 1.0]], dtype=np.float32)
+    # The second candidate duplicates the first, so the distinct one is picked next
+    assert maximal_marginal_relevance(relevance, vectors, k=2, lambda_mult=0.5) == [0, 2]
+
+
+def test_mmr_with_lambda_one_ranks_by_relevance():
+    relevance = np.array([0.2, 0.9, 0.5], dtype=np.float32)
+    vectors = np.eye(3, dtype=np.float32)
+    assert maximal_marginal_relevance(relevance, vectors, k=3, lambda_mult=1.0) == [1, 2, 0]
+
+
+def test_mmr_picks_each_candidate_once_and_clamps_k():
+    relevance = np.array([0.5, 0.4], dtype=np.float32)
+    vectors = np.zeros((2, 3), dtype=np.float32)
+    assert sorted(maximal_marginal_relevance(relevance, vectors, k=5)) == [0, 1]
+    assert maximal_marginal_relevance(relevance, vectors, k=0) == []
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+
+from src.services.ingestion_jobs import IngestionJobManager
+
+
+class FakeLogDB:
+    """content_ingestion_log in memory; None fields are left unchanged, like the SQL update."""
+
+    def __init__(self, progress_delay: float = 0.0):
+        self.rows = {}
+        self.statuses = []
+        self.progress_delay = progress_delay
+
+    async def log_content_ingestion(self, chapter_id, content_preview, status="completed", job_id=None):
+        log_id = len(self.rows) + 1
+        self.rows[log_id] = {"status": status, "progress": None, "error": None, "result": None}
+        self.statuses.append(status)
+        return log_id
+
+    async def update_content_ingestion(self, log_id, status=None, progress=None, error=None, result=None):
+        if status is None:
+            # Progress writes are slow, so without flushing they land last
+            await asyncio.sleep(self.progress_delay)
+        else:
+            self.statuses.append(status)
+        row = self.rows[log_id]
+        for name, value in (("status", status), ("progress", progress), ("error", error), ("result", result)):
+            if value is not None:
+                row[name] = value
+        return True
+
+
+class FakeVectorStore:
+    def __init__(self, fail: bool = False, release: threading.Event = None):
+        self.fail = fail
+        self.release = release
+
+    def ingest_chapter(self, chapter_id, content_markdown, metadata=None, progress_callback=None):
+        if self.release:
+            self.release.wait(5)
+        for fraction in (0.25, 0.5, 0.75):
+            progress_callback(fraction)
+        if self.fail:
+            raise RuntimeError("embedding API down")
+        return {"chapter_id": chapter_id, "chunks": 3}
+
+
+async def wait_for(manager, job_id, status):
+    for _ in range(200):
+        job = await manager.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job never reached {status}")
+
+
+def test_job_runs_to_completion_and_keeps_its_final_status():
+    db = FakeLogDB(progress_delay=0.05)
+
+    async def main():
+        manager = IngestionJobManager(FakeVectorStore(), db_service=db, workers=1)
+        await manager.start()
+        job = await manager.submit("intro", "# Intro")
+        assert job.status == "pending"
+        finished = await wait_for(manager, job.job_id, "completed")
+        await asyncio.sleep(0.1)  # any late progress write would have landed by now
+        await manager.stop()
+        return finished
+
+    finished = asyncio.run(main())
+    assert finished["progress"] == 1.0 and finished["result"] == {"chapter_id": "intro", "chunks": 3}
+    assert db.statuses == ["pending", "running", "completed"]
+    assert db.rows[1]["status"] == "completed" and db.rows[1]["progress"] == 1.0
+
+
+def test_failed_job_records_the_error():
+    db = FakeLogDB(progress_delay=0.05)
+
+    async def main():
+        manager = IngestionJobManager(FakeVectorStore(fail=True), db_service=db, workers=1)
+        await manager.start()
+        job = await manager.submit("intro", "# Intro")
+        finished = await wait_for(manager, job.job_id, "failed")
+        await manager.stop()
+        return finished
+
+    finished = asyncio.run(main())
+    assert finished["error"] == "embedding API down"
+    assert db.statuses == ["pending", "running", "failed"]
+    assert db.rows[1]["status"] == "failed"
+
+
+def test_unfinished_jobs_are_marked_failed_at_shutdown():
+    db = FakeLogDB()
+    release = threading.Event()
+
+    async def main():
+        manager = IngestionJobManager(FakeVectorStore(release=release), db_service=db, workers=1)
+        await manager.start()
+        running = await manager.submit("intro", "# Intro")
+        queued = await manager.submit("nodes", "# Nodes")
+        await wait_for(manager, running.job_id, "running")
+        await manager.stop()
+        release.set()
+        return await manager.get(running.job_id), await manager.get(queued.job_id)
+
+    running, queued = asyncio.run(main())
+    assert running["status"] == queued["status"] == "failed"
+    assert running["error"] == "interrupted by shutdown"
+    assert [row["status"] for row in db.rows.values()] == ["failed", "failed"]
@@ -0,0 +1,113 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from src.services.llm_router import LLMRouter
+
+
+def failing(_):
+    raise RuntimeError("provider down")
+
+
+def make_router(**kwargs):
+    return LLMRouter([
+        ("primary", RunnableLambda(lambda _: "primary")),
+        ("backup", RunnableLambda(lambda _: "backup")),
+    ], hedging=False, **kwargs)
+
+
+def trip(router, provider):
+    for _ in range(router.failure_threshold):
+        router._record(provider, "invoke", ok=False)
+
+
+def test_consecutive_failures_open_the_circuit():
+    router = make_router(failure_threshold=3, cooldown=30)
+    primary = router.providers[0]
+    router._record(primary, "invoke", ok=False)
+    router._record(primary, "invoke", ok=False)
+    assert router._state(primary, primary.opened_at or 0) == "closed"
+    router._record(primary, "invoke", ok=False)
+    assert router._state(primary, primary.opened_at) == "open"
+    assert primary.circuit_trips == 1
+    assert [p.name for p in router._ranked("invoke")] == ["backup"]
+
+
+def test_error_rate_opens_the_circuit():
+    router = make_router(failure_threshold=100, error_rate_threshold=0.5, min_calls=4)
+    primary = router.providers[0]
+    for ok in (True, False, True, False):
+        router._record(primary, "invoke", ok=ok)
+    assert primary.opened_at is not None
+
+
+def test_successful_trial_after_cooldown_closes_the_circuit():
+    router = make_router(failure_threshold=1, cooldown=30)
+    primary = router.providers[0]
+    trip(router, primary)
+    assert router._state(primary, primary.opened_at + 31) == "half_open"
+
+    primary.opened_at -= 31
+    router._start(primary)
+    assert primary.trial_in_flight
+    # Only one trial call at a time
+    assert primary not in router._ranked("invoke")
+
+    router._record(primary, "invoke", ok=True, latency=0.1)
+    assert primary.opened_at is None
+    assert router._state(primary, 0) == "closed"
+
+
+def test_failed_trial_reopens_the_circuit():
+    router = make_router(failure_threshold=1, cooldown=30)
+    primary = router.providers[0]
+    trip(router, primary)
+    primary.opened_at -= 31
+    router._start(primary)
+    router._record(primary, "invoke", ok=False)
+    assert router._state(primary, primary.opened_at) == "open"
+    assert primary.circuit_trips == 1
+
+
+def test_invoke_fails_over_and_records_the_failure():
+    router = LLMRouter([("primary", RunnableLambda(failing)), ("backup", RunnableLambda(lambda _: "backup"))], hedging=False)
+    assert router.invoke("hi") == "backup"
+    assert router.providers[0].failures == 1
+    # The failed provider now ranks behind the healthy one
+    assert router._ranked("invoke")[0].name == "backup"
+
+
+def test_invoke_raises_when_every_provider_fails():
+    router = LLMRouter([("only", RunnableLambda(failing))], hedging=False)
+    with pytest.raises(RuntimeError, match="All LLM providers failed"):
+        router.invoke("hi")
+
+
+class FakeModels:
+    def __init__(self, error=None):
+        self.error = error
+
+    async def list(self):
+        if self.error:
+            raise self.error
+        return []
+
+
+def with_models_endpoint(error=None):
+    runnable = RunnableLambda(lambda _: "answer")
+    runnable.root_async_client = SimpleNamespace(models=FakeModels(error))
+    return runnable
+
+
+def test_probe_reports_status_without_touching_the_circuit():
+    router = LLMRouter([
+        ("healthy", with_models_endpoint()),
+        ("down", with_models_endpoint(ConnectionError("connection refused"))),
+        ("other", RunnableLambda(lambda _: "answer")),
+    ], hedging=False, failure_threshold=1)
+
+    assert asyncio.run(router.aprobe()) == {"healthy": "ok", "down": "connection refused", "other": "unchecked"}
+    assert all(provider.calls == 0 and not provider.outcomes for provider in router.providers)
+    assert all(provider.opened_at is None for provider in router.providers)
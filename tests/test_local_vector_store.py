@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+from qdrant_client.http import models
+
+from src.services.local_vector_store import LocalVectorClient, _IVFIndex
+
+COLLECTION = "chunks"
+
+
+def make_client(path, dimensions=16, **options):
+    client = LocalVectorClient(str(path), **options)
+    client.create_collection(COLLECTION, models.VectorParams(size=dimensions, distance=models.Distance.COSINE))
+    return client
+
+
+def random_vectors(n, dimensions=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dimensions)).astype(np.float32)
+
+
+def exact_top_k(vectors, query, k):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return list(np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:k])
+
+
+def chapter_filter(chapter_id):
+    return models.Filter(must=[
+        models.FieldCondition(key="metadata.chapter_id", match=models.MatchValue(value=chapter_id))
+    ])
+
+
+def test_search_returns_the_exact_top_k(tmp_path):
+    vectors = random_vectors(300)
+    client = make_client(tmp_path)
+    client.upload_collection(COLLECTION, vectors, ids=[str(i) for i in range(len(vectors))])
+
+    query = random_vectors(1, seed=1)[0]
+    hits = client.query_points(COLLECTION, query=query.tolist(), limit=5).points
+    assert [int(hit.id) for hit in hits] == exact_top_k(vectors, query, 5)
+    assert all(a.score >= b.score for a, b in zip(hits, hits[1:]))
+
+
+def test_filters_restrict_search_count_and_scroll(tmp_path):
+    vectors = random_vectors(40)
+    client = make_client(tmp_path)
+    client.upload_collection(
+        COLLECTION,
+        vectors,
+        payload=[{"metadata": {"chapter_id": "even" if i % 2 == 0 else "odd"}} for i in range(len(vectors))],
+        ids=[str(i) for i in range(len(vectors))],
+    )
+
+    hits = client.query_points(COLLECTION, query=vectors[3].tolist(), limit=3, query_filter=chapter_filter("even")).points
+    assert len(hits) == 3 and all(int(hit.id) % 2 == 0 for hit in hits)
+    assert client.count(COLLECTION, count_filter=chapter_filter("odd")).count == 20
+
+    client.delete(COLLECTION, points_selector=models.FilterSelector(filter=chapter_filter("odd")))
+    records, offset = client.scroll(COLLECTION, limit=100)
+    assert offset is None and len(records) == 20
+    assert client.count(COLLECTION).count == 20
+
+
+def test_upload_without_ids_generates_them(tmp_path):
+    client = make_client(tmp_path)
+    client.upload_collection(COLLECTION, random_vectors(3))
+    records, _ = client.scroll(COLLECTION, limit=10)
+    assert len({record.id for record in records}) == 3
+
+
+def test_collection_is_reopened_from_disk(tmp_path):
+    vectors = random_vectors(50)
+    client = make_client(tmp_path)
+    client.upsert(COLLECTION, points=[
+        models.PointStruct(id=str(i), vector=vector.tolist(), payload={"n": i}) for i, vector in enumerate(vectors)
+    ])
+    client.delete(COLLECTION, points_selector=models.PointIdsList(points=["7"]))
+    client.close()
+
+    reopened = LocalVectorClient(str(tmp_path))
+    assert reopened.get_collection(COLLECTION).points_count == 49
+    hit = reopened.query_points(COLLECTION, query=vectors[12].tolist(), limit=1).points[0]
+    assert hit.id == "12" and hit.payload == {"n": 12}
+    assert reopened.query_points(COLLECTION, query=vectors[7].tolist(), limit=1).points[0].id != "7"
+
+
+def test_existing_collection_is_never_recreated_implicitly(tmp_path):
+    client = make_client(tmp_path)
+    client.upload_collection(COLLECTION, random_vectors(5))
+    with pytest.raises(ValueError):
+        client.create_collection(COLLECTION, models.VectorParams(size=16, distance=models.Distance.COSINE))
+    assert client.count(COLLECTION).count == 5
+
+
+def test_ivf_search_finds_the_nearest_points(tmp_path):
+    vectors = random_vectors(2000, seed=2)
+    client = make_client(tmp_path, ann=True, ann_min_points=1000, ann_nprobe=8)
+    client.upload_collection(COLLECTION, vectors, ids=[str(i) for i in range(len(vectors))])
+
+    found = 0
+    for seed in range(20):
+        query = vectors[seed * 37] + 0.01 * random_vectors(1, seed=100 + seed)[0]
+        hits = client.query_points(COLLECTION, query=query.tolist(), limit=10).points
+        found += len({int(hit.id) for hit in hits} & set(exact_top_k(vectors, query, 10)))
+    assert found / 200 >= 0.8
+
+
+def test_ivf_never_has_more_buckets_than_points():
+    vectors = random_vectors(5)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = _IVFIndex.build(vectors, np.ones(len(vectors), dtype=bool))
+    assert len(index.centroids) == 5
+    assert sorted(index.candidates(vectors[0], nprobe=5, total_rows=5)) == list(range(5))
+
+
+def test_small_collection_with_ann_enabled(tmp_path):
+    vectors = random_vectors(3)
+    client = make_client(tmp_path, ann=True, ann_min_points=0)
+    client.upload_collection(COLLECTION, vectors, ids=["a", "b", "c"])
+    assert client.query_points(COLLECTION, query=vectors[1].tolist(), limit=1).points[0].id == "b"
@@ -0,0 +1,78 @@
+import asyncio
+
+from src.services.readiness import ReadinessProbe
+
+
+async def ok():
+    return {"points": 3}
+
+
+async def down():
+    raise ConnectionError("connection refused")
+
+
+async def hangs():
+    await asyncio.sleep(10)
+
+
+def test_pending_until_the_first_run():
+    probe = ReadinessProbe()
+    probe.add_check("qdrant", ok)
+    assert not probe.ready
+    assert probe.snapshot()["pending"] == ["qdrant"]
+
+    asyncio.run(probe.run_checks())
+    assert probe.ready
+    assert probe.snapshot()["dependencies"]["qdrant"]["detail"] == {"points": 3}
+
+
+def test_failing_or_slow_required_dependency_blocks_readiness():
+    probe = ReadinessProbe(timeout=0.05)
+    probe.add_check("qdrant", ok)
+    probe.add_check("neon", down)
+    probe.add_check("llm", hangs)
+    asyncio.run(probe.run_checks())
+
+    dependencies = probe.snapshot()["dependencies"]
+    assert not probe.ready
+    assert dependencies["neon"]["error"] == "connection refused"
+    assert dependencies["llm"]["status"] == "down" and "timed out" in dependencies["llm"]["error"]
+    assert dependencies["llm"]["latency_ms"] < 1000
+
+
+def test_disabled_unchecked_and_optional_dependencies_do_not_block_readiness():
+    async def unchecked():
+        return {"providers": {"openrouter": "unchecked"}}
+
+    probe = ReadinessProbe()
+    probe.add_check("qdrant", ok)
+    probe.add_check("llm", unchecked)
+    probe.add_check("cache", down, required=False)
+    probe.add_disabled("neon", "NEON_DATABASE_URL not set")
+    asyncio.run(probe.run_checks())
+
+    snapshot = probe.snapshot()
+    assert snapshot["ready"] and snapshot["pending"] == []
+    assert snapshot["dependencies"]["neon"]["status"] == "disabled"
+    assert snapshot["dependencies"]["cache"]["status"] == "down"
+
+
+def test_status_is_served_from_the_cache():
+    calls = 0
+
+    async def counted():
+        nonlocal calls
+        calls += 1
+
+    async def main():
+        probe = ReadinessProbe(interval=60)
+        probe.add_check("qdrant", counted)
+        await probe.start()
+        await asyncio.sleep(0.05)
+        snapshots = [probe.snapshot() for _ in range(10)]
+        await probe.stop()
+        return snapshots
+
+    snapshots = asyncio.run(main())
+    assert calls == 1
+    assert all(snapshot["ready"] for snapshot in snapshots)
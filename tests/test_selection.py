@@ -0,0 +1,47 @@
+from src.services.selection import compress_selection, match_selection
+from src.services.tokens import count_tokens
+
+CHUNKS = [
+    {"content": "# Nodes\n\nA **node** is a process that performs computation. Nodes are combined into a graph."},
+    {"content": "Topics are named buses over which nodes exchange messages. Publishers send and subscribers receive."},
+    {"content": "Services implement a request and response pattern between two nodes."},
+    {"content": "Actions are for long running goals with feedback and cancellation."},
+]
+
+
+def test_verbatim_selection_matches_its_chunk():
+    # Markdown markup, case and whitespace differ from the stored chunk
+    selection = "A node is a process that   performs computation."
+    assert match_selection(selection, CHUNKS) == [0]
+
+
+def test_selection_spanning_chunks_matches_each():
+    selection = "Nodes are combined into a graph. Topics are named buses over which nodes exchange messages."
+    assert match_selection(selection, CHUNKS) == [0, 1]
+
+
+def test_falls_back_to_term_overlap():
+    selection = "request/response services between nodes"
+    assert match_selection(selection, CHUNKS) == [2]
+    assert match_selection("quaternion", CHUNKS) == []
+
+
+def sentences(n):
+    return " ".join(f"Sentence {i} talks about topic{i} in some detail." for i in range(n))
+
+
+def test_compression_stays_under_the_budget():
+    selection = sentences(30) + " Lidar sensors measure distance with lasers."
+    compressed = compress_selection(selection, "How do lidar sensors measure distance?", max_tokens=40)
+    assert count_tokens(compressed) <= 40
+    assert "Lidar sensors measure distance with lasers." in compressed
+
+
+def test_short_selection_is_unchanged():
+    assert compress_selection("Short text.", "question", max_tokens=40) == "Short text."
+    assert compress_selection(sentences(30), "question", max_tokens=0) == sentences(30)
+
+
+def test_oversized_sentence_is_truncated():
+    compressed = compress_selection(" ".join(["word"] * 200) + ".", "word", max_tokens=10)
+    assert count_tokens(compressed) <= 10
@@ -0,0 +1,62 @@
+from src.services import semantic_cache
+from src.services.semantic_cache import SemanticCache
+
+
+def vector(*values):
+    return SemanticCache.normalize(list(values))
+
+
+def test_similar_questions_hit_and_dissimilar_ones_miss():
+    cache = SemanticCache(embeddings=None, similarity_threshold=0.9)
+    cache.store("What is ROS 2?", vector(1, 0, 0), {"llm_answer": "a"})
+
+    assert cache.lookup(vector(1, 0.1, 0)) == {"llm_answer": "a"}
+    assert cache.lookup(vector(1, 1, 0)) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_entries_only_match_their_own_scope():
+    cache = SemanticCache(embeddings=None)
+    cache.store("What is a node?", vector(1, 0), {"llm_answer": "global"})
+    cache.store("What is a node?", vector(1, 0), {"llm_answer": "chapter"}, scope="chapter:intro")
+
+    assert cache.lookup(vector(1, 0)) == {"llm_answer": "global"}
+    assert cache.lookup(vector(1, 0), scope="chapter:intro") == {"llm_answer": "chapter"}
+    assert cache.lookup(vector(1, 0), scope="chapter:other") is None
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    cache = SemanticCache(embeddings=None, ttl_seconds=10)
+    cache.store("q", vector(1, 0), {"llm_answer": "a"})
+    # Entries are stamped with the real clock; only the expiry check is moved forward
+    now = [semantic_cache.time.monotonic()]
+    monkeypatch.setattr(semantic_cache.time, "monotonic", lambda: now[0])
+
+    now[0] += 5
+    assert cache.lookup(vector(1, 0)) is not None
+    now[0] += 10
+    assert cache.lookup(vector(1, 0)) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticCache(embeddings=None, max_entries=2)
+    cache.store("a", vector(1, 0, 0), {"n": 1})
+    cache.store("b", vector(0, 1, 0), {"n": 2})
+    cache.lookup(vector(1, 0, 0))
+    cache.store("c", vector(0, 0, 1), {"n": 3})
+
+    assert cache.lookup(vector(0, 1, 0)) is None
+    assert cache.lookup(vector(1, 0, 0)) == {"n": 1}
+    assert cache.lookup(vector(0, 0, 1)) == {"n": 3}
+
+
+def test_invalidate_chapter_drops_only_its_entries():
+    cache = SemanticCache(embeddings=None)
+    cache.store("a", vector(1, 0), {"n": 1}, chapter_ids=["intro", "nodes"])
+    cache.store("b", vector(0, 1), {"n": 2}, chapter_ids=["topics"])
+
+    assert cache.invalidate_chapter("nodes") == 1
+    assert cache.lookup(vector(1, 0)) is None
+    assert cache.lookup(vector(0, 1)) == {"n": 2}
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from src.services.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["answer"] * 5
+    assert calls == 1
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 4}
+
+
+def test_different_keys_and_later_calls_run_separately():
+    flight = SingleFlight()
+    calls = []
+
+    async def work(key):
+        calls.append(key)
+        return key
+
+    async def main():
+        await asyncio.gather(flight.do("a", lambda: work("a")), flight.do("b", lambda: work("b")))
+        await flight.do("a", lambda: work("a"))
+
+    asyncio.run(main())
+    assert sorted(calls) == ["a", "a", "b"]
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_late_stream_subscribers_get_the_full_sequence():
+    flight = SingleFlight()
+    produced = 0
+
+    async def tokens():
+        nonlocal produced
+        produced += 1
+        for token in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield token
+
+    async def collect(delay):
+        await asyncio.sleep(delay)
+        return [item async for item in flight.stream("key", tokens)]
+
+    async def main():
+        return await asyncio.gather(collect(0), collect(0.015))
+
+    assert asyncio.run(main()) == [["a", "b", "c"], ["a", "b", "c"]]
+    assert produced == 1
+
+
+def test_stream_errors_are_raised_to_subscribers():
+    flight = SingleFlight()
+
+    async def tokens():
+        yield "a"
+        raise RuntimeError("stream failed")
+
+    async def main():
+        items = []
+        with pytest.raises(RuntimeError, match="stream failed"):
+            async for item in flight.stream("key", tokens):
+                items.append(item)
+        return items
+
+    assert asyncio.run(main()) == ["a"]
@@ -0,0 +1,54 @@
+from src.services.sparse_index import BM25Index, tokenize
+
+
+def build(tmp_path):
+    index = BM25Index(str(tmp_path / "sparse.sqlite3"))
+    index.upsert([
+        ("1", "ROS 2 nodes communicate over topics", {"chapter_id": "ros", "module_id": "m1"}),
+        ("2", "Topics topics topics carry typed messages", {"chapter_id": "ros", "module_id": "m1"}),
+        ("3", "Gazebo simulates robots and sensors", {"chapter_id": "sim", "module_id": "m2"}),
+        ("4", "Isaac Sim renders sensors with rclpy bridges", {"chapter_id": "isaac", "module_id": "m2"}),
+    ])
+    return index
+
+
+def test_tokenize_drops_stopwords_and_keeps_identifiers():
+    assert tokenize("What is the isaac_sim rclpy API?") == ["isaac_sim", "rclpy", "api"]
+
+
+def test_more_frequent_terms_score_higher(tmp_path):
+    hits = build(tmp_path).search("topics", k=5)
+    assert [hit["id"] for hit in hits] == ["2", "1"]
+    assert hits[0]["score"] > hits[1]["score"] > 0
+    assert hits[0]["metadata"]["chapter_id"] == "ros"
+
+
+def test_rare_terms_outweigh_common_ones(tmp_path):
+    hits = build(tmp_path).search("gazebo sensors", k=5)
+    # "sensors" appears in two chunks, "gazebo" in one
+    assert [hit["id"] for hit in hits] == ["3", "4"]
+
+
+def test_deleted_and_replaced_chunks_leave_the_index(tmp_path):
+    index = build(tmp_path)
+    index.delete(["3"])
+    assert [hit["id"] for hit in index.search("gazebo sensors")] == ["4"]
+
+    index.replace_chapter("ros", [("1", "Services answer requests", {"chapter_id": "ros"})])
+    assert index.chapter_ids("ros") == ["1"]
+    assert index.search("topics") == []
+    assert index.count() == 2
+
+
+def test_scope_filters(tmp_path):
+    index = build(tmp_path)
+    assert [hit["id"] for hit in index.search("sensors", chapter_id="isaac")] == ["4"]
+    assert {hit["id"] for hit in index.search("sensors topics", module_id="m2")} == {"3", "4"}
+    assert index.search("sensors", chapter_id="ros") == []
+    assert index.search("sensors", chapter_id="missing") == []
+
+
+def test_index_survives_reopening(tmp_path):
+    build(tmp_path).close()
+    reopened = BM25Index(str(tmp_path / "sparse.sqlite3"))
+    assert [hit["id"] for hit in reopened.search("rclpy")] == ["4"]
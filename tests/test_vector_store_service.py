@@ -0,0 +1,151 @@
+import hashlib
+
+import pytest
+from langchain_core.embeddings import Embeddings
+from qdrant_client.http import models
+
+from src.services.local_vector_store import LocalVectorClient
+from src.services.sparse_index import BM25Index
+from src.services.vector_store_service import VectorStoreService
+
+DIMENSIONS = 8
+
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic hash embeddings that count the texts sent to them."""
+
+    def __init__(self):
+        self.embedded = []
+
+    def _vector(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [byte / 255 for byte in digest[:DIMENSIONS]]
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("QDRANT_URL", "")
+    monkeypatch.setenv("VECTOR_BACKEND", "memory")
+    monkeypatch.setenv("SPARSE_INDEX_ENABLED", "false")
+    monkeypatch.setenv("CHUNK_SIZE_TOKENS", "40")
+    monkeypatch.setenv("CHUNK_OVERLAP_TOKENS", "0")
+    service = VectorStoreService()
+    service.set_embeddings(CountingEmbeddings(), DIMENSIONS)
+    return service
+
+
+@pytest.fixture
+def sparse_service(monkeypatch, tmp_path, service):
+    monkeypatch.setenv("SPARSE_INDEX_ENABLED", "true")
+    monkeypatch.setenv("SPARSE_INDEX_PATH", str(tmp_path / "sparse.sqlite3"))
+    service.sparse_index = BM25Index.from_env()
+    return service
+
+
+def stored_contents(service, chapter_id):
+    records, _ = service.client.scroll(
+        service.collection_name,
+        scroll_filter=models.Filter(must=[
+            models.FieldCondition(key="metadata.chapter_id", match=models.MatchValue(value=chapter_id))
+        ]),
+        limit=100,
+        with_payload=True,
+    )
+    return [record.payload["content"] for record in records]
+
+
+def chapter(*sections):
+    return "\n\n".join(f"## Section {i}\n\n{text}" for i, text in enumerate(sections))
+
+
+SECTIONS = [
+    "Nodes are processes that perform computation in a ROS 2 graph.",
+    "Topics carry typed messages from publishers to subscribers.",
+    "Services answer requests with a single response.",
+]
+
+
+def test_unchanged_chapter_makes_no_embedding_calls(service):
+    first = service.ingest_chapter("ros", chapter(*SECTIONS))
+    assert first["upserted"] == first["chunks"] == 3
+    service.embeddings.embedded.clear()
+
+    again = service.ingest_chapter("ros", chapter(*SECTIONS))
+    assert again["upserted"] == 0 and again["unchanged"] == 3
+    assert service.embeddings.embedded == []
+
+
+def test_only_changed_chunks_are_reembedded(service):
+    service.ingest_chapter("ros", chapter(*SECTIONS))
+    service.embeddings.embedded.clear()
+
+    edited = SECTIONS[:1] + ["Topics carry typed messages between any number of nodes."] + SECTIONS[2:]
+    summary = service.ingest_chapter("ros", chapter(*edited))
+    assert summary["upserted"] == 1 and summary["unchanged"] == 2
+    assert len(service.embeddings.embedded) == 1 and "any number of nodes" in service.embeddings.embedded[0]
+    assert any("any number of nodes" in content for content in stored_contents(service, "ros"))
+
+
+def test_stale_chunks_are_deleted(service):
+    service.ingest_chapter("ros", chapter(*SECTIONS))
+    summary = service.ingest_chapter("ros", chapter(*SECTIONS[:1]))
+    assert summary["deleted"] == 2
+    assert len(stored_contents(service, "ros")) == 1
+    assert service.client.count(service.collection_name).count == 1
+
+
+def test_chapters_are_synced_independently(service):
+    service.ingest_chapter("ros", chapter(*SECTIONS))
+    service.ingest_chapter("sim", chapter("Gazebo simulates robots."))
+    service.ingest_chapter("ros", chapter(*SECTIONS[:1]))
+    assert len(stored_contents(service, "sim")) == 1
+
+
+def test_sparse_index_is_backfilled_when_out_of_sync(sparse_service):
+    sparse_service.ingest_chapter("ros", chapter(*SECTIONS))
+    assert not sparse_service.sparse_index_needs_backfill()
+
+    sparse_service.sparse_index.delete(sparse_service.sparse_index.chapter_ids("ros")[:1])
+    assert sparse_service.sparse_index_needs_backfill()
+    assert sparse_service.rebuild_sparse_index() == 3
+    assert not sparse_service.sparse_index_needs_backfill()
+    assert sparse_service.sparse_index.search("publishers subscribers")
+
+
+def test_selection_is_located_with_its_neighbours(sparse_service):
+    sections = SECTIONS + ["Actions run long goals with feedback.", "Parameters configure nodes at runtime."]
+    sparse_service.ingest_chapter("ros", chapter(*sections))
+
+    window = sparse_service.locate_selection("Services answer requests with a single response.", chapter_id="ros")
+    assert [chunk["metadata"]["chunk_index"] for chunk in window] == [1, 2, 3]
+    assert [chunk["matched"] for chunk in window] == [False, True, False]
+
+    # Without a chapter the source chapter is found by keyword search
+    window = sparse_service.locate_selection("Parameters configure nodes at runtime.", neighbors=0)
+    assert [chunk["metadata"]["chunk_index"] for chunk in window] == [4]
+    assert sparse_service.locate_selection("quaternion interpolation") == []
+
+
+class FlakyLocalClient(LocalVectorClient):
+    def get_collection(self, collection_name):
+        raise RuntimeError("transient failure")
+
+
+def test_collection_is_not_recreated_when_opening_fails(monkeypatch, tmp_path):
+    monkeypatch.setenv("QDRANT_URL", "")
+    monkeypatch.setenv("SPARSE_INDEX_ENABLED", "false")
+    client = FlakyLocalClient(str(tmp_path / "vectors"))
+    client.create_collection("textbook_chapters", models.VectorParams(size=DIMENSIONS, distance=models.Distance.COSINE))
+    client.upload_collection("textbook_chapters", [[1.0] * DIMENSIONS], ids=["kept"])
+    monkeypatch.setattr(VectorStoreService, "_local_client", staticmethod(lambda: client))
+
+    with pytest.raises(RuntimeError, match="transient failure"):
+        VectorStoreService()
+    assert client.count("textbook_chapters").count == 1